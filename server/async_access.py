@@ -0,0 +1,95 @@
+import asyncio
+import os
+import time
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Any, Callable, Dict
+
+
+class AsyncDataAccess:
+    """Async facade that runs blocking QueueDatabase/ThumbnailService work on a dedicated thread pool.
+
+    API handlers await these calls instead of touching SQLite or PIL on the PromptServer
+    event loop, so a slow query or a cold preview render no longer stalls websocket traffic.
+    Concurrency defaults to the PQUEUE_IO_WORKERS environment variable (4 if unset).
+    Every call is timed per name; see metrics().
+    """
+
+    def __init__(self, db: Any, thumbs: Any, *, max_workers: Optional[int] = None):
+        self.db = db
+        self.thumbs = thumbs
+        if max_workers is None:
+            try:
+                max_workers = int(os.environ.get("PQUEUE_IO_WORKERS", "4"))
+            except ValueError:
+                max_workers = 4
+        self.max_workers = max(1, int(max_workers))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pqueue-io")
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Dict[str, float]] = {}
+
+    async def run(self, fn: Callable[..., Any], *args: Any, name: Optional[str] = None, **kwargs: Any) -> Any:
+        """Run fn(*args, **kwargs) on the I/O pool and record its timing under `name`."""
+        label = name or getattr(fn, "__qualname__", None) or getattr(fn, "__name__", "call")
+        submitted = time.perf_counter()
+        timing: Dict[str, float] = {}
+
+        def _timed() -> Any:
+            started = time.perf_counter()
+            timing["wait"] = started - submitted
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                timing["run"] = time.perf_counter() - started
+
+        loop = asyncio.get_running_loop()
+        ok = False
+        try:
+            result = await loop.run_in_executor(self._executor, _timed)
+            ok = True
+            return result
+        finally:
+            self._record(label, timing.get("wait", 0.0), timing.get("run", 0.0), ok)
+
+    async def db_call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        """Await QueueDatabase.<method>(*args, **kwargs) on the I/O pool."""
+        return await self.run(getattr(self.db, method), *args, name=f"db.{method}", **kwargs)
+
+    async def thumbs_call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        """Await ThumbnailService.<method>(*args, **kwargs) on the I/O pool."""
+        return await self.run(getattr(self.thumbs, method), *args, name=f"thumbs.{method}", **kwargs)
+
+    def _record(self, name: str, wait: float, run: float, ok: bool) -> None:
+        with self._lock:
+            m = self._metrics.get(name)
+            if m is None:
+                m = self._metrics[name] = {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0, "wait_ms": 0.0}
+            m["calls"] += 1
+            if not ok:
+                m["errors"] += 1
+            m["total_ms"] += run * 1000.0
+            m["max_ms"] = max(m["max_ms"], run * 1000.0)
+            m["wait_ms"] += wait * 1000.0
+
+    def metrics(self) -> Dict[str, Any]:
+        """Per-call timing: calls, errors, avg/max/total run time and average pool wait, in ms."""
+        with self._lock:
+            calls = {
+                name: {
+                    "calls": int(m["calls"]),
+                    "errors": int(m["errors"]),
+                    "total_ms": round(m["total_ms"], 3),
+                    "avg_ms": round(m["total_ms"] / m["calls"], 3) if m["calls"] else 0.0,
+                    "max_ms": round(m["max_ms"], 3),
+                    "avg_wait_ms": round(m["wait_ms"] / m["calls"], 3) if m["calls"] else 0.0,
+                }
+                for name, m in self._metrics.items()
+            }
+        return {"max_workers": self.max_workers, "calls": calls}
+
+    def shutdown(self) -> None:
+        try:
+            self._executor.shutdown(wait=False)
+        except Exception as e:
+            logging.debug(f"PersistentQueue: I/O pool shutdown failed: {e}")
@@ -0,0 +1,145 @@
+import asyncio
+import threading
+from collections import deque
+from typing import Optional, Any, Awaitable, Callable, Deque, Dict, List, Set, Tuple
+
+
+class QueueChangeFeed:
+    """Versioned change feed over the visible queue (running + pending items and pause state).
+
+    Producers call mark_dirty() from any thread whenever the queue may have changed. The
+    next reader diffs a lightweight snapshot against the previous one, records per-item
+    changes under a new monotonically increasing revision, and wakes long-poll waiters.
+    Clients ask for everything since the revision they last saw; if that revision has
+    already been trimmed from the change log they get a full (still lightweight) reset.
+    """
+
+    def __init__(
+        self,
+        snapshot_fn: Callable[[], Tuple[bool, Dict[str, Dict[str, Any]]]],
+        *,
+        history_size: int = 512,
+        runner: Optional[Callable[..., Awaitable[Any]]] = None,
+    ):
+        # snapshot_fn returns (paused, {prompt_id: entry}) where entry is small and JSON-safe.
+        # runner, if given, executes the (possibly blocking) snapshot off the event loop.
+        self._snapshot_fn = snapshot_fn
+        self._runner = runner
+        self._lock = threading.Lock()
+        self._revision = 0
+        self._paused: Optional[bool] = None
+        self._items: Dict[str, Dict[str, Any]] = {}
+        # (revision, prompt_id, entry or None for removal)
+        self._log: Deque[Tuple[int, str, Optional[Dict[str, Any]]]] = deque(maxlen=max(16, int(history_size)))
+        self._oldest_revision = 0
+        self._dirty = True
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._waiters: Set["asyncio.Future[None]"] = set()
+
+    @property
+    def revision(self) -> int:
+        return self._revision
+
+    def mark_dirty(self) -> None:
+        """Note a possible change; safe to call from any thread."""
+        self._dirty = True
+        loop = self._loop
+        if loop is None or not self._waiters:
+            return
+        try:
+            loop.call_soon_threadsafe(self._wake_waiters)
+        except RuntimeError:
+            # Loop already closed (shutdown)
+            pass
+
+    def _wake_waiters(self) -> None:
+        waiters, self._waiters = self._waiters, set()
+        for fut in waiters:
+            if not fut.done():
+                fut.set_result(None)
+
+    def _refresh(self) -> None:
+        if not self._dirty:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            try:
+                paused, items = self._snapshot_fn()
+            except Exception:
+                self._dirty = True
+                raise
+            changed: List[Tuple[str, Optional[Dict[str, Any]]]] = []
+            for pid, entry in items.items():
+                if self._items.get(pid) != entry:
+                    changed.append((pid, entry))
+            for pid in self._items.keys() - items.keys():
+                changed.append((pid, None))
+            paused_changed = self._paused is not None and paused != self._paused
+            if changed or paused_changed or self._paused is None:
+                self._revision += 1
+                for pid, entry in changed:
+                    if len(self._log) == self._log.maxlen:
+                        self._oldest_revision = self._log[0][0]
+                    self._log.append((self._revision, pid, entry))
+            self._paused = paused
+            self._items = items
+
+    async def _refresh_async(self) -> None:
+        if not self._dirty:
+            return
+        if self._runner is None:
+            self._refresh()
+        else:
+            await self._runner(self._refresh, name="feed.refresh")
+
+    def _collect(self, since: Optional[int]) -> Dict[str, Any]:
+        """Return the changes after `since`, or a full reset when the delta is unavailable."""
+        with self._lock:
+            payload: Dict[str, Any] = {"revision": self._revision, "paused": self._paused}
+            if since is None or since > self._revision or since < self._oldest_revision:
+                payload["reset"] = True
+                payload["items"] = list(self._items.values())
+                return payload
+            upserted: Dict[str, Dict[str, Any]] = {}
+            removed: Set[str] = set()
+            for rev, pid, entry in self._log:
+                if rev <= since:
+                    continue
+                if entry is None:
+                    upserted.pop(pid, None)
+                    removed.add(pid)
+                else:
+                    removed.discard(pid)
+                    upserted[pid] = entry
+            payload["reset"] = False
+            payload["upserted"] = list(upserted.values())
+            payload["removed"] = sorted(removed)
+            return payload
+
+    async def wait_for_change(self, since: Optional[int], timeout: float) -> Dict[str, Any]:
+        """Long-poll: return as soon as the revision moves past `since`, or after `timeout` seconds."""
+        loop = asyncio.get_running_loop()
+        self._loop = loop
+        deadline = loop.time() + max(0.0, float(timeout))
+        while True:
+            await self._refresh_async()
+            if since is None or self._revision != since:
+                break
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            fut = loop.create_future()
+            self._waiters.add(fut)
+            # Re-check after registering so a mark_dirty() racing with us is not lost
+            if self._dirty:
+                self._waiters.discard(fut)
+                continue
+            try:
+                await asyncio.wait_for(fut, remaining)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self._waiters.discard(fut)
+        return self._collect(since)
@@ -0,0 +1,120 @@
+import sqlite3
+import threading
+import logging
+from typing import Optional, Any, Callable, Dict
+
+
+class _PooledConnection:
+    """Owns one thread's connection; closes it when the owning thread's locals are torn down."""
+
+    def __init__(self, pool: "ConnectionPool", conn: sqlite3.Connection, generation: int):
+        self.pool = pool
+        self.conn = conn
+        self.generation = generation
+
+    def close(self) -> None:
+        conn, self.conn = self.conn, None
+        if conn is None:
+            return
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def __del__(self):
+        try:
+            self.pool._forget(self)
+        except Exception:
+            pass
+        self.close()
+
+
+class ConnectionPool:
+    """Thread-local pool of long-lived SQLite connections.
+
+    Every thread that touches the database (the aiohttp loop, the execution worker,
+    executor threads) gets exactly one connection which it reuses for its lifetime.
+    Connections are never shared between threads, so handing work from the event
+    loop to the worker thread needs no locking around the connection itself; SQLite
+    WAL mode arbitrates concurrent readers and the single writer.
+
+    PRAGMAs are applied once per connection, and because connections are reused the
+    per-connection statement cache (``cached_statements``) actually gets hits.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        *,
+        cached_statements: int = 256,
+        timeout: float = 30.0,
+        on_connect: Optional[Callable[[sqlite3.Connection], None]] = None,
+    ):
+        self.db_path = db_path
+        # Called once per new connection, e.g. to register SQL functions
+        self.on_connect = on_connect
+        self.cached_statements = int(cached_statements)
+        self.timeout = float(timeout)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._open: Dict[int, _PooledConnection] = {}
+        self._generation = 0
+        self._stats: Dict[str, int] = {"opened": 0, "reused": 0, "closed": 0}
+
+    def acquire(self) -> sqlite3.Connection:
+        """Return the calling thread's connection, opening it on first use."""
+        holder = getattr(self._local, "holder", None)
+        if holder is not None and holder.conn is not None and holder.generation == self._generation:
+            with self._lock:
+                self._stats["reused"] += 1
+            return holder.conn
+        conn = self._connect()
+        with self._lock:
+            holder = _PooledConnection(self, conn, self._generation)
+            self._open[id(holder)] = holder
+            self._stats["opened"] += 1
+        self._local.holder = holder
+        return conn
+
+    def _connect(self) -> sqlite3.Connection:
+        # check_same_thread is relaxed only so close_all() can run from a shutdown hook;
+        # each connection is otherwise used exclusively by the thread that opened it.
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            cached_statements=self.cached_statements,
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+        # Lets retention return freed pages with incremental_vacuum. Must precede the WAL switch to
+        # apply to a new file; an existing file is converted by its next VACUUM.
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL;")
+        # Improve concurrency and durability for multi-threaded usage
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        conn.execute("PRAGMA temp_store=MEMORY;")
+        if self.on_connect is not None:
+            self.on_connect(conn)
+        return conn
+
+    def _forget(self, holder: _PooledConnection) -> None:
+        with self._lock:
+            if self._open.pop(id(holder), None) is not None:
+                self._stats["closed"] += 1
+
+    def close_all(self) -> None:
+        """Close every pooled connection; threads transparently reconnect on next use."""
+        with self._lock:
+            holders = list(self._open.values())
+            self._open.clear()
+            self._generation += 1
+            self._stats["closed"] += len(holders)
+        for holder in holders:
+            try:
+                holder.close()
+            except Exception as e:
+                logging.debug(f"PersistentQueue: closing pooled connection failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "open": len(self._open)}
@@ -1,11 +1,22 @@
 import os
 import sqlite3
 import json
+import logging
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterator, Set, Tuple
 
 import folder_paths
 
+from .connection_pool import ConnectionPool
+from .history_search import HistorySearchIndex
+from .workflow_store import WorkflowBlobStore
+from .duration_stats import DurationStats, GLOBAL_KEY
+from .thumb_store import ThumbnailFileStore
+from .history_counts import HistoryCounts
+from .migrations import Migration, MigrationRunner, ProgressFn
+from .job_metadata import COLUMNS as JOB_META_COLUMNS, extract_job_metadata, column_values, display_name
+from .job_metadata import HISTORY_COLUMNS, history_summary
+
 class QueueDatabase:
     def __init__(self, db_path: Optional[str] = None):
         # Default to ComfyUI user directory to ensure write permissions and persistence across updates
@@ -14,20 +25,46 @@ class QueueDatabase:
             os.makedirs(user_dir, exist_ok=True)
             db_path = os.path.join(user_dir, "persistent_queue.sqlite3")
         self.db_path = db_path
+        self.blobs = WorkflowBlobStore()
+        self._pool = ConnectionPool(db_path, on_connect=self._on_connect)
+        self.search = HistorySearchIndex()
+        self.durations = DurationStats()
+        self.counts = HistoryCounts()
+        # Thumbnail images live in files beside the database, referenced by history_thumbs.blob_key
+        self.thumb_files = ThumbnailFileStore(os.path.splitext(db_path)[0] + "_thumbs")
+        # Backfills of existing rows run once each, in the background (see _migrations)
+        self.migrations = MigrationRunner(self._get_conn, self._migrations())
+        # History search uses FTS only once every pre-existing row has been indexed
+        self._search_ready = False
         self._init_database()
-        self._backfilled_once = False
+        self._search_ready = self.search.available and self.migrations.current_version() >= self._SEARCH_INDEX_VERSION
+        self.migrations.start()
+
+    def _on_connect(self, conn: sqlite3.Connection) -> None:
+        # Lets the LIKE search fallback look inside compressed workflow blobs
+        conn.create_function('pq_workflow_text', 2, self.blobs.sql_decode)
     
     def _get_conn(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        # Improve concurrency and durability for multi-threaded usage
-        conn.execute("PRAGMA journal_mode=WAL;")
-        conn.execute("PRAGMA synchronous=NORMAL;")
-        return conn
+        """Return the calling thread's pooled connection.
+
+        Use as ``with self._get_conn() as conn:``; the context manager scopes the
+        transaction (commit/rollback) and leaves the connection open for reuse.
+        """
+        return self._pool.acquire()
+
+    def close(self) -> None:
+        """Close all pooled connections (e.g. on shutdown)."""
+        self._pool.close_all()
+
+    def pool_stats(self) -> Dict[str, Any]:
+        return self._pool.stats()
 
     def _init_database(self):
         """Create tables if they don't exist"""
         with self._get_conn() as conn:
+            fresh = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'job_history'"
+            ).fetchone() is None
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS queue_items (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -88,42 +125,851 @@ class QueueDatabase:
                 conn.execute('CREATE INDEX IF NOT EXISTS idx_history_thumbs_history_id ON history_thumbs(history_id)')
             except Exception:
                 pass
-            # No schema migrations for now; keep it simple
-    
-    def add_job(self, prompt_id: str, workflow: dict, priority: int = 0) -> None:
-        """Add a job to the persistent queue"""
+            try:
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_job_history_prompt_id ON job_history(prompt_id)')
+            except Exception:
+                pass
+            try:
+                # Pending execution order; lets a priority change find its neighbours directly
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_queue_items_pending_order ON queue_items(status, priority, created_at)')
+            except Exception:
+                pass
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS pqueue_meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            ''')
+            # Full-text search over history; rows that predate the index are backfilled once
+            if self.search.ensure_schema(conn):
+                cur = conn.execute('SELECT COALESCE(MAX(id), 0) FROM job_history')
+                self._set_meta(conn, 'fts_backfill_upto', int(cur.fetchone()[0]))
+                self._set_meta(conn, 'fts_backfill_cursor', 0)
+                self._rerun_migration(conn, self._SEARCH_INDEX_VERSION)
+            # Content-addressed workflow JSON; rows reference it by workflow_hash
+            self.blobs.ensure_schema(conn)
+            self._ensure_column(conn, 'queue_items', 'workflow_hash', 'TEXT')
+            self._ensure_column(conn, 'job_history', 'workflow_hash', 'TEXT')
+            try:
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_queue_items_workflow_hash ON queue_items(workflow_hash)')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_job_history_workflow_hash ON job_history(workflow_hash)')
+            except Exception:
+                pass
+            # Structural workflow fingerprints and per-fingerprint duration statistics (ETA)
+            self.durations.ensure_schema(conn)
+            self._ensure_column(conn, 'queue_items', 'fingerprint', 'TEXT')
+            # Per-job metadata derived once at enqueue (job_metadata.py); older rows are backfilled
+            for column, decl in JOB_META_COLUMNS.items():
+                self._ensure_column(conn, 'queue_items', column, decl)
+            for column, decl in HISTORY_COLUMNS.items():
+                self._ensure_column(conn, 'job_history', column, decl)
+            # Queue position (the PromptQueue item number), so manual order survives restarts
+            self._ensure_column(conn, 'queue_items', 'rank', 'REAL')
+            try:
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_queue_items_pending_rank ON queue_items(status, rank)')
+            except Exception:
+                pass
+            if self._ensure_column(conn, 'job_history', 'fingerprint', 'TEXT'):
+                cur = conn.execute('SELECT COALESCE(MAX(id), 0) FROM job_history')
+                self._set_meta(conn, 'duration_backfill_upto', int(cur.fetchone()[0]))
+                self._set_meta(conn, 'duration_backfill_cursor', 0)
+                self._rerun_migration(conn, self._DURATION_STATS_VERSION)
+            # Thumbnail bytes moved out to ThumbnailFileStore; data is left empty for those rows
+            self._ensure_column(conn, 'history_thumbs', 'blob_key', 'TEXT')
+            self._ensure_column(conn, 'history_thumbs', 'size', 'INTEGER')
+            try:
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_history_thumbs_blob_key ON history_thumbs(blob_key)')
+            except Exception:
+                pass
+            # Write-ahead journal of finished jobs whose history row has not been written yet
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS history_journal (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    prompt_id TEXT NOT NULL,
+                    state TEXT,
+                    status_str TEXT,
+                    outputs TEXT,
+                    created_at TIMESTAMP
+                )
+            ''')
+            # Per-status history totals kept by triggers, so list pages need no COUNT(*)
+            if self.counts.ensure_schema(conn):
+                logging.info("PersistentQueue: Built history counters")
+            # A new database has no rows to backfill
+            if fresh:
+                MigrationRunner.set_version(conn, self.migrations.latest)
+            conn.commit()
+
+    @staticmethod
+    def _ensure_column(conn: sqlite3.Connection, table: str, column: str, decl: str) -> bool:
+        """Add a column if missing. Returns True if it was added just now."""
+        cols = {row['name'] for row in conn.execute(f'PRAGMA table_info({table})').fetchall()}
+        if column in cols:
+            return False
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {decl}')
+        return True
+
+    def _get_meta(self, conn: sqlite3.Connection, key: str, default: Any = None) -> Any:
+        row = conn.execute('SELECT value FROM pqueue_meta WHERE key = ?', (key,)).fetchone()
+        return row['value'] if row else default
+
+    def _set_meta(self, conn: sqlite3.Connection, key: str, value: Any) -> None:
+        conn.execute('INSERT OR REPLACE INTO pqueue_meta (key, value) VALUES (?, ?)', (key, str(value)))
+
+    # Versions are recorded in PRAGMA user_version; append new migrations, never renumber
+    _SEARCH_INDEX_VERSION = 1
+    _HISTORY_TIMES_VERSION = 2
+    _DURATION_STATS_VERSION = 3
+    _WORKFLOW_BLOBS_VERSION = 4
+    _THUMBNAIL_FILES_VERSION = 5
+    _JOB_METADATA_VERSION = 6
+    _HISTORY_SUMMARY_VERSION = 7
+
+    def _migrations(self) -> List[Migration]:
+        return [
+            Migration(self._SEARCH_INDEX_VERSION, 'search_index', self._backfill_search_index),
+            Migration(self._HISTORY_TIMES_VERSION, 'history_timestamps', self._backfill_history_rows),
+            Migration(self._DURATION_STATS_VERSION, 'duration_stats', self._backfill_duration_stats),
+            Migration(self._WORKFLOW_BLOBS_VERSION, 'workflow_blobs', self.migrate_workflow_blobs),
+            Migration(self._THUMBNAIL_FILES_VERSION, 'thumbnail_files', self.migrate_thumbnail_blobs),
+            Migration(self._JOB_METADATA_VERSION, 'job_metadata', self._backfill_job_metadata),
+            Migration(self._HISTORY_SUMMARY_VERSION, 'history_summary', self._backfill_history_summary),
+        ]
+
+    def _rerun_migration(self, conn: sqlite3.Connection, version: int) -> None:
+        """Schedule a completed migration (and every later one) to run again, e.g. for a rebuilt index."""
+        current = int(conn.execute('PRAGMA user_version').fetchone()[0])
+        if current >= version:
+            MigrationRunner.set_version(conn, version - 1)
+
+    def migration_progress(self) -> Dict[str, Any]:
+        return self.migrations.progress.to_dict()
+
+    def _backfill_search_index(self, batch_size: int = 500, progress: Optional[ProgressFn] = None) -> int:
+        """Index history rows written before the FTS table existed, in small committed batches."""
+        if not self.search.available:
+            return 0
+        total = 0
         with self._get_conn() as conn:
-            conn.execute(
+            upto = int(self._get_meta(conn, 'fts_backfill_upto', 0))
+            cursor = int(self._get_meta(conn, 'fts_backfill_cursor', 0))
+            remaining = int(conn.execute(
+                'SELECT COUNT(*) FROM job_history WHERE id > ? AND id <= ?', (cursor, upto)
+            ).fetchone()[0])
+        while cursor < upto:
+            with self._get_conn() as conn:
+                rows = [dict(r) for r in conn.execute(
+                    'SELECT id, prompt_id, workflow, workflow_hash, outputs FROM job_history WHERE id > ? AND id <= ? ORDER BY id LIMIT ?',
+                    (cursor, upto, int(batch_size)),
+                ).fetchall()]
+                self.blobs.hydrate(conn, rows)
+                for r in rows:
+                    try:
+                        wf = json.loads(r['workflow']) if r['workflow'] else None
+                    except Exception:
+                        wf = None
+                    try:
+                        outs = json.loads(r['outputs']) if r['outputs'] else None
+                    except Exception:
+                        outs = None
+                    self.search.index_row(conn, r['id'], r['prompt_id'], wf, outs)
+                cursor = rows[-1]['id'] if rows else upto
+                self._set_meta(conn, 'fts_backfill_cursor', cursor)
+                conn.commit()
+            total += len(rows)
+            if progress:
+                progress(total, remaining)
+        self._search_ready = True
+        if total:
+            logging.info(f"PersistentQueue: Indexed {total} history rows for search")
+        return total
+
+    def _backfill_history_rows(self, batch_size: int = 500, progress: Optional[ProgressFn] = None) -> int:
+        """Compute duration_seconds/accurate timestamps of old history rows from their queue_items rows."""
+
+        def _parse_dt(val: Any) -> Optional[datetime]:
+            if val is None:
+                return None
+            if isinstance(val, datetime):
+                return val
+            if isinstance(val, str):
+                try:
+                    return datetime.fromisoformat(val)
+                except Exception:
+                    return None
+            return None
+
+        with self._get_conn() as conn:
+            total = sum(self.counts.per_status(conn).values())
+        scanned = 0
+        fixed = 0
+        cursor = 0
+        while True:
+            with self._get_conn() as conn:
+                ids = conn.execute(
+                    'SELECT id FROM job_history WHERE id > ? ORDER BY id LIMIT ?', (cursor, int(batch_size))
+                ).fetchall()
+                if not ids:
+                    break
+                last = int(ids[-1][0])
+                rows = conn.execute(
+                    '''
+                    SELECT j.id as jid, j.created_at as j_created, j.completed_at as j_completed,
+                           qi.created_at as qi_created, qi.started_at as qi_started, qi.completed_at as qi_completed
+                    FROM job_history j
+                    JOIN queue_items qi ON qi.prompt_id = j.prompt_id
+                    WHERE j.id > ? AND j.id <= ?
+                          AND (j.duration_seconds IS NULL OR j.duration_seconds <= 0 OR j.created_at = j.completed_at)
+                          AND qi.completed_at IS NOT NULL
+                    ''',
+                    (cursor, last),
+                ).fetchall()
+                updates = []
+                for r in rows:
+                    started = _parse_dt(r['qi_started']) or _parse_dt(r['qi_created']) or _parse_dt(r['j_created']) or datetime.now()
+                    completed = _parse_dt(r['qi_completed']) or _parse_dt(r['j_completed']) or started
+                    try:
+                        dur = max(0.0, (completed - started).total_seconds())
+                    except Exception:
+                        dur = None
+                    updates.append((dur, started, completed, r['jid']))
+                if updates:
+                    conn.executemany(
+                        'UPDATE job_history SET duration_seconds = ?, created_at = ?, completed_at = ? WHERE id = ?', updates
+                    )
+                conn.commit()
+            cursor = last
+            scanned += len(ids)
+            fixed += len(updates)
+            if progress:
+                progress(scanned, max(total, scanned))
+        if fixed:
+            logging.info(f"PersistentQueue: Filled in durations of {fixed} history rows")
+        return fixed
+
+    def _backfill_duration_stats(self, batch_size: int = 500, progress: Optional[ProgressFn] = None) -> int:
+        """Fingerprint rows written before fingerprints existed and fold their durations into the stats."""
+        total = 0
+        # Queue rows first, one batch per transaction; the id cursor skips rows left unfingerprinted
+        cursor = 0
+        while True:
+            with self._get_conn() as conn:
+                rows = [dict(r) for r in conn.execute(
+                    'SELECT id, workflow, workflow_hash FROM queue_items WHERE fingerprint IS NULL AND id > ? ORDER BY id LIMIT ?',
+                    (cursor, int(batch_size)),
+                ).fetchall()]
+                if not rows:
+                    break
+                self.blobs.hydrate(conn, rows)
+                conn.executemany(
+                    'UPDATE queue_items SET fingerprint = ? WHERE id = ?',
+                    [(self.durations.fingerprint(r['workflow']), r['id']) for r in rows],
+                )
+                conn.commit()
+            cursor = rows[-1]['id']
+        with self._get_conn() as conn:
+            upto = int(self._get_meta(conn, 'duration_backfill_upto', 0))
+            cursor = int(self._get_meta(conn, 'duration_backfill_cursor', 0))
+            remaining = int(conn.execute(
+                'SELECT COUNT(*) FROM job_history WHERE id > ? AND id <= ?', (cursor, upto)
+            ).fetchone()[0])
+        while cursor < upto:
+            touched: Set[str] = set()
+            with self._get_conn() as conn:
+                rows = [dict(r) for r in conn.execute(
+                    'SELECT id, workflow, workflow_hash, status, duration_seconds FROM job_history WHERE id > ? AND id <= ? ORDER BY id LIMIT ?',
+                    (cursor, upto, int(batch_size)),
+                ).fetchall()]
+                self.blobs.hydrate(conn, rows)
+                for r in rows:
+                    fp = self.durations.fingerprint(r['workflow'])
+                    conn.execute('UPDATE job_history SET fingerprint = ? WHERE id = ?', (fp, r['id']))
+                    if self.durations.is_sample(r['status'], r['duration_seconds']):
+                        touched.update(self.durations.record(conn, fp, float(r['duration_seconds'])))
+                cursor = rows[-1]['id'] if rows else upto
+                self._set_meta(conn, 'duration_backfill_cursor', cursor)
+                conn.commit()
+            total += len(rows)
+            self.durations.invalidate(touched)
+            if progress:
+                progress(total, remaining)
+        if total:
+            logging.info(f"PersistentQueue: Computed duration statistics from {total} history rows")
+        return total
+
+    def _backfill_job_metadata(self, batch_size: int = 200, progress: Optional[ProgressFn] = None) -> int:
+        """Extract metadata for queue rows written before the metadata columns existed."""
+        total = 0
+        sets = ", ".join(f"{c} = ?" for c in JOB_META_COLUMNS)
+        with self._get_conn() as conn:
+            remaining = int(conn.execute('SELECT COUNT(*) FROM queue_items WHERE node_count IS NULL').fetchone()[0])
+        cursor = 0
+        while True:
+            with self._get_conn() as conn:
+                rows = [dict(r) for r in conn.execute(
+                    'SELECT id, workflow, workflow_hash FROM queue_items WHERE node_count IS NULL AND id > ? ORDER BY id LIMIT ?',
+                    (cursor, int(batch_size)),
+                ).fetchall()]
+                if not rows:
+                    break
+                self.blobs.hydrate(conn, rows)
+                conn.executemany(
+                    f'UPDATE queue_items SET {sets} WHERE id = ?',
+                    [column_values(extract_job_metadata(r['workflow'])) + [r['id']] for r in rows],
+                )
+                conn.commit()
+            cursor = rows[-1]['id']
+            total += len(rows)
+            if progress:
+                progress(total, remaining)
+        if total:
+            logging.info(f"PersistentQueue: Extracted metadata for {total} queue rows")
+        return total
+
+    def _backfill_history_summary(self, batch_size: int = 200, progress: Optional[ProgressFn] = None) -> int:
+        """Fill the list-view summary columns of history rows written before they existed."""
+        total = 0
+        sets = ", ".join(f"{c} = ?" for c in HISTORY_COLUMNS)
+        with self._get_conn() as conn:
+            remaining = int(conn.execute('SELECT COUNT(*) FROM job_history WHERE image_count IS NULL').fetchone()[0])
+        cursor = 0
+        while True:
+            with self._get_conn() as conn:
+                rows = [dict(r) for r in conn.execute(
+                    'SELECT id, workflow, workflow_hash, outputs FROM job_history WHERE image_count IS NULL AND id > ? ORDER BY id LIMIT ?',
+                    (cursor, int(batch_size)),
+                ).fetchall()]
+                if not rows:
+                    break
+                self.blobs.hydrate(conn, rows)
+                updates = []
+                for r in rows:
+                    summary = history_summary(r['workflow'], r['outputs'])
+                    updates.append([summary[c] for c in HISTORY_COLUMNS] + [r['id']])
+                conn.executemany(f'UPDATE job_history SET {sets} WHERE id = ?', updates)
+                conn.commit()
+            cursor = rows[-1]['id']
+            total += len(rows)
+            if progress:
+                progress(total, remaining)
+        if total:
+            logging.info(f"PersistentQueue: Summarized {total} history rows for list views")
+        return total
+
+    # Columns list views need (fields=summary); workflow and outputs are read only on request
+    QUEUE_SUMMARY_FIELDS = (
+        'id', 'prompt_id', 'status', 'priority', 'rank', 'error', 'created_at', 'started_at', 'completed_at',
+        'fingerprint', *JOB_META_COLUMNS,
+    )
+    HISTORY_SUMMARY_FIELDS = (
+        'id', 'prompt_id', 'status', 'created_at', 'completed_at', 'duration_seconds', 'fingerprint', *HISTORY_COLUMNS,
+    )
+
+    @staticmethod
+    def _select_list(fields: Any, summary: Tuple[str, ...], heavy: Tuple[str, ...], required: Tuple[str, ...] = ()) -> str:
+        """SQL select list for a fields= projection.
+
+        None or "full" selects every column; "summary" the summary columns; otherwise a comma
+        separated string or list of column names (unknown names are ignored; id and
+        prompt_id are always included).
+        """
+        if fields is None or fields == 'full':
+            return '*'
+        if fields == 'summary':
+            cols = list(summary)
+        else:
+            names = fields.split(',') if isinstance(fields, str) else list(fields)
+            allowed = set(summary) | set(heavy)
+            cols = ['id', 'prompt_id'] + [str(n).strip() for n in names if str(n).strip() in allowed]
+        cols = list(dict.fromkeys(cols + [c for c in required if c]))
+        if 'workflow' in cols:
+            # Workflow text lives in the blob store for most rows
+            cols.append('workflow_hash')
+        return ', '.join(cols)
+
+    def migrate_workflow_blobs(self, batch_size: int = 200, progress: Optional[ProgressFn] = None) -> Dict[str, int]:
+        """Move inline workflow JSON of existing rows into workflow_blobs, in small committed batches.
+
+        Returns (and logs) a report of rows moved and bytes saved. Freed pages are reused by
+        SQLite; the file itself only shrinks after a VACUUM.
+        """
+        report = {'rows': 0, 'inline_bytes': 0, 'stored_bytes': 0}
+        tables = ('queue_items', 'job_history')
+        with self._get_conn() as conn:
+            remaining = sum(
+                int(conn.execute(f'SELECT COUNT(*) FROM {t} WHERE workflow IS NOT NULL AND workflow_hash IS NULL').fetchone()[0])
+                for t in tables
+            )
+        for table in tables:
+            while True:
+                with self._get_conn() as conn:
+                    rows = conn.execute(
+                        f'SELECT id, workflow FROM {table} WHERE workflow IS NOT NULL AND workflow_hash IS NULL LIMIT ?',
+                        (int(batch_size),),
+                    ).fetchall()
+                    if not rows:
+                        break
+                    for r in rows:
+                        text = r['workflow']
+                        if not isinstance(text, str):
+                            text = json.dumps(text)
+                        existed = conn.execute(
+                            f'SELECT 1 FROM {self.blobs.TABLE} WHERE hash = ?', (self.blobs.hash_text(text),)
+                        ).fetchone() is not None
+                        h = self.blobs.put(conn, text)
+                        if not existed:
+                            cur = conn.execute(f'SELECT length(data) FROM {self.blobs.TABLE} WHERE hash = ?', (h,))
+                            report['stored_bytes'] += int(cur.fetchone()[0] or 0)
+                        report['inline_bytes'] += len(text.encode('utf-8'))
+                        conn.execute(f'UPDATE {table} SET workflow = NULL, workflow_hash = ? WHERE id = ?', (h, r['id']))
+                    conn.commit()
+                    report['rows'] += len(rows)
+                if progress:
+                    progress(report['rows'], max(remaining, report['rows']))
+        if report['rows']:
+            saved = report['inline_bytes'] - report['stored_bytes']
+            logging.info(
+                f"PersistentQueue: Moved {report['rows']} workflows into deduplicated storage; "
+                f"{report['inline_bytes']} bytes inline -> {report['stored_bytes']} bytes stored ({saved} bytes saved)"
+            )
+        return report
+
+    def migrate_thumbnail_blobs(self, batch_size: int = 100, progress: Optional[ProgressFn] = None) -> Dict[str, int]:
+        """Move thumbnail BLOBs still stored in history_thumbs into the thumbnail file store.
+
+        Runs in small committed batches; rows keep an empty data value and point at their file
+        through blob_key. Returns (and logs) the number of rows and bytes moved.
+        """
+        report = {'rows': 0, 'bytes': 0}
+        with self._get_conn() as conn:
+            remaining = int(conn.execute(
+                'SELECT COUNT(*) FROM history_thumbs WHERE blob_key IS NULL AND length(data) > 0'
+            ).fetchone()[0])
+        while True:
+            with self._get_conn() as conn:
+                rows = conn.execute(
+                    'SELECT id, mime, data FROM history_thumbs WHERE blob_key IS NULL AND length(data) > 0 LIMIT ?',
+                    (int(batch_size),),
+                ).fetchall()
+                if not rows:
+                    break
+                for r in rows:
+                    data = bytes(r['data'])
+                    key = self.thumb_files.put(data, r['mime'])
+                    conn.execute("UPDATE history_thumbs SET blob_key = ?, size = ?, data = X'' WHERE id = ?", (key, len(data), r['id']))
+                    report['bytes'] += len(data)
+                conn.commit()
+                report['rows'] += len(rows)
+            if progress:
+                progress(report['rows'], max(remaining, report['rows']))
+        # Sizes feed the retention byte budget; fill them for rows stored before the column existed
+        with self._get_conn() as conn:
+            conn.execute("UPDATE history_thumbs SET size = length(data) WHERE size IS NULL AND blob_key IS NULL")
+            for r in conn.execute('SELECT id, blob_key FROM history_thumbs WHERE size IS NULL').fetchall():
+                path = self.thumb_files.path(r['blob_key'])
+                size = os.path.getsize(path) if path and os.path.isfile(path) else 0
+                conn.execute('UPDATE history_thumbs SET size = ? WHERE id = ?', (size, r['id']))
+            conn.commit()
+        if report['rows']:
+            logging.info(
+                f"PersistentQueue: Moved {report['rows']} thumbnails ({report['bytes']} bytes) out of the database "
+                f"into {self.thumb_files.root}"
+            )
+        return report
+
+    _SUCCESS_SQL = "lower(COALESCE(status, '')) IN ('success', 'completed', 'done')"
+
+    def get_retention_usage(self) -> Dict[str, int]:
+        """Sizes the retention byte budget is checked against: used DB pages plus thumbnail files."""
+        with self._get_conn() as conn:
+            page_size = int(conn.execute('PRAGMA page_size').fetchone()[0])
+            pages = int(conn.execute('PRAGMA page_count').fetchone()[0])
+            free = int(conn.execute('PRAGMA freelist_count').fetchone()[0])
+            thumbs = int(conn.execute('SELECT COALESCE(SUM(size), 0) FROM history_thumbs WHERE blob_key IS NOT NULL').fetchone()[0])
+            rows = sum(self.counts.per_status(conn).values())
+            auto_vacuum = int(conn.execute('PRAGMA auto_vacuum').fetchone()[0])
+        return {
+            'history_rows': rows,
+            'db_bytes': (pages - free) * page_size,
+            'free_bytes': free * page_size,
+            'thumb_file_bytes': thumbs,
+            'total_bytes': (pages - free) * page_size + thumbs,
+            'auto_vacuum': auto_vacuum,
+        }
+
+    def select_history_older_than(self, cutoff: datetime, *, failed: bool, limit: int) -> List[int]:
+        """Oldest history ids completed before cutoff, among successful or among other (failed) rows."""
+        cond = self._SUCCESS_SQL if not failed else f"NOT ({self._SUCCESS_SQL})"
+        with self._get_conn() as conn:
+            cur = conn.execute(
+                f'SELECT id FROM job_history WHERE COALESCE(completed_at, created_at) < ? AND {cond} ORDER BY id LIMIT ?',
+                (cutoff, int(limit)),
+            )
+            return [int(r[0]) for r in cur.fetchall()]
+
+    def select_oldest_history(self, limit: int) -> List[int]:
+        """Oldest history ids, successful rows first so failed jobs are kept longer."""
+        with self._get_conn() as conn:
+            cur = conn.execute(f'SELECT id FROM job_history WHERE {self._SUCCESS_SQL} ORDER BY id LIMIT ?', (int(limit),))
+            ids = [int(r[0]) for r in cur.fetchall()]
+            if not ids:
+                cur = conn.execute('SELECT id FROM job_history ORDER BY id LIMIT ?', (int(limit),))
+                ids = [int(r[0]) for r in cur.fetchall()]
+            return ids
+
+    def delete_history_rows(self, history_ids: List[int]) -> Dict[str, int]:
+        """Delete history rows with their thumbnails, search entries and unreferenced workflow blobs.
+
+        One short transaction; thumbnail files no longer referenced are removed after commit.
+        """
+        ids = [int(i) for i in history_ids]
+        report = {'history': 0, 'thumbs': 0, 'files': 0, 'file_bytes': 0}
+        if not ids:
+            return report
+        placeholders = ",".join(["?"] * len(ids))
+        with self._get_conn() as conn:
+            hashes = {r[0] for r in conn.execute(
+                f'SELECT DISTINCT workflow_hash FROM job_history WHERE id IN ({placeholders})', tuple(ids)
+            ).fetchall() if r[0]}
+            keys = {r[0]: int(r[1] or 0) for r in conn.execute(
+                f'SELECT blob_key, size FROM history_thumbs WHERE history_id IN ({placeholders}) AND blob_key IS NOT NULL', tuple(ids)
+            ).fetchall()}
+            report['thumbs'] = conn.execute(f'DELETE FROM history_thumbs WHERE history_id IN ({placeholders})', tuple(ids)).rowcount
+            report['history'] = conn.execute(f'DELETE FROM job_history WHERE id IN ({placeholders})', tuple(ids)).rowcount
+            self.search.delete_rows(conn, ids)
+            for h in hashes:
+                self.blobs.release(conn, h)
+            conn.commit()
+            for key, size in keys.items():
+                if conn.execute('SELECT 1 FROM history_thumbs WHERE blob_key = ? LIMIT 1', (key,)).fetchone() is None:
+                    if self.thumb_files.delete(key):
+                        report['files'] += 1
+                        report['file_bytes'] += size
+        return report
+
+    def prune_finished_queue_items(self, cutoff: datetime, limit: int) -> int:
+        """Delete finished queue_items rows older than cutoff whose job already has its history row."""
+        with self._get_conn() as conn:
+            rows = conn.execute(
                 '''
-                INSERT OR IGNORE INTO queue_items (prompt_id, workflow, priority, created_at)
-                VALUES (?, ?, ?, ?)
+                SELECT q.id, q.workflow_hash FROM queue_items q
+                WHERE q.status NOT IN ('pending', 'running') AND q.completed_at IS NOT NULL AND q.completed_at < ?
+                  AND (q.status = 'cancelled' OR EXISTS (SELECT 1 FROM job_history j WHERE j.prompt_id = q.prompt_id))
+                  AND NOT EXISTS (SELECT 1 FROM history_journal hj WHERE hj.prompt_id = q.prompt_id)
+                LIMIT ?
+                ''',
+                (cutoff, int(limit)),
+            ).fetchall()
+            if not rows:
+                return 0
+            ids = [int(r['id']) for r in rows]
+            placeholders = ",".join(["?"] * len(ids))
+            conn.execute(f'DELETE FROM queue_items WHERE id IN ({placeholders})', tuple(ids))
+            for h in {r['workflow_hash'] for r in rows if r['workflow_hash']}:
+                self.blobs.release(conn, h)
+            conn.commit()
+            return len(ids)
+
+    def prune_orphans(self, limit: int) -> Dict[str, int]:
+        """Remove thumbnail rows, search entries and workflow blobs whose owner rows are gone."""
+        report = {'thumbs': 0, 'fts': 0, 'blobs': 0}
+        with self._get_conn() as conn:
+            report['thumbs'] = conn.execute(
+                'DELETE FROM history_thumbs WHERE id IN (SELECT t.id FROM history_thumbs t '
+                'WHERE NOT EXISTS (SELECT 1 FROM job_history j WHERE j.id = t.history_id) LIMIT ?)',
+                (int(limit),),
+            ).rowcount
+            if self.search.available:
+                ids = [int(r[0]) for r in conn.execute(
+                    f'SELECT rowid FROM {self.search.TABLE} WHERE rowid NOT IN (SELECT id FROM job_history) LIMIT ?', (int(limit),)
+                ).fetchall()]
+                self.search.delete_rows(conn, ids)
+                report['fts'] = len(ids)
+            report['blobs'] = conn.execute(
+                f'''
+                DELETE FROM {self.blobs.TABLE} WHERE hash IN (
+                    SELECT b.hash FROM {self.blobs.TABLE} b
+                    WHERE NOT EXISTS (SELECT 1 FROM queue_items q WHERE q.workflow_hash = b.hash)
+                      AND NOT EXISTS (SELECT 1 FROM job_history j WHERE j.workflow_hash = b.hash)
+                    LIMIT ?
+                )
+                ''',
+                (int(limit),),
+            ).rowcount
+            conn.commit()
+        return report
+
+    def optimize_search_index(self) -> None:
+        with self._get_conn() as conn:
+            self.search.optimize(conn)
+            conn.commit()
+
+    def find_orphan_thumb_files(self, keys: List[str]) -> List[str]:
+        """Subset of thumbnail file keys that no history_thumbs row references."""
+        referenced: Set[str] = set()
+        with self._get_conn() as conn:
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                placeholders = ",".join(["?"] * len(batch))
+                cur = conn.execute(f'SELECT DISTINCT blob_key FROM history_thumbs WHERE blob_key IN ({placeholders})', tuple(batch))
+                referenced.update(r[0] for r in cur.fetchall())
+        return [k for k in keys if k not in referenced]
+
+    def incremental_vacuum(self, max_pages: int) -> int:
+        """Return up to max_pages free pages to the OS. Returns bytes released."""
+        with self._get_conn() as conn:
+            page_size = int(conn.execute('PRAGMA page_size').fetchone()[0])
+            before = int(conn.execute('PRAGMA page_count').fetchone()[0])
+            conn.execute(f'PRAGMA incremental_vacuum({int(max_pages)})').fetchall()
+            conn.commit()
+            after = int(conn.execute('PRAGMA page_count').fetchone()[0])
+        return max(0, before - after) * page_size
+
+    def vacuum(self) -> int:
+        """Full VACUUM (also applies a pending auto_vacuum change). Returns bytes released."""
+        with self._get_conn() as conn:
+            page_size = int(conn.execute('PRAGMA page_size').fetchone()[0])
+            before = int(conn.execute('PRAGMA page_count').fetchone()[0])
+            conn.commit()
+            conn.execute('VACUUM')
+            after = int(conn.execute('PRAGMA page_count').fetchone()[0])
+        return max(0, before - after) * page_size
+
+    def get_storage_report(self) -> Dict[str, Any]:
+        """Logical vs stored workflow bytes across queue_items and job_history."""
+        with self._get_conn() as conn:
+            logical = 0
+            inline = 0
+            for table in ('queue_items', 'job_history'):
+                cur = conn.execute(
+                    f'''
+                    SELECT COALESCE(SUM(b.size), 0) FROM {table} t
+                    JOIN {self.blobs.TABLE} b ON b.hash = t.workflow_hash
+                    '''
+                )
+                logical += int(cur.fetchone()[0] or 0)
+                cur = conn.execute(f'SELECT COALESCE(SUM(length(workflow)), 0) FROM {table} WHERE workflow IS NOT NULL')
+                inline += int(cur.fetchone()[0] or 0)
+            row = conn.execute(f'SELECT COUNT(*), COALESCE(SUM(length(data)), 0) FROM {self.blobs.TABLE}').fetchone()
+            stored = int(row[1] or 0) + inline
+            return {
+                'workflow_blobs': int(row[0] or 0),
+                'codec': self.blobs.codec,
+                'logical_bytes': logical + inline,
+                'stored_bytes': stored,
+                'saved_bytes': max(0, logical + inline - stored),
+            }
+
+    def add_job(
+        self,
+        prompt_id: str,
+        workflow: dict,
+        priority: int = 0,
+        rank: Optional[float] = None,
+        meta: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Add a job to the persistent queue; rank is its queue number when known.
+
+        meta is extract_job_metadata(workflow) when the caller already has it.
+        """
+        with self._get_conn() as conn:
+            if conn.execute('SELECT 1 FROM queue_items WHERE prompt_id = ?', (prompt_id,)).fetchone() is not None:
+                return
+            if meta is None:
+                meta = extract_job_metadata(workflow)
+            h = self.blobs.put(conn, json.dumps(workflow))
+            conn.execute(
+                f'''
+                INSERT OR IGNORE INTO queue_items (prompt_id, workflow_hash, fingerprint, priority, rank, created_at, {self._META_COLS})
+                VALUES (?, ?, ?, ?, ?, ?, {self._META_MARKS})
                 ''',
-                (prompt_id, json.dumps(workflow), priority, datetime.now()),
+                (prompt_id, h, meta.get('fingerprint'), priority, rank, datetime.now(), *column_values(meta)),
             )
             conn.commit()
 
+    _META_COLS = ", ".join(JOB_META_COLUMNS)
+    _META_MARKS = ", ".join("?" for _ in JOB_META_COLUMNS)
+
+    def add_jobs(self, jobs: List[Dict[str, Any]]) -> int:
+        """Insert many jobs in one transaction; existing prompt_ids are left untouched.
+
+        Each job: {prompt_id, workflow, priority?, status? ('pending'), error?}. Returns rows inserted.
+        """
+        inserted = 0
+        now = datetime.now()
+        with self._get_conn() as conn:
+            ids = [str(j['prompt_id']) for j in jobs]
+            existing: Set[str] = set()
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                placeholders = ",".join(["?"] * len(batch))
+                cur = conn.execute(f"SELECT prompt_id FROM queue_items WHERE prompt_id IN ({placeholders})", tuple(batch))
+                existing.update(str(r['prompt_id']) for r in cur.fetchall())
+            for job in jobs:
+                pid = str(job['prompt_id'])
+                if pid in existing:
+                    continue
+                existing.add(pid)
+                workflow = job.get('workflow')
+                status = job.get('status') or 'pending'
+                meta = extract_job_metadata(workflow)
+                conn.execute(
+                    f'''
+                    INSERT OR IGNORE INTO queue_items (prompt_id, workflow_hash, fingerprint, priority, status, error, created_at, completed_at, {self._META_COLS})
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, {self._META_MARKS})
+                    ''',
+                    (
+                        pid,
+                        self.blobs.put(conn, json.dumps(workflow)),
+                        meta.get('fingerprint'),
+                        int(job.get('priority') or 0),
+                        status,
+                        job.get('error'),
+                        now,
+                        None if status == 'pending' else now,
+                        *column_values(meta),
+                    ),
+                )
+                inserted += 1
+            conn.commit()
+        return inserted
+
     def remove_job(self, prompt_id: str) -> None:
         with self._get_conn() as conn:
+            row = conn.execute('SELECT workflow_hash FROM queue_items WHERE prompt_id = ?', (prompt_id,)).fetchone()
             conn.execute('DELETE FROM queue_items WHERE prompt_id = ?', (prompt_id,))
+            if row is not None:
+                self.blobs.release(conn, row['workflow_hash'])
             conn.commit()
 
+    def remove_jobs(self, prompt_ids: List[str]) -> int:
+        """Delete many queue rows in one transaction. Returns the number of rows removed."""
+        ids = [str(pid) for pid in prompt_ids if pid]
+        removed = 0
+        with self._get_conn() as conn:
+            hashes: Set[str] = set()
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                placeholders = ",".join(["?"] * len(batch))
+                cur = conn.execute(f"SELECT workflow_hash FROM queue_items WHERE prompt_id IN ({placeholders})", tuple(batch))
+                hashes.update(r['workflow_hash'] for r in cur.fetchall() if r['workflow_hash'])
+                cur = conn.execute(f"DELETE FROM queue_items WHERE prompt_id IN ({placeholders})", tuple(batch))
+                removed += cur.rowcount or 0
+            for h in hashes:
+                self.blobs.release(conn, h)
+            conn.commit()
+        return removed
+
     def get_job(self, prompt_id: str) -> Optional[Dict[str, Any]]:
         with self._get_conn() as conn:
             cur = conn.execute('SELECT * FROM queue_items WHERE prompt_id = ?', (prompt_id,))
             row = cur.fetchone()
-            return dict(row) if row else None
+            if not row:
+                return None
+            return self.blobs.hydrate(conn, [dict(row)])[0]
 
-    def get_pending_jobs(self) -> List[Dict[str, Any]]:
-        """Get all pending jobs ordered by priority (higher first), then created_at"""
+    def get_jobs_by_ids(self, prompt_ids: List[str], fields: Any = None) -> Dict[str, Dict[str, Any]]:
+        """Return prompt_id -> queue row (workflow hydrated) for the given ids; fields as in _select_list."""
+        out: Dict[str, Dict[str, Any]] = {}
+        ids = [str(pid) for pid in prompt_ids if pid]
+        cols = self._select_list(fields, self.QUEUE_SUMMARY_FIELDS, ('workflow',))
         with self._get_conn() as conn:
-            cursor = conn.execute(
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                placeholders = ",".join(["?"] * len(batch))
+                cur = conn.execute(f"SELECT {cols} FROM queue_items WHERE prompt_id IN ({placeholders})", tuple(batch))
+                rows = self.blobs.hydrate(conn, [dict(r) for r in cur.fetchall()])
+                for r in rows:
+                    out[str(r['prompt_id'])] = r
+        return out
+
+    def get_job_names(self, prompt_ids: List[str]) -> Dict[str, Optional[str]]:
+        """Return prompt_id -> user-facing job name (None when unnamed) for the given ids.
+
+        Served from the display_name column; only rows the metadata backfill has not reached
+        yet are read from their workflow.
+        """
+        names: Dict[str, Optional[str]] = {}
+        ids = [str(pid) for pid in prompt_ids if pid]
+        with self._get_conn() as conn:
+            # Batch to stay below SQLite's host parameter limit
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                placeholders = ",".join(["?"] * len(batch))
+                cur = conn.execute(
+                    f"SELECT prompt_id, display_name, node_count, workflow, workflow_hash FROM queue_items WHERE prompt_id IN ({placeholders})",
+                    tuple(batch),
+                )
+                legacy: List[Dict[str, Any]] = []
+                for r in cur.fetchall():
+                    if r['node_count'] is None:
+                        legacy.append(dict(r))
+                    else:
+                        names[str(r['prompt_id'])] = r['display_name']
+                for row in self.blobs.hydrate(conn, legacy):
+                    names[str(row['prompt_id'])] = display_name(row['workflow'])
+        return names
+
+    def count_pending_jobs(self) -> int:
+        with self._get_conn() as conn:
+            return int(conn.execute("SELECT COUNT(*) FROM queue_items WHERE status = 'pending'").fetchone()[0])
+
+    def get_pending_job_ids(self) -> List[str]:
+        """Pending prompt_ids in get_pending_jobs() order, without reading workflows."""
+        with self._get_conn() as conn:
+            cur = conn.execute(
+                '''
+                SELECT prompt_id FROM queue_items
+                WHERE status = 'pending'
+                ORDER BY priority DESC, created_at ASC, id ASC
+                '''
+            )
+            return [str(r['prompt_id']) for r in cur.fetchall()]
+
+    def iter_pending_jobs(self, batch_size: int = 200) -> Iterator[List[Dict[str, Any]]]:
+        """Yield pending jobs (workflow hydrated) in batches, in queue order.
+
+        Rows with a rank come first, by rank; rows saved before ranks existed follow in
+        get_pending_jobs() order.
+        """
+        with self._get_conn() as conn:
+            cur = conn.execute(
                 '''
-                SELECT * FROM queue_items 
+                SELECT * FROM queue_items
                 WHERE status = 'pending'
-                ORDER BY priority DESC, created_at ASC
+                ORDER BY rank IS NULL, rank ASC, priority DESC, created_at ASC, id ASC
                 '''
             )
-            return [dict(row) for row in cursor.fetchall()]
+            while True:
+                rows = cur.fetchmany(int(batch_size))
+                if not rows:
+                    break
+                yield self.blobs.hydrate(conn, [dict(r) for r in rows])
+
+    def get_pending_ranks(self) -> List[Tuple[str, Optional[float]]]:
+        """(prompt_id, rank) of pending jobs in iter_pending_jobs() order, without reading workflows."""
+        with self._get_conn() as conn:
+            cur = conn.execute(
+                '''
+                SELECT prompt_id, rank FROM queue_items
+                WHERE status = 'pending'
+                ORDER BY rank IS NULL, rank ASC, priority DESC, created_at ASC, id ASC
+                '''
+            )
+            return [(str(r['prompt_id']), r['rank']) for r in cur.fetchall()]
+
+    def get_pending_jobs(self, fields: Any = None) -> List[Dict[str, Any]]:
+        """Get all pending jobs ordered by priority (higher first), then created_at; fields as in _select_list"""
+        cols = self._select_list(fields, self.QUEUE_SUMMARY_FIELDS, ('workflow',))
+        with self._get_conn() as conn:
+            cursor = conn.execute(
+                f'''
+                SELECT {cols} FROM queue_items
+                WHERE status = 'pending'
+                ORDER BY priority DESC, created_at ASC, id ASC
+                '''
+            )
+            return self.blobs.hydrate(conn, [dict(row) for row in cursor.fetchall()])
 
     def update_job_status(self, prompt_id: str, status: str, error: Optional[str] = None) -> None:
         """Update job status and timestamps"""
@@ -148,11 +994,127 @@ class QueueDatabase:
                 )
             conn.commit()
 
+    def record_completion(
+        self,
+        prompt_id: str,
+        state: str,
+        status_str: Optional[str],
+        outputs: Optional[dict],
+        error: Optional[str] = None,
+    ) -> int:
+        """Cheaply and durably record that a job finished.
+
+        Updates the queue_items status and appends a history_journal entry in one
+        transaction. The expensive history row and thumbnails are written later by
+        add_history(journal_id=...), which also retires the journal entry.
+        Returns the journal id.
+        """
+        now = datetime.now()
+        with self._get_conn() as conn:
+            conn.execute(
+                '''
+                UPDATE queue_items 
+                SET status = ?, completed_at = ?, error = ?
+                WHERE prompt_id = ?
+                ''',
+                (state, now, error, prompt_id),
+            )
+            cur = conn.execute(
+                '''
+                INSERT INTO history_journal (prompt_id, state, status_str, outputs, created_at)
+                VALUES (?, ?, ?, ?, ?)
+                ''',
+                (prompt_id, state, status_str, json.dumps(outputs) if outputs is not None else None, now),
+            )
+            conn.commit()
+            return int(cur.lastrowid)
+
+    def get_history_journal(self) -> List[Dict[str, Any]]:
+        """Return journal entries not yet turned into history rows, oldest first."""
+        with self._get_conn() as conn:
+            cur = conn.execute('SELECT * FROM history_journal ORDER BY id ASC')
+            return [dict(row) for row in cur.fetchall()]
+
+    def update_jobs_status(self, prompt_ids: List[str], status: str, error: Optional[str] = None) -> None:
+        """Set a terminal status (e.g. 'cancelled') on many queue rows in one transaction."""
+        ids = [str(pid) for pid in prompt_ids if pid]
+        now = datetime.now()
+        with self._get_conn() as conn:
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                placeholders = ",".join(["?"] * len(batch))
+                conn.execute(
+                    f"UPDATE queue_items SET status = ?, completed_at = ?, error = ? WHERE prompt_id IN ({placeholders})",
+                    (status, now, error, *batch),
+                )
+            conn.commit()
+
+    def mark_jobs_failed(self, errors: Dict[str, Optional[str]]) -> None:
+        """Mark many jobs failed with their own error messages in one transaction."""
+        now = datetime.now()
+        with self._get_conn() as conn:
+            conn.executemany(
+                'UPDATE queue_items SET status = ?, completed_at = ?, error = ? WHERE prompt_id = ?',
+                [('failed', now, err, str(pid)) for pid, err in errors.items()],
+            )
+            conn.commit()
+
+    def update_jobs_priority(self, priorities: Dict[str, int]) -> None:
+        """Set priorities for many queue rows in one transaction."""
+        with self._get_conn() as conn:
+            conn.executemany(
+                'UPDATE queue_items SET priority = ? WHERE prompt_id = ?',
+                [(int(p), str(pid)) for pid, p in priorities.items()],
+            )
+            conn.commit()
+
+    def update_job_ranks(self, ranks: Dict[str, float]) -> None:
+        """Persist queue numbers; a single move writes one row."""
+        if not ranks:
+            return
+        with self._get_conn() as conn:
+            conn.executemany(
+                'UPDATE queue_items SET rank = ? WHERE prompt_id = ?',
+                [(float(r), str(pid)) for pid, r in ranks.items()],
+            )
+            conn.commit()
+
     def update_job_priority(self, prompt_id: str, new_priority: int) -> None:
         with self._get_conn() as conn:
             conn.execute('UPDATE queue_items SET priority = ? WHERE prompt_id = ?', (new_priority, prompt_id))
             conn.commit()
 
+    def get_priority_neighbors(self, prompt_id: str, limit: int = 8) -> Tuple[List[str], List[str]]:
+        """Pending prompt_ids just before and just after prompt_id in get_pending_jobs() order.
+
+        Each list starts with the nearest neighbour and holds up to `limit` ids. Ties on
+        created_at are broken by id. Both sides are index range scans.
+        """
+        with self._get_conn() as conn:
+            me = conn.execute('SELECT id, priority, created_at FROM queue_items WHERE prompt_id = ?', (prompt_id,)).fetchone()
+            if me is None:
+                return [], []
+            p, c, rid, n = int(me['priority'] or 0), me['created_at'], int(me['id']), int(limit)
+            before = [r[0] for r in conn.execute(
+                "SELECT prompt_id FROM queue_items WHERE status = 'pending' AND priority = ? AND (created_at < ? OR (created_at = ? AND id < ?)) "
+                "ORDER BY created_at DESC, id DESC LIMIT ?", (p, c, c, rid, n),
+            )]
+            if len(before) < n:
+                before += [r[0] for r in conn.execute(
+                    "SELECT prompt_id FROM queue_items WHERE status = 'pending' AND priority > ? "
+                    "ORDER BY priority ASC, created_at DESC, id DESC LIMIT ?", (p, n - len(before)),
+                )]
+            after = [r[0] for r in conn.execute(
+                "SELECT prompt_id FROM queue_items WHERE status = 'pending' AND priority = ? AND (created_at > ? OR (created_at = ? AND id > ?)) "
+                "ORDER BY created_at ASC, id ASC LIMIT ?", (p, c, c, rid, n),
+            )]
+            if len(after) < n:
+                after += [r[0] for r in conn.execute(
+                    "SELECT prompt_id FROM queue_items WHERE status = 'pending' AND priority < ? "
+                    "ORDER BY priority DESC, created_at ASC, id ASC LIMIT ?", (p, n - len(after)),
+                )]
+        return [str(x) for x in before], [str(x) for x in after]
+
     def update_job_name(self, prompt_id: str, new_name: str) -> bool:
         """Update the human-friendly name in the stored workflow JSON.
 
@@ -160,25 +1122,56 @@ class QueueDatabase:
         Returns True on success, False if no such job.
         """
         with self._get_conn() as conn:
-            cur = conn.execute('SELECT workflow FROM queue_items WHERE prompt_id = ? LIMIT 1', (prompt_id,))
-            row = cur.fetchone()
-            if not row:
-                return False
-            wf_text = row['workflow']
-            try:
-                wf = json.loads(wf_text) if isinstance(wf_text, str) else (wf_text or {})
-            except Exception:
-                wf = {}
-            # Prefer nested workflow.name if object contains a workflow field
-            if isinstance(wf, dict):
-                if isinstance(wf.get('workflow'), dict):
-                    wf['workflow']['name'] = str(new_name)
-                else:
-                    wf['name'] = str(new_name)
-            updated = json.dumps(wf) if wf is not None else None
-            conn.execute('UPDATE queue_items SET workflow = ? WHERE prompt_id = ?', (updated, prompt_id))
+            ok = self._rename_job(conn, prompt_id, new_name)
+            conn.commit()
+        if ok:
+            # Names are searchable; cached filtered totals may no longer match
+            self.counts.invalidate()
+        return ok
+
+    def update_job_names(self, names: Dict[str, str]) -> List[str]:
+        """Rename many jobs in one transaction. Returns the prompt_ids that exist and were renamed."""
+        renamed: List[str] = []
+        with self._get_conn() as conn:
+            for pid, name in names.items():
+                if self._rename_job(conn, str(pid), name):
+                    renamed.append(str(pid))
             conn.commit()
-            return True
+        if renamed:
+            self.counts.invalidate()
+        return renamed
+
+    def _rename_job(self, conn: sqlite3.Connection, prompt_id: str, new_name: str) -> bool:
+        cur = conn.execute('SELECT workflow, workflow_hash FROM queue_items WHERE prompt_id = ? LIMIT 1', (prompt_id,))
+        row = cur.fetchone()
+        if not row:
+            return False
+        old_hash = row['workflow_hash']
+        wf_text = self.blobs.hydrate(conn, [dict(row)])[0]['workflow']
+        try:
+            wf = json.loads(wf_text) if isinstance(wf_text, str) else (wf_text or {})
+        except Exception:
+            wf = {}
+        # Prefer nested workflow.name if object contains a workflow field
+        if isinstance(wf, dict):
+            if isinstance(wf.get('workflow'), dict):
+                wf['workflow']['name'] = str(new_name)
+            else:
+                wf['name'] = str(new_name)
+        updated = json.dumps(wf) if wf is not None else None
+        new_hash = self.blobs.put(conn, updated)
+        conn.execute(
+            'UPDATE queue_items SET workflow = NULL, workflow_hash = ?, display_name = ? WHERE prompt_id = ?',
+            (new_hash, display_name(wf), prompt_id),
+        )
+        if old_hash and old_hash != new_hash:
+            self.blobs.release(conn, old_hash)
+        conn.execute('UPDATE job_history SET display_name = ? WHERE prompt_id = ?', (display_name(wf), prompt_id))
+        try:
+            self.search.update_name(conn, prompt_id, str(new_name))
+        except Exception as e:
+            logging.debug(f"PersistentQueue: search index rename failed: {e}")
+        return True
 
     def add_history(
         self,
@@ -187,7 +1180,9 @@ class QueueDatabase:
         outputs: Optional[dict],
         status: str,
         duration_seconds: Optional[float] = None,
+        journal_id: Optional[int] = None,
     ) -> int:
+        """Insert a history row; when journal_id is given the journal entry is retired in the same transaction."""
         with self._get_conn() as conn:
             # Prefer accurate timestamps from queue_items when available
             def _parse_dt(val: Any) -> Optional[datetime]:
@@ -230,73 +1225,155 @@ class QueueDatabase:
                 created_at = datetime.now()
             if completed_at is None:
                 completed_at = created_at
+            fingerprint = self.durations.fingerprint(workflow)
+            summary = history_summary(workflow, outputs)
 
             cur = conn.execute(
                 '''
-                INSERT INTO job_history (prompt_id, workflow, outputs, duration_seconds, created_at, completed_at, status)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
+                INSERT INTO job_history (prompt_id, workflow_hash, fingerprint, outputs, duration_seconds, created_at, completed_at, status,
+                                         display_name, image_count, primary_image)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ''',
                 (
                     prompt_id,
-                    json.dumps(workflow) if workflow is not None else None,
+                    self.blobs.put(conn, json.dumps(workflow)) if workflow is not None else None,
+                    fingerprint,
                     json.dumps(outputs) if outputs is not None else None,
                     duration_seconds,
                     created_at,
                     completed_at,
                     status,
+                    summary['display_name'],
+                    summary['image_count'],
+                    summary['primary_image'],
                 ),
             )
+            history_id = int(cur.lastrowid)
+            try:
+                self.search.index_row(conn, history_id, prompt_id, workflow, outputs)
+            except Exception as e:
+                logging.debug(f"PersistentQueue: search indexing failed for {prompt_id}: {e}")
+            touched: List[str] = []
+            if self.durations.is_sample(status, duration_seconds):
+                touched = self.durations.record(conn, fingerprint, float(duration_seconds))
+            if journal_id is not None:
+                conn.execute('DELETE FROM history_journal WHERE id = ?', (int(journal_id),))
             conn.commit()
-            return int(cur.lastrowid)
+            self.durations.invalidate(touched)
+            return history_id
 
     def save_history_thumbnails(self, history_id: int, thumbs: List[Dict[str, Any]]) -> None:
-        """Store one or more thumbnails for a history row. Each item: {idx, mime, width, height, data(bytes)}"""
+        """Store one or more thumbnails for a history row. Each item: {idx, mime, width, height, data(bytes)}
+
+        Image bytes go to the thumbnail file store; they are kept inline only if writing the file fails.
+        """
         if not thumbs:
             return
+        rows = []
+        for t in thumbs:
+            mime = t.get('mime', 'image/webp')
+            data = t.get('data') or b''
+            size = len(data)
+            key = None
+            try:
+                key = self.thumb_files.put(bytes(data), mime)
+                data = b''
+            except Exception as e:
+                logging.debug(f"PersistentQueue: writing thumbnail file failed, storing inline: {e}")
+            rows.append((
+                int(history_id),
+                int(t.get('idx', 0)),
+                mime,
+                int(t.get('width') or 0),
+                int(t.get('height') or 0),
+                sqlite3.Binary(data),
+                key,
+                size,
+            ))
         with self._get_conn() as conn:
-            for t in thumbs:
-                conn.execute(
-                    '''
-                    INSERT OR REPLACE INTO history_thumbs (history_id, idx, mime, width, height, data)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                    ''',
-                    (
-                        int(history_id),
-                        int(t.get('idx', 0)),
-                        t.get('mime', 'image/webp'),
-                        int(t.get('width') or 0),
-                        int(t.get('height') or 0),
-                        t.get('data'),
-                    )
-                )
+            conn.executemany(
+                '''
+                INSERT OR REPLACE INTO history_thumbs (history_id, idx, mime, width, height, data, blob_key, size)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''',
+                rows,
+            )
             conn.commit()
 
     def get_history_thumbnail(self, history_id: int, idx: int = 0) -> Optional[Dict[str, Any]]:
+        """Thumbnail metadata plus either 'path' (file store) or inline 'data', and a strong 'etag'."""
+        return self.get_history_thumbnails([history_id], idx).get(int(history_id))
+
+    def get_history_thumbnails(self, history_ids: List[int], idx: int = 0) -> Dict[int, Dict[str, Any]]:
+        """Like get_history_thumbnail for many history rows at once; rows without a thumbnail are omitted."""
+        ids = list(dict.fromkeys(int(i) for i in history_ids))
+        out: Dict[int, Dict[str, Any]] = {}
+        with self._get_conn() as conn:
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                placeholders = ",".join(["?"] * len(batch))
+                cur = conn.execute(
+                    f'SELECT history_id, mime, width, height, blob_key, data FROM history_thumbs WHERE idx = ? AND history_id IN ({placeholders})',
+                    (int(idx), *batch),
+                )
+                for row in cur.fetchall():
+                    thumb = self._thumb_from_row(row)
+                    if thumb is not None:
+                        out[int(row['history_id'])] = thumb
+        return out
+
+    def _thumb_from_row(self, row: sqlite3.Row) -> Optional[Dict[str, Any]]:
+        out = { 'mime': row['mime'], 'width': row['width'], 'height': row['height'], 'path': None, 'data': None }
+        path = self.thumb_files.path(row['blob_key'])
+        if path and os.path.isfile(path):
+            out['path'] = path
+            out['etag'] = self.thumb_files.etag(row['blob_key'])
+        elif row['data']:
+            data = bytes(row['data'])
+            out['data'] = data
+            out['etag'] = self.thumb_files.etag(self.thumb_files.key_for(data, row['mime']))
+        else:
+            return None
+        return out
+
+    def get_history_export_batch(self, after_id: int = 0, limit: int = 100, with_thumbs: bool = False) -> List[Dict[str, Any]]:
+        """History rows with id > after_id in id order (workflow hydrated), for streaming exports.
+
+        With with_thumbs each row gets 'thumbs': [{idx, mime, width, height, path|data}].
+        """
         with self._get_conn() as conn:
             cur = conn.execute(
-                'SELECT mime, width, height, data FROM history_thumbs WHERE history_id = ? AND idx = ? LIMIT 1',
-                (int(history_id), int(idx))
+                'SELECT id, prompt_id, workflow, workflow_hash, outputs, status, duration_seconds, created_at, completed_at '
+                'FROM job_history WHERE id > ? ORDER BY id LIMIT ?',
+                (int(after_id), int(limit)),
             )
-            row = cur.fetchone()
-            if not row:
-                return None
-            return { 'mime': row['mime'], 'width': row['width'], 'height': row['height'], 'data': row['data'] }
+            rows = self.blobs.hydrate(conn, [dict(r) for r in cur.fetchall()])
+            for r in rows:
+                r.pop('workflow_hash', None)
+            if with_thumbs and rows:
+                by_id = {r['id']: r for r in rows}
+                for r in rows:
+                    r['thumbs'] = []
+                placeholders = ",".join(["?"] * len(by_id))
+                cur = conn.execute(
+                    f'SELECT history_id, idx, mime, width, height, blob_key, data FROM history_thumbs '
+                    f'WHERE history_id IN ({placeholders}) ORDER BY history_id, idx',
+                    tuple(by_id),
+                )
+                for row in cur.fetchall():
+                    thumb = self._thumb_from_row(row)
+                    if thumb is not None:
+                        thumb['idx'] = int(row['idx'])
+                        by_id[int(row['history_id'])]['thumbs'].append(thumb)
+        return rows
 
-    def list_history(self, limit: int = 50) -> List[Dict[str, Any]]:
+    def list_history(self, limit: int = 50, fields: Any = None) -> List[Dict[str, Any]]:
+        cols = self._select_list(fields, self.HISTORY_SUMMARY_FIELDS, ('workflow', 'outputs'))
         with self._get_conn() as conn:
-            # On-the-fly lightweight backfill for rows missing duration or with identical timestamps
-            try:
-                if not self._backfilled_once:
-                    self._backfill_history_rows(conn)
-                    self._backfilled_once = True
-            except Exception:
-                # Non-fatal if backfill fails
-                pass
-
             cur = conn.execute(
-                'SELECT * FROM job_history ORDER BY id DESC LIMIT ?', (limit,)
+                f'SELECT {cols} FROM job_history ORDER BY id DESC LIMIT ?', (limit,)
             )
-            return [dict(row) for row in cur.fetchall()]
+            return self.blobs.hydrate(conn, [dict(row) for row in cur.fetchall()])
 
     def list_history_paginated(
         self,
@@ -312,14 +1389,20 @@ class QueueDatabase:
         until: Optional[str] = None,
         min_duration: Optional[float] = None,
         max_duration: Optional[float] = None,
+        include_total: bool = True,
+        fields: Any = None,
     ) -> Dict[str, Any]:
         """Keyset paginated history listing supporting basic filtering and sorting.
 
+        fields selects the row columns (see _select_list); "summary" never reads workflow or
+        outputs, whatever the filters.
+
         Returns a dict: {
             'history': [...],
             'next_cursor': { 'id': int, 'value': any }|None,
             'has_more': bool,
-            'total': int  # total rows matching filters (ignores cursor and limit)
+            'total': int|None,  # rows matching filters (ignores cursor and limit); None unless include_total
+            'total_estimated': bool  # total is a recently cached count that may be slightly off
         }
         """
         # Normalize and validate inputs
@@ -354,10 +1437,17 @@ class QueueDatabase:
             where_clauses.append("duration_seconds <= ?")
             params.append(float(max_duration))
 
-        if q:
+        match = self.search.match_expression(q) if (q and self.search.available and self._search_ready) else None
+        if match:
+            where_clauses.append(f"id IN (SELECT rowid FROM {self.search.TABLE} WHERE {self.search.TABLE} MATCH ?)")
+            params.append(match)
+        elif q:
             like = f"%{q}%"
-            where_clauses.append("(prompt_id LIKE ? OR (workflow IS NOT NULL AND workflow LIKE ?) OR (outputs IS NOT NULL AND outputs LIKE ?))")
-            params.extend([like, like, like])
+            where_clauses.append(
+                "(prompt_id LIKE ? OR (workflow IS NOT NULL AND workflow LIKE ?) OR (outputs IS NOT NULL AND outputs LIKE ?)"
+                f" OR workflow_hash IN (SELECT hash FROM {self.blobs.TABLE} WHERE pq_workflow_text(codec, data) LIKE ?))"
+            )
+            params.extend([like, like, like, like])
 
         # Preserve filter-only clauses/params for total count BEFORE adding keyset cursor params
         filter_only_clauses = list(where_clauses)
@@ -386,18 +1476,11 @@ class QueueDatabase:
         has_more = False
         next_cursor: Optional[Dict[str, Any]] = None
         with self._get_conn() as conn:
-            # backfill pass once per process lifetime
-            try:
-                if not self._backfilled_once:
-                    self._backfill_history_rows(conn)
-                    self._backfilled_once = True
-            except Exception:
-                pass
-
-            sql = f"SELECT * FROM job_history{where_sql}{order_sql} LIMIT ?"
+            cols = self._select_list(fields, self.HISTORY_SUMMARY_FIELDS, ('workflow', 'outputs'), required=(sort_by,))
+            sql = f"SELECT {cols} FROM job_history{where_sql}{order_sql} LIMIT ?"
             try:
                 cur = conn.execute(sql, (*params, int(limit) + 1))
-                fetched = [dict(row) for row in cur.fetchall()]
+                fetched = self.blobs.hydrate(conn, [dict(row) for row in cur.fetchall()])
             except Exception:
                 fetched = []
 
@@ -411,99 +1494,113 @@ class QueueDatabase:
                 val = last.get(sort_by)
                 next_cursor = {"id": last.get("id"), "value": val}
 
-            # Compute total count for filters (without keyset and limit)
-            total = 0
-            try:
+            # Total for the filters (without keyset and limit): from the status counters or the count cache
+            total: Optional[int] = None
+            estimated = False
+            if include_total:
+                filters = {
+                    "status": status, "q": q, "since": since, "until": until,
+                    "min_duration": min_duration, "max_duration": max_duration,
+                }
                 where_only_sql = (" WHERE " + " AND ".join(filter_only_clauses)) if filter_only_clauses else ""
                 count_sql = f"SELECT COUNT(*) AS c FROM job_history{where_only_sql}"
-                cur = conn.execute(count_sql, (*filter_only_params,))
-                row = cur.fetchone()
-                if row is not None:
-                    # sqlite3.Row supports index and key access
-                    total = int(row[0] if 0 in row.keys() else (row["c"] if "c" in row.keys() else row[0]))
-            except Exception:
-                total = 0
+                try:
+                    total, estimated = self.counts.total(conn, filters, count_sql, tuple(filter_only_params))
+                except Exception as e:
+                    logging.debug(f"PersistentQueue: history total failed: {e}")
+                    total = 0
+            else:
+                self.counts.skipped()
 
-        return {"history": rows, "next_cursor": next_cursor, "has_more": has_more, "total": total}
+        return {"history": rows, "next_cursor": next_cursor, "has_more": has_more, "total": total, "total_estimated": estimated}
 
     def get_job_timestamps_and_workflow(self, prompt_id: str) -> Optional[Dict[str, Any]]:
         """Return created_at/started_at/completed_at and workflow JSON (text) for a given prompt_id."""
         with self._get_conn() as conn:
             cur = conn.execute(
-                'SELECT created_at, started_at, completed_at, workflow FROM queue_items WHERE prompt_id = ?',
+                'SELECT created_at, started_at, completed_at, workflow, workflow_hash FROM queue_items WHERE prompt_id = ?',
                 (prompt_id,),
             )
             row = cur.fetchone()
-            return dict(row) if row else None
+            if not row:
+                return None
+            out = self.blobs.hydrate(conn, [dict(row)])[0]
+            out.pop('workflow_hash', None)
+            return out
 
-    def get_average_duration_for_workflow(self, workflow_text: Optional[str], min_samples: int = 2) -> Optional[float]:
-        """Compute an average historical duration for a given workflow text. Returns None if not enough data."""
-        if not workflow_text:
-            return None
+    def get_history_item(self, history_id: int) -> Optional[Dict[str, Any]]:
+        """One full history row (workflow hydrated, outputs as stored) for detail views."""
         with self._get_conn() as conn:
-            try:
-                cur = conn.execute(
-                    '''
-                    SELECT duration_seconds FROM job_history 
-                    WHERE workflow = ? AND duration_seconds IS NOT NULL AND duration_seconds > 0
-                    ORDER BY id DESC LIMIT 20
-                    ''',
-                    (workflow_text,),
-                )
-                vals = [float(r['duration_seconds']) for r in cur.fetchall()]
-                if len(vals) < min_samples:
-                    return None
-                # Use median for robustness
-                vals.sort()
-                n = len(vals)
-                if n % 2 == 1:
-                    return vals[n // 2]
-                else:
-                    return (vals[n // 2 - 1] + vals[n // 2]) / 2.0
-            except Exception:
+            row = conn.execute('SELECT * FROM job_history WHERE id = ?', (int(history_id),)).fetchone()
+            if not row:
                 return None
+            return self.blobs.hydrate(conn, [dict(row)])[0]
 
-    def _backfill_history_rows(self, conn: sqlite3.Connection) -> None:
-        """Compute and set duration_seconds/accurate timestamps for existing history rows when possible."""
-        try:
+    def get_history_workflow(self, prompt_id: str) -> Optional[str]:
+        """Return the stored workflow JSON text of the most recent history row for prompt_id."""
+        with self._get_conn() as conn:
             cur = conn.execute(
-                '''
-                SELECT j.id as jid, j.created_at as j_created, j.completed_at as j_completed, j.duration_seconds as j_dur,
-                       j.prompt_id as pid, qi.created_at as qi_created, qi.started_at as qi_started, qi.completed_at as qi_completed
-                FROM job_history j
-                LEFT JOIN queue_items qi ON qi.prompt_id = j.prompt_id
-                WHERE (j.duration_seconds IS NULL OR j.duration_seconds <= 0 OR j.created_at = j.completed_at)
-                      AND qi.completed_at IS NOT NULL
-                '''
+                'SELECT workflow, workflow_hash FROM job_history WHERE prompt_id = ? ORDER BY id DESC LIMIT 1',
+                (prompt_id,),
             )
-            rows = cur.fetchall()
-            if not rows:
-                return
-
-            def _parse_dt(val: Any) -> Optional[datetime]:
-                if val is None:
-                    return None
-                if isinstance(val, datetime):
-                    return val
-                if isinstance(val, str):
-                    try:
-                        return datetime.fromisoformat(val)
-                    except Exception:
-                        return None
+            row = cur.fetchone()
+            if not row:
                 return None
+            return self.blobs.hydrate(conn, [dict(row)])[0].get('workflow')
 
-            for r in rows:
-                started = _parse_dt(r['qi_started']) or _parse_dt(r['qi_created']) or _parse_dt(r['j_created']) or datetime.now()
-                completed = _parse_dt(r['qi_completed']) or _parse_dt(r['j_completed']) or started
-                try:
-                    dur = max(0.0, (completed - started).total_seconds())
-                except Exception:
-                    dur = None
-                conn.execute(
-                    'UPDATE job_history SET duration_seconds = ?, created_at = ?, completed_at = ? WHERE id = ?',
-                    (dur, started, completed, r['jid'])
-                )
-            conn.commit()
+    def get_average_duration_for_workflow(self, workflow_text: Optional[str], min_samples: int = 2) -> Optional[float]:
+        """Median historical duration for workflows structurally equal to workflow_text. Returns None if not enough data."""
+        fp = self.durations.fingerprint(workflow_text)
+        if not fp:
+            return None
+        try:
+            with self._get_conn() as conn:
+                stats = self.durations.get_many(conn, [fp]).get(fp)
         except Exception:
-            # Ignore errors; not critical
-            return
\ No newline at end of file
+            return None
+        if not stats or stats['count'] < min_samples:
+            return None
+        return stats['median']
+
+    def get_queue_eta(self, items: List[Tuple[str, Any]]) -> Dict[str, Any]:
+        """Estimate run time for queue items in one pass.
+
+        items: (prompt_id, prompt or None) pairs; the prompt is only fingerprinted when the
+        queue row has no stored fingerprint. Per-item estimates use the median of the item's
+        fingerprint, falling back to the global median for never-seen graphs.
+        """
+        pids = [str(pid) for pid, _ in items if pid]
+        fps: Dict[str, Optional[str]] = {}
+        with self._get_conn() as conn:
+            for i in range(0, len(pids), 500):
+                batch = pids[i:i + 500]
+                placeholders = ",".join(["?"] * len(batch))
+                cur = conn.execute(f"SELECT prompt_id, fingerprint FROM queue_items WHERE prompt_id IN ({placeholders})", tuple(batch))
+                for r in cur.fetchall():
+                    fps[str(r['prompt_id'])] = r['fingerprint']
+            for pid, prompt in items:
+                pid = str(pid)
+                if not fps.get(pid) and prompt is not None:
+                    fps[pid] = self.durations.fingerprint(prompt)
+            stats = self.durations.get_many(conn, [*fps.values(), GLOBAL_KEY])
+        fallback = stats.get(GLOBAL_KEY)
+        out: Dict[str, Dict[str, Any]] = {}
+        total = 0.0
+        total_p90 = 0.0
+        for pid in pids:
+            s = stats.get(fps.get(pid)) if fps.get(pid) else None
+            source = 'fingerprint'
+            if not s:
+                s, source = fallback, 'global'
+            if not s or s.get('median') is None:
+                out[pid] = {'seconds': None, 'p90': None, 'samples': 0, 'source': None}
+                continue
+            out[pid] = {'seconds': s['median'], 'p90': s['p90'], 'samples': s['count'], 'source': source}
+            total += float(s['median'] or 0)
+            total_p90 += float(s['p90'] or s['median'] or 0)
+        return {
+            'items': out,
+            'total_seconds': total or None,
+            'total_p90_seconds': total_p90 or None,
+            'global_median': fallback['median'] if fallback else None,
+        }
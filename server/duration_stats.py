@@ -0,0 +1,151 @@
+import json
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Optional, Any, Dict, Iterable, List
+
+# Rolling window of most recent durations kept per fingerprint
+_WINDOW = 50
+# Key of the row aggregating every fingerprint; fallback for never-seen graphs
+GLOBAL_KEY = "*"
+# Statuses whose durations are representative of a full run
+_SUCCESS_STATUSES = ("success", "completed", "done")
+
+
+def _percentile(sorted_vals: List[float], pct: float) -> Optional[float]:
+    if not sorted_vals:
+        return None
+    if len(sorted_vals) == 1:
+        return sorted_vals[0]
+    pos = (len(sorted_vals) - 1) * pct
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (pos - lo)
+
+
+class DurationStats:
+    """Per-workflow-structure duration statistics used for ETAs.
+
+    Workflows are keyed by a structural fingerprint: node class types and how they are wired,
+    ignoring literal widget values (seeds, prompt text, ...) so re-runs of the same graph share
+    statistics. Each fingerprint keeps a rolling window of recent durations with its median
+    and p90 precomputed, updated incrementally as history rows are written.
+    """
+
+    TABLE = "duration_stats"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Optional[Dict[str, Any]]] = {}
+        # Bumped on every invalidation so a read that raced a commit is not cached
+        self._generation = 0
+
+    def ensure_schema(self, conn: sqlite3.Connection) -> None:
+        conn.execute(
+            f'''
+            CREATE TABLE IF NOT EXISTS {self.TABLE} (
+                fingerprint TEXT PRIMARY KEY,
+                samples TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                median REAL,
+                p90 REAL,
+                updated_at TIMESTAMP
+            )
+            '''
+        )
+
+    @staticmethod
+    def fingerprint(workflow: Any) -> Optional[str]:
+        """Structural hash of a prompt graph; None when it has no recognizable nodes."""
+        if isinstance(workflow, str):
+            try:
+                workflow = json.loads(workflow)
+            except Exception:
+                return None
+        if not isinstance(workflow, dict):
+            return None
+        nodes = {str(k): v for k, v in workflow.items() if isinstance(v, dict) and isinstance(v.get('class_type'), str)}
+        if not nodes:
+            return None
+        # Node ids are arbitrary; describe each node by class type and its incoming links
+        # (input name -> source class type and slot) so renumbered copies hash the same
+        parts: List[str] = []
+        for node in nodes.values():
+            links: List[str] = []
+            inputs = node.get('inputs')
+            if isinstance(inputs, dict):
+                for name, value in inputs.items():
+                    if isinstance(value, list) and len(value) == 2 and str(value[0]) in nodes:
+                        src = nodes[str(value[0])].get('class_type')
+                        links.append(f"{name}<{src}:{value[1]}")
+            parts.append(node['class_type'] + "(" + ",".join(sorted(links)) + ")")
+        parts.sort()
+        return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def is_sample(status: Optional[str], duration_seconds: Optional[float]) -> bool:
+        try:
+            return str(status or "").lower() in _SUCCESS_STATUSES and float(duration_seconds) > 0
+        except (TypeError, ValueError):
+            return False
+
+    def record(self, conn: sqlite3.Connection, fingerprint: Optional[str], duration_seconds: float) -> List[str]:
+        """Fold one duration into the fingerprint's window and the global window.
+
+        Returns the keys touched; pass them to invalidate() once the transaction commits.
+        """
+        keys = [fingerprint, GLOBAL_KEY] if fingerprint else [GLOBAL_KEY]
+        for key in keys:
+            row = conn.execute(f"SELECT samples, count FROM {self.TABLE} WHERE fingerprint = ?", (key,)).fetchone()
+            samples: List[float] = []
+            count = 0
+            if row is not None:
+                try:
+                    samples = [float(v) for v in json.loads(row['samples'])]
+                except Exception:
+                    samples = []
+                count = int(row['count'] or 0)
+            samples.append(float(duration_seconds))
+            samples = samples[-_WINDOW:]
+            ordered = sorted(samples)
+            conn.execute(
+                f'''
+                INSERT OR REPLACE INTO {self.TABLE} (fingerprint, samples, count, median, p90, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ''',
+                (key, json.dumps(samples), count + 1, _percentile(ordered, 0.5), _percentile(ordered, 0.9), datetime.now()),
+            )
+        return keys
+
+    def invalidate(self, keys: Optional[Iterable[str]] = None) -> None:
+        """Drop cached stats for keys (all when None)."""
+        with self._lock:
+            self._generation += 1
+            if keys is None:
+                self._cache.clear()
+                return
+            for key in keys:
+                self._cache.pop(key, None)
+
+    def get_many(self, conn: sqlite3.Connection, fingerprints: Iterable[Optional[str]]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Return fingerprint -> {median, p90, count} (None when unseen), served from cache when possible."""
+        wanted = {fp for fp in fingerprints if fp}
+        with self._lock:
+            out = {fp: self._cache[fp] for fp in wanted if fp in self._cache}
+            generation = self._generation
+        missing = [fp for fp in wanted if fp not in out]
+        for i in range(0, len(missing), 500):
+            batch = missing[i:i + 500]
+            placeholders = ",".join(["?"] * len(batch))
+            cur = conn.execute(
+                f"SELECT fingerprint, median, p90, count FROM {self.TABLE} WHERE fingerprint IN ({placeholders})",
+                tuple(batch),
+            )
+            found = {r['fingerprint']: {'median': r['median'], 'p90': r['p90'], 'count': int(r['count'] or 0)} for r in cur.fetchall()}
+            with self._lock:
+                for fp in batch:
+                    out[fp] = found.get(fp)
+                    if generation == self._generation:
+                        self._cache[fp] = out[fp]
+        return out
@@ -0,0 +1,136 @@
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Optional, Any, Dict, Tuple
+
+# Filtered counts cached per filter set
+_CACHE_LIMIT = 64
+
+
+class HistoryCounts:
+    """Row totals for paginated history without a COUNT(*) per page.
+
+    Per-status counters live in history_counts and are kept current by triggers on job_history,
+    so every insert/delete path (history writes, retention, manual cleanup) updates them in the
+    same transaction. Unfiltered and status-only totals are read from there exactly.
+
+    Other filter sets are counted once and cached by their normalized form. A cached count is
+    exact while the table version (per-status counters plus MAX(id)) is unchanged; after a
+    change it is still served, flagged as estimated, until `ttl` seconds have passed.
+    """
+
+    TABLE = "history_counts"
+
+    def __init__(self, ttl: Optional[float] = None):
+        if ttl is None:
+            try:
+                ttl = float(os.environ.get("PQUEUE_HISTORY_COUNT_TTL", "30"))
+            except ValueError:
+                ttl = 30.0
+        self.ttl = max(0.0, float(ttl))
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[Tuple[Any, ...], Tuple[int, Tuple[Any, ...], float]]" = OrderedDict()
+        self._counters = {"counter_hits": 0, "cache_hits": 0, "estimated": 0, "counted": 0, "skipped": 0}
+
+    def ensure_schema(self, conn: sqlite3.Connection) -> bool:
+        """Create the counter table and triggers. Returns True if counters were rebuilt now."""
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'history_counts_ai'"
+        ).fetchone() is not None
+        conn.execute(f'CREATE TABLE IF NOT EXISTS {self.TABLE} (status TEXT PRIMARY KEY, n INTEGER NOT NULL DEFAULT 0)')
+        key_new = "LOWER(COALESCE(NEW.status, ''))"
+        key_old = "LOWER(COALESCE(OLD.status, ''))"
+        conn.execute(
+            f'''
+            CREATE TRIGGER IF NOT EXISTS history_counts_ai AFTER INSERT ON job_history BEGIN
+                INSERT OR IGNORE INTO {self.TABLE} (status, n) VALUES ({key_new}, 0);
+                UPDATE {self.TABLE} SET n = n + 1 WHERE status = {key_new};
+            END
+            '''
+        )
+        conn.execute(
+            f'''
+            CREATE TRIGGER IF NOT EXISTS history_counts_ad AFTER DELETE ON job_history BEGIN
+                UPDATE {self.TABLE} SET n = n - 1 WHERE status = {key_old};
+            END
+            '''
+        )
+        conn.execute(
+            f'''
+            CREATE TRIGGER IF NOT EXISTS history_counts_au AFTER UPDATE OF status ON job_history
+            WHEN {key_old} IS NOT {key_new} BEGIN
+                UPDATE {self.TABLE} SET n = n - 1 WHERE status = {key_old};
+                INSERT OR IGNORE INTO {self.TABLE} (status, n) VALUES ({key_new}, 0);
+                UPDATE {self.TABLE} SET n = n + 1 WHERE status = {key_new};
+            END
+            '''
+        )
+        if exists:
+            return False
+        # Triggers are new: seed from the existing rows inside the same transaction
+        conn.execute(f'DELETE FROM {self.TABLE}')
+        conn.execute(
+            f"INSERT INTO {self.TABLE} (status, n) "
+            f"SELECT LOWER(COALESCE(status, '')), COUNT(*) FROM job_history GROUP BY LOWER(COALESCE(status, ''))"
+        )
+        return True
+
+    def per_status(self, conn: sqlite3.Connection) -> Dict[str, int]:
+        return {row[0]: int(row[1]) for row in conn.execute(f'SELECT status, n FROM {self.TABLE} WHERE n > 0')}
+
+    def version(self, conn: sqlite3.Connection, per_status: Dict[str, int]) -> Tuple[Any, ...]:
+        """Changes whenever rows are added, removed or change status."""
+        top = conn.execute('SELECT COALESCE(MAX(id), 0) FROM job_history').fetchone()[0]
+        return (int(top), tuple(sorted(per_status.items())))
+
+    def total(self, conn: sqlite3.Connection, filters: Dict[str, Any], count_sql: str, params: Tuple[Any, ...]) -> Tuple[int, bool]:
+        """Total rows matching filters as (count, estimated); runs count_sql only when needed."""
+        counts = self.per_status(conn)
+        active = {k: v for k, v in filters.items() if v is not None and v != ""}
+        if not active:
+            self._bump("counter_hits")
+            return sum(counts.values()), False
+        if set(active) == {"status"}:
+            self._bump("counter_hits")
+            return counts.get(str(active["status"]).lower(), 0), False
+
+        key = tuple(sorted((k, str(v)) for k, v in active.items()))
+        version = self.version(conn, counts)
+        now = time.monotonic()
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit is not None:
+                value, cached_version, stored_at = hit
+                if cached_version == version and now - stored_at < self.ttl:
+                    self._cache.move_to_end(key)
+                    self._counters["cache_hits"] += 1
+                    return value, False
+                if now - stored_at < self.ttl:
+                    self._counters["estimated"] += 1
+                    return value, True
+        value = int(conn.execute(count_sql, params).fetchone()[0])
+        with self._lock:
+            self._counters["counted"] += 1
+            self._cache[key] = (value, version, now)
+            self._cache.move_to_end(key)
+            while len(self._cache) > _CACHE_LIMIT:
+                self._cache.popitem(last=False)
+        return value, False
+
+    def skipped(self) -> None:
+        self._bump("skipped")
+
+    def invalidate(self) -> None:
+        """Forget cached filtered counts, e.g. after edits that do not change the table version."""
+        with self._lock:
+            self._cache.clear()
+
+    def _bump(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._counters, "cached_filters": len(self._cache), "ttl_seconds": self.ttl}
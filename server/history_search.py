@@ -0,0 +1,134 @@
+import re
+import sqlite3
+import logging
+from typing import Optional, Any, Dict, List
+
+# Per-row cap on indexed prompt text so giant widget values cannot bloat the index
+_MAX_TEXT_CHARS = 20000
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class HistorySearchIndex:
+    """FTS5 index over searchable fields extracted from job_history rows.
+
+    The index row id equals job_history.id. Indexed columns: prompt_id, job name, node class
+    types, prompt text widget values and output filenames. When the SQLite build lacks FTS5
+    (or the one-time backfill has not finished) callers fall back to LIKE scans.
+    """
+
+    TABLE = "history_fts"
+
+    def __init__(self):
+        self.available = False
+
+    def ensure_schema(self, conn: sqlite3.Connection) -> bool:
+        """Create the FTS table if possible. Returns True if it was created just now."""
+        try:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (self.TABLE,)
+            ).fetchone() is not None
+            conn.execute(
+                f'''
+                CREATE VIRTUAL TABLE IF NOT EXISTS {self.TABLE} USING fts5(
+                    prompt_id, name, node_types, prompt_text, filenames,
+                    tokenize = 'unicode61'
+                )
+                '''
+            )
+            self.available = True
+            return not exists
+        except sqlite3.OperationalError as e:
+            logging.info(f"PersistentQueue: FTS5 unavailable, history search uses LIKE scans ({e})")
+            self.available = False
+            return False
+
+    @staticmethod
+    def extract_fields(prompt_id: Optional[str], workflow: Any, outputs: Any) -> Dict[str, str]:
+        """Pull the searchable text out of a stored prompt/outputs pair."""
+        name = ""
+        node_types: List[str] = []
+        texts: List[str] = []
+        if isinstance(workflow, dict):
+            inner = workflow.get('workflow')
+            raw_name = (inner.get('name') if isinstance(inner, dict) else None) or workflow.get('name')
+            if isinstance(raw_name, str):
+                name = raw_name
+            for node in workflow.values():
+                if not isinstance(node, dict):
+                    continue
+                ct = node.get('class_type')
+                if isinstance(ct, str) and ct not in node_types:
+                    node_types.append(ct)
+                title = (node.get('_meta') or {}).get('title') if isinstance(node.get('_meta'), dict) else None
+                if isinstance(title, str) and title:
+                    texts.append(title)
+                inputs = node.get('inputs')
+                if isinstance(inputs, dict):
+                    # Literal string widget values; links are [node_id, slot] lists
+                    for v in inputs.values():
+                        if isinstance(v, str) and v.strip():
+                            texts.append(v)
+        filenames: List[str] = []
+        if isinstance(outputs, dict):
+            for v in outputs.values():
+                imgs = []
+                if isinstance(v, dict):
+                    imgs = v.get('images') or (v.get('ui') or {}).get('images') or []
+                elif isinstance(v, list):
+                    imgs = v
+                if isinstance(imgs, list):
+                    for i in imgs:
+                        if isinstance(i, dict):
+                            fn = i.get('filename') or i.get('name')
+                            if isinstance(fn, str) and fn:
+                                sub = i.get('subfolder') or ''
+                                filenames.append(f"{sub}/{fn}" if sub else fn)
+        return {
+            'prompt_id': str(prompt_id or ''),
+            'name': name,
+            'node_types': " ".join(node_types),
+            'prompt_text': "\n".join(texts)[:_MAX_TEXT_CHARS],
+            'filenames': " ".join(filenames),
+        }
+
+    def index_row(self, conn: sqlite3.Connection, history_id: int, prompt_id: Optional[str], workflow: Any, outputs: Any) -> None:
+        if not self.available:
+            return
+        f = self.extract_fields(prompt_id, workflow, outputs)
+        conn.execute(
+            f'''
+            INSERT OR REPLACE INTO {self.TABLE} (rowid, prompt_id, name, node_types, prompt_text, filenames)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ''',
+            (int(history_id), f['prompt_id'], f['name'], f['node_types'], f['prompt_text'], f['filenames']),
+        )
+
+    def update_name(self, conn: sqlite3.Connection, prompt_id: str, name: str) -> None:
+        if not self.available:
+            return
+        conn.execute(
+            f'UPDATE {self.TABLE} SET name = ? WHERE rowid IN (SELECT id FROM job_history WHERE prompt_id = ?)',
+            (str(name), prompt_id),
+        )
+
+    def delete_rows(self, conn: sqlite3.Connection, history_ids: List[int]) -> None:
+        if not self.available or not history_ids:
+            return
+        for i in range(0, len(history_ids), 500):
+            batch = [int(h) for h in history_ids[i:i + 500]]
+            placeholders = ",".join(["?"] * len(batch))
+            conn.execute(f"DELETE FROM {self.TABLE} WHERE rowid IN ({placeholders})", tuple(batch))
+
+    def optimize(self, conn: sqlite3.Connection) -> None:
+        """Merge index segments so space held by deleted rows is released (after bulk deletes)."""
+        if not self.available:
+            return
+        conn.execute(f"INSERT INTO {self.TABLE}({self.TABLE}) VALUES ('optimize')")
+
+    @staticmethod
+    def match_expression(q: Optional[str]) -> Optional[str]:
+        """Turn free text into an FTS5 query: every word must match as a prefix."""
+        tokens = _TOKEN_RE.findall(q or "")
+        if not tokens:
+            return None
+        return " ".join('"{}"*'.format(t.replace('"', '""')) for t in tokens)
@@ -0,0 +1,162 @@
+import json
+import logging
+from functools import lru_cache
+from typing import Optional, Any, Dict, List
+
+from .duration_stats import DurationStats
+
+# Input values naming one of these files are reported as referenced models
+MODEL_EXTENSIONS = (".safetensors", ".ckpt", ".pt", ".pth", ".bin", ".gguf", ".sft", ".onnx")
+# queue_items columns written from extract_job_metadata(); list values are stored as JSON text
+COLUMNS = {
+    "sampler_count": "INTEGER",
+    "node_count": "INTEGER",
+    "display_name": "TEXT",
+    "output_nodes": "TEXT",
+    "models": "TEXT",
+}
+
+
+def display_name(workflow: Any) -> Optional[str]:
+    """User-facing job name stored with the prompt (workflow.name or .title, else name); None when unnamed."""
+    if isinstance(workflow, str):
+        try:
+            workflow = json.loads(workflow)
+        except Exception:
+            return None
+    if not isinstance(workflow, dict):
+        return None
+    inner = workflow.get('workflow')
+    if isinstance(inner, dict):
+        name = inner.get('name') or inner.get('title') or workflow.get('name')
+    else:
+        name = workflow.get('name')
+    return name.strip() if isinstance(name, str) and name.strip() else None
+
+
+def _nodes(prompt: Any) -> Dict[str, Dict[str, Any]]:
+    """node id -> node for an API-format prompt or a UI-format graph ({"nodes": [...]})."""
+    if not isinstance(prompt, dict):
+        return {}
+    if isinstance(prompt.get('nodes'), list):
+        return {str(n.get('id', i)): n for i, n in enumerate(prompt['nodes']) if isinstance(n, dict)}
+    return {str(k): v for k, v in prompt.items() if isinstance(v, dict) and ('class_type' in v or 'class' in v)}
+
+
+def _class_type(node: Dict[str, Any]) -> str:
+    return str(node.get('class_type') or node.get('class') or node.get('type') or '')
+
+
+@lru_cache(maxsize=1024)
+def is_output_class(class_type: str) -> bool:
+    """Whether ComfyUI treats this node class as an output node (OUTPUT_NODE).
+
+    Uses ComfyUI's node registry when it is importable; otherwise falls back to the
+    Save*/Preview* naming convention of the built-in output nodes.
+    """
+    try:
+        import nodes  # ComfyUI's node registry
+        cls = nodes.NODE_CLASS_MAPPINGS.get(class_type)
+        if cls is not None:
+            return bool(getattr(cls, 'OUTPUT_NODE', False))
+    except Exception:
+        pass
+    return class_type.startswith(("Save", "Preview"))
+
+
+def extract_job_metadata(workflow: Any) -> Dict[str, Any]:
+    """Everything the queue panel and its polls need about a job, derived once at enqueue.
+
+    Returns sampler_count, node_count, display_name, output_nodes (ids, sorted), models
+    (referenced model file names, sorted) and the structural fingerprint used for ETAs.
+    """
+    if isinstance(workflow, str):
+        try:
+            workflow = json.loads(workflow)
+        except Exception:
+            workflow = None
+    meta: Dict[str, Any] = {
+        "sampler_count": 0,
+        "node_count": 0,
+        "display_name": display_name(workflow),
+        "output_nodes": [],
+        "models": [],
+        "fingerprint": None,
+    }
+    try:
+        nodes = _nodes(workflow)
+        outputs: List[str] = []
+        models = set()
+        for node_id, node in nodes.items():
+            ct = _class_type(node)
+            if not ct:
+                continue
+            meta["node_count"] += 1
+            # Broad match: any class type containing 'Sampler'
+            if 'sampler' in ct.lower():
+                meta["sampler_count"] += 1
+            if is_output_class(ct):
+                outputs.append(node_id)
+            inputs = node.get('inputs')
+            widgets = node.get('widgets_values')
+            values = list(inputs.values()) if isinstance(inputs, dict) else []
+            values += widgets if isinstance(widgets, list) else []
+            for value in values:
+                if isinstance(value, str) and value.lower().endswith(MODEL_EXTENSIONS):
+                    models.add(value)
+        meta["output_nodes"] = sorted(outputs, key=lambda k: (len(k), k))
+        meta["models"] = sorted(models)
+        meta["fingerprint"] = DurationStats.fingerprint(workflow)
+    except Exception as e:
+        logging.debug(f"PersistentQueue: extracting job metadata failed: {e}")
+    return meta
+
+
+def column_values(meta: Dict[str, Any]) -> List[Any]:
+    """Values for COLUMNS, in order, ready to bind into an INSERT/UPDATE."""
+    return [json.dumps(meta.get(c)) if c in ("output_nodes", "models") else meta.get(c) for c in COLUMNS]
+
+
+# job_history columns summarizing a finished job, so history lists never read outputs/workflow
+HISTORY_COLUMNS = {
+    "display_name": "TEXT",
+    "image_count": "INTEGER",
+    "primary_image": "TEXT",
+}
+
+
+def output_images(outputs: Any) -> List[Dict[str, str]]:
+    """Images listed in a job's outputs ({node_id: {"images": [...]}}), in node order."""
+    if isinstance(outputs, str):
+        try:
+            outputs = json.loads(outputs)
+        except Exception:
+            return []
+    if not isinstance(outputs, dict):
+        return []
+    images: List[Dict[str, str]] = []
+    for value in outputs.values():
+        if isinstance(value, dict):
+            found = value.get('images')
+            if found is None and isinstance(value.get('ui'), dict):
+                found = value['ui'].get('images')
+        else:
+            found = value
+        for img in found if isinstance(found, list) else []:
+            if isinstance(img, dict) and (img.get('filename') or img.get('name')):
+                images.append({
+                    "filename": str(img.get('filename') or img.get('name')),
+                    "type": str(img.get('type') or 'output'),
+                    "subfolder": str(img.get('subfolder') or ''),
+                })
+    return images
+
+
+def history_summary(workflow: Any, outputs: Any) -> Dict[str, Any]:
+    """Values for HISTORY_COLUMNS of one history row."""
+    images = output_images(outputs)
+    return {
+        "display_name": display_name(workflow),
+        "image_count": len(images),
+        "primary_image": images[0]["filename"] if images else None,
+    }
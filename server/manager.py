@@ -1,21 +1,51 @@
 import asyncio
+import atexit
 import json
 import logging
-import time
 import heapq
-from typing import Optional, Any, Dict, Tuple, List, Callable, Set
+import threading
+from typing import Optional, Any, Dict, Tuple, List, Set
 
 from aiohttp import web
 
 from .database import QueueDatabase
 from PIL import Image
 import os
-import hashlib
 import folder_paths
 
 from .thumbnail_service import ThumbnailService
 from .queue_hook_manager import QueueHookManager
 from .routes_helper import RoutesHelper
+from .persistence_worker import HistoryPersistenceWorker
+from .change_feed import QueueChangeFeed
+from .async_access import AsyncDataAccess
+from .restore import PendingJobRestorer, RestoreProgress, LazyPromptLoader
+from .queue_import import ImportStreamDecoder, ImportProgress, BoundedValidator, executable_prompt, error_message
+from .thumb_store import CACHE_CONTROL as THUMB_CACHE_CONTROL
+from .preview_cache import PreviewCache, workflow_hash
+from .retention import RetentionEngine
+from .queue_export import ExportEncoder
+from .queue_index import QueueIndex
+from .job_metadata import extract_job_metadata
+
+# Rows loaded and encoded per step of a streaming export
+_EXPORT_BATCH = 200
+
+
+def _number_between(lo: Any, hi: Any) -> Optional[Any]:
+    """A queue number strictly between lo and hi (either may be None); None when there is none."""
+    if lo is None and hi is None:
+        return 0
+    if lo is None:
+        return hi - 1
+    if hi is None:
+        return lo + 1
+    if not lo < hi:
+        return None
+    if isinstance(lo, int) and isinstance(hi, int) and hi - lo >= 2:
+        return (lo + hi) // 2
+    mid = (lo + hi) / 2
+    return mid if lo < mid < hi else None
 
 
 class PersistentQueueManager:
@@ -24,6 +54,14 @@ class PersistentQueueManager:
     def __init__(self):
         self.db: QueueDatabase = QueueDatabase()
         self.thumbs: ThumbnailService = ThumbnailService(max_size=128, quality=60)
+        # API handlers reach the DB and PIL only through this pool, never on the event loop
+        self.io: AsyncDataAccess = AsyncDataAccess(self.db, self.thumbs)
+        # Rendered previews live beside the database: ComfyUI wipes its temp directory on every start
+        try:
+            preview_budget = int(float(os.environ.get("PQUEUE_PREVIEW_CACHE_MB", "256")) * 1024 * 1024)
+        except ValueError:
+            preview_budget = 256 * 1024 * 1024
+        self._previews: PreviewCache = PreviewCache(os.path.splitext(self.db.db_path)[0] + "_previews", preview_budget)
         # Default to paused state on startup for safety - user can resume when ready
         self.paused: bool = True
         self.current_job: Optional[Any] = None
@@ -35,6 +73,26 @@ class PersistentQueueManager:
         self._progress_accum: Dict[str, float] = {}
         self._progress_last_raw: Dict[str, float] = {}
         self._samplers_total: Dict[str, int] = {}
+        # History rows and thumbnails are written off the execution thread
+        self._persistence: HistoryPersistenceWorker = HistoryPersistenceWorker(self._persist_history_job)
+        # Revisioned queue change feed for long-polling clients, plus the job names it reports
+        self._feed: QueueChangeFeed = QueueChangeFeed(self._feed_snapshot, runner=self.io.run)
+        # Written by API handlers (loop and I/O pool), read and pruned by the feed snapshot
+        self._display_names: Dict[str, Optional[str]] = {}
+        self._display_names_lock = threading.Lock()
+        self._restore_progress: RestoreProgress = RestoreProgress()
+        # Background pruning of old history / finished queue rows (PQUEUE_RETENTION_* policies)
+        self._retention: RetentionEngine = RetentionEngine(self.db)
+        # prompt_id -> heap position, so single-item priority changes and moves are O(log n)
+        self._qindex: QueueIndex = QueueIndex()
+        # Opt-in lazy restore (PQUEUE_LAZY_RESTORE=1): pending jobs stay in SQLite until they are due
+        self._lazy: Optional[LazyPromptLoader] = None
+        # Recent queue imports by id (progress endpoint); validation fan-out for imports and restore
+        self._imports: Dict[str, ImportProgress] = {}
+        try:
+            self._validate_concurrency: int = max(1, int(os.environ.get("PQUEUE_IMPORT_CONCURRENCY", "4")))
+        except ValueError:
+            self._validate_concurrency = 4
 
     def initialize(self) -> None:
         """Install hooks and API routes after PromptServer is created."""
@@ -47,12 +105,32 @@ class PersistentQueueManager:
         # Register on-prompt handler to persist incoming prompts
         PromptServer.instance.add_on_prompt_handler(self._on_prompt)
 
+        # Start background history persistence and finish anything a previous run left journaled
+        self._persistence.start()
+        self._replay_history_journal()
+        self._retention.start()
+
+        if os.environ.get("PQUEUE_LAZY_RESTORE", "").strip().lower() in ("1", "true", "yes", "on"):
+            try:
+                import execution
+                try:
+                    readahead = int(os.environ.get("PQUEUE_LAZY_READAHEAD", "2"))
+                except ValueError:
+                    readahead = 2
+                self._lazy = LazyPromptLoader(self.db, self.io, PromptServer.instance.loop, execution.validate_prompt, readahead=readahead)
+            except Exception as e:
+                logging.warning(f"PersistentQueue: lazy restore unavailable, restoring eagerly: {e}")
+                self._lazy = None
+
         # Install queue hooks
         self._hooks = QueueHookManager(
             is_paused_fn=lambda: self.paused,
             on_job_started=lambda prompt_id: self._on_job_started(prompt_id),
             on_task_done=self._on_task_done_persist,
             should_run_when_paused=self._is_prompt_allowed_while_paused,
+            on_queue_updated=self._feed.mark_dirty,
+            materialize_item=self._materialize_queue_item if self._lazy else None,
+            after_get=self._lazy.prefetch if self._lazy else None,
         )
         self._hooks.install()
 
@@ -66,13 +144,24 @@ class PersistentQueueManager:
         # Restore pending jobs on startup
         self._schedule_restore_pending_jobs()
 
+        # Close pooled SQLite connections cleanly (checkpoints the WAL) on interpreter exit.
+        # atexit runs handlers in reverse order, so queued history is flushed first.
+        atexit.register(self.db.close)
+        atexit.register(self._retention.stop)
+        atexit.register(self._previews.save_index)
+        atexit.register(self._persistence.shutdown)
+        atexit.register(self.io.shutdown)
+
         self._installed = True
         
         # Log initial state
         logging.info("PersistentQueue initialized in PAUSED state. Use UI to resume queue processing.")
 
     def _on_task_done_persist(self, args: Tuple[Any, Any, Any]) -> None:
-        """Persist history and generate thumbnails before original task_done completes.
+        """Journal the job completion and hand history/thumbnail work to the background pipeline.
+
+        Runs on the execution thread before the original task_done, so it only does one
+        small SQLite transaction; see _persist_history_job for the expensive part.
 
         Args:
             args: Tuple of (q_self, item_id, history_result, status) from task_done wrapper.
@@ -90,52 +179,22 @@ class PersistentQueueManager:
             new_state = 'completed'
             if not completed:
                 new_state = 'interrupted' if cancelled else 'failed'
-            # Persist history and thumbnails BEFORE notifying original logic, to avoid UI race
-            self.db.update_job_status(prompt_id, new_state, error=None if completed else status_str)
-            # Ensure any user-provided rename is reflected in the workflow stored to history
-            try:
-                if isinstance(prompt, dict):
-                    # If DB has a more recent renamed workflow JSON, prefer its name field(s)
-                    db_row = self.db.get_job(prompt_id)
-                    if db_row and db_row.get('workflow'):
-                        try:
-                            db_wf = json.loads(db_row['workflow']) if isinstance(db_row['workflow'], str) else db_row['workflow']
-                        except Exception:
-                            db_wf = None
-                        if isinstance(db_wf, dict):
-                            def _extract_name(wf):
-                                try:
-                                    return (wf.get('workflow') or {}).get('name') or wf.get('name')
-                                except Exception:
-                                    return None
-                            db_name = _extract_name(db_wf)
-                            if isinstance(db_name, str) and db_name.strip():
-                                if isinstance(prompt.get('workflow'), dict):
-                                    prompt['workflow']['name'] = db_name.strip()
-                                else:
-                                    prompt['name'] = db_name.strip()
-            except Exception:
-                pass
-
-            history_id = self.db.add_history(
-                prompt_id=prompt_id,
-                workflow=prompt,
-                outputs=history_result.get('outputs', {}),
-                status=status_str,
-                duration_seconds=None,
+            outputs = (history_result or {}).get('outputs', {})
+            journal_id = self.db.record_completion(
+                prompt_id,
+                new_state,
+                status_str,
+                outputs,
+                error=None if completed else status_str,
             )
-            try:
-                workflow_json = json.dumps(prompt) if isinstance(prompt, (dict, list)) else str(prompt)
-                outputs = history_result.get('outputs', {})
-                thumbs = self.thumbs.generate_thumbnails_from_outputs(outputs, workflow_json=workflow_json, extras=None)
-                if not thumbs:
-                    ph = self.thumbs.generate_placeholder_thumbnail(new_state, workflow_json=workflow_json)
-                    if ph:
-                        thumbs = [ph]
-                if thumbs:
-                    self.db.save_history_thumbnails(history_id, thumbs)
-            except Exception as te:
-                logging.debug(f"PersistentQueue: failed to save thumbnails: {te}")
+            self._persistence.submit({
+                'journal_id': journal_id,
+                'prompt_id': prompt_id,
+                'prompt': prompt,
+                'outputs': outputs,
+                'state': new_state,
+                'status_str': status_str,
+            })
         except Exception as e:
             logging.debug(f"PersistentQueue _on_task_done_persist failed: {e}")
         # After persisting, if we are in run-selected mode, update remaining set
@@ -151,7 +210,99 @@ class PersistentQueueManager:
                         logging.info("PersistentQueue: Finished all selected jobs; queue remains paused.")
         except Exception:
             pass
-    
+
+    def _persist_history_job(self, job: Dict[str, Any]) -> None:
+        """Write the history row and thumbnails for a journaled completion (background thread)."""
+        prompt_id = job['prompt_id']
+        prompt = job.get('prompt')
+        outputs = job.get('outputs') or {}
+        new_state = job.get('state') or 'completed'
+        # Ensure any user-provided rename is reflected in the workflow stored to history
+        try:
+            if isinstance(prompt, dict):
+                # If DB has a more recent renamed workflow JSON, prefer its name field(s)
+                db_row = self.db.get_job(prompt_id)
+                if db_row and db_row.get('workflow'):
+                    try:
+                        db_wf = json.loads(db_row['workflow']) if isinstance(db_row['workflow'], str) else db_row['workflow']
+                    except Exception:
+                        db_wf = None
+                    if isinstance(db_wf, dict):
+                        def _extract_name(wf):
+                            try:
+                                return (wf.get('workflow') or {}).get('name') or wf.get('name')
+                            except Exception:
+                                return None
+                        db_name = _extract_name(db_wf)
+                        if isinstance(db_name, str) and db_name.strip():
+                            # The prompt dict is shared with ComfyUI's in-memory history: rename a copy
+                            prompt = dict(prompt)
+                            if isinstance(prompt.get('workflow'), dict):
+                                prompt['workflow'] = dict(prompt['workflow'], name=db_name.strip())
+                            else:
+                                prompt['name'] = db_name.strip()
+        except Exception:
+            pass
+
+        history_id = self.db.add_history(
+            prompt_id=prompt_id,
+            workflow=prompt,
+            outputs=outputs,
+            status=job.get('status_str'),
+            duration_seconds=None,
+            journal_id=job.get('journal_id'),
+        )
+        try:
+            workflow_json = json.dumps(prompt) if isinstance(prompt, (dict, list)) else str(prompt)
+            thumbs = self.thumbs.generate_thumbnails_from_outputs(outputs, workflow_json=workflow_json, extras=None)
+            if not thumbs:
+                ph = self.thumbs.generate_placeholder_thumbnail(new_state, workflow_json=workflow_json)
+                if ph:
+                    thumbs = [ph]
+            if thumbs:
+                self.db.save_history_thumbnails(history_id, thumbs)
+        except Exception as te:
+            logging.debug(f"PersistentQueue: failed to save thumbnails: {te}")
+        # History now lands after task_done; tell clients so they do not wait for the next poll
+        try:
+            from server import PromptServer
+            PromptServer.instance.send_sync("pqueue_history", {"prompt_id": prompt_id, "history_id": history_id})
+        except Exception:
+            pass
+
+    def _replay_history_journal(self) -> None:
+        """Re-submit completions journaled by a previous process that never reached job_history."""
+        try:
+            entries = self.db.get_history_journal()
+        except Exception as e:
+            logging.debug(f"PersistentQueue: reading history journal failed: {e}")
+            return
+        for entry in entries:
+            try:
+                prompt = None
+                row = self.db.get_job(entry['prompt_id'])
+                if row and row.get('workflow'):
+                    try:
+                        prompt = json.loads(row['workflow'])
+                    except Exception:
+                        prompt = None
+                try:
+                    outputs = json.loads(entry['outputs']) if entry.get('outputs') else {}
+                except Exception:
+                    outputs = {}
+                self._persistence.submit({
+                    'journal_id': entry['id'],
+                    'prompt_id': entry['prompt_id'],
+                    'prompt': prompt,
+                    'outputs': outputs,
+                    'state': entry.get('state'),
+                    'status_str': entry.get('status_str'),
+                })
+            except Exception as e:
+                logging.debug(f"PersistentQueue: replaying journal entry {entry.get('id')} failed: {e}")
+        if entries:
+            logging.info(f"PersistentQueue: Replaying {len(entries)} journaled job completions into history")
+
     def _on_job_started(self, prompt_id: str):
         """Called when a job transitions to running status."""
         try:
@@ -206,20 +357,43 @@ class PersistentQueueManager:
                 except Exception:
                     persist_prompt = prompt
 
+                # Sampler count, name, outputs, models and fingerprint are derived once here;
+                # polls read them from their columns instead of re-walking the prompt
+                meta = extract_job_metadata(persist_prompt)
                 # Priority scaffold (0 default)
                 priority = 0
-                self.db.add_job(prompt_id, persist_prompt, priority=priority)
+                self.db.add_job(prompt_id, persist_prompt, priority=priority, rank=self._expected_number(json_data), meta=meta)
         except Exception as e:
             logging.debug(f"PersistentQueue on_prompt persist failed: {e}")
         return json_data
     
+    @staticmethod
+    def _expected_number(json_data: Dict[str, Any]) -> Optional[float]:
+        """The queue number ComfyUI's post_prompt assigns right after the on_prompt handlers return."""
+        try:
+            if "number" in json_data:
+                return float(json_data["number"])
+            from server import PromptServer
+            number = PromptServer.instance.number
+            return -number if json_data.get("front") else number
+        except Exception:
+            return None
+
     def pause_queue(self):
         """Pause queue execution"""
         self.paused = True
+        self._wake_workers()
     
     def resume_queue(self):
         """Resume queue execution"""
         self.paused = False
+        self._wake_workers()
+
+    def _wake_workers(self) -> None:
+        """Let workers blocked on the pause gate re-evaluate immediately."""
+        if self._hooks is not None:
+            self._hooks.wake()
+        self._feed.mark_dirty()
     
     def reorder_job(self, prompt_id: str, new_priority: int):
         """Change job priority"""
@@ -236,51 +410,29 @@ class PersistentQueueManager:
     async def _restore_pending_jobs_async(self):
         from server import PromptServer
         import execution
-        server_instance = PromptServer.instance
+        restorer = PendingJobRestorer(self.db, self.io, execution.validate_prompt, concurrency=self._validate_concurrency)
+        self._restore_progress = restorer.progress
+        await restorer.run(PromptServer.instance, lazy=self._lazy)
 
-        pending_jobs = self.db.get_pending_jobs()
-        logging.info(f"PersistentQueue: Found {len(pending_jobs)} pending jobs to restore on startup")
-        restored_count = 0
-        failed_restores = []
-        for job in pending_jobs:
-            try:
-                prompt_id = job["prompt_id"]
-                workflow_json = job["workflow"]
-                prompt = json.loads(workflow_json) if isinstance(workflow_json, str) else workflow_json
-                # Robust normalization: clean extraneous keys and extract inner workflow if present
-                if isinstance(prompt, dict):
-                    prompt.pop('name', None)  # Remove top-level name (non-node key)
-                    if 'workflow' in prompt and isinstance(prompt['workflow'], dict):
-                        inner = prompt['workflow']
-                        inner.pop('name', None)  # Clean name from inner if added
-                        prompt = inner
-                valid, err, outputs_to_execute, node_errors = await execution.validate_prompt(prompt_id, prompt, None)
-                if valid:
-                    number = server_instance.number
-                    server_instance.number += 1
-                    extra_data = {}
-                    server_instance.prompt_queue.put((number, prompt_id, prompt, extra_data, outputs_to_execute))
-                    restored_count += 1
-                    logging.info(f"PersistentQueue: Successfully restored job {prompt_id} to queue")
-                else:
-                    error_msg = (err or {}).get('message') if isinstance(err, dict) else str(err)
-                    self.db.update_job_status(prompt_id, 'failed', error=error_msg)
-                    failed_restores.append((prompt_id, error_msg))
-                    logging.warning(f"PersistentQueue: Failed to restore job {prompt_id}: {error_msg}")
-            except Exception as e:
-                logging.error(f"PersistentQueue: Exception during restore of job {job.get('prompt_id', 'unknown')}: {e}")
-                failed_restores.append((job.get('prompt_id', 'unknown'), str(e)))
+    def _materialize_queue_item(self, item: Tuple) -> Optional[Tuple]:
+        """Executor thread: load a lazily restored entry right before it runs."""
+        if self._lazy is None or not self._lazy.is_placeholder(item):
+            return item
+        return self._lazy.materialize(item)
 
-        if restored_count > 0:
-            logging.info(f"PersistentQueue: Restored {restored_count} jobs to queue")
-        if failed_restores:
-            logging.warning(f"PersistentQueue: {len(failed_restores)} jobs failed to restore: {failed_restores}")
-        if len(pending_jobs) == 0:
-            logging.info("PersistentQueue: No pending jobs to restore on startup")
+    async def _api_restore_progress(self, request: web.Request) -> web.Response:
+        """Progress of the startup restore of pending jobs."""
+        return web.json_response(self._restore_progress.to_dict())
+
+    async def _api_migration_progress(self, request: web.Request) -> web.Response:
+        """Progress of the background database migrations (schema version, current step, rows done)."""
+        return web.json_response(self.db.migration_progress())
 
     # API Routes
     async def _api_get_pqueue(self, request: web.Request) -> web.Response:
+        """Queue state. ?fields=summary returns DB rows without workflow text (see QueueDatabase._select_list)."""
         from server import PromptServer
+        fields = request.rel_url.query.get("fields") or None
         running, queued = PromptServer.instance.prompt_queue.get_current_queue_volatile()
         # Ensure queued list is sorted by execution order (heap array is not fully ordered)
         try:
@@ -317,36 +469,136 @@ class PersistentQueueManager:
             pass
         # Intentionally avoid server-side progress normalization; client will handle via sockets
 
-        # Provide sampler counts for running prompts so frontend can normalize socket progress
+        db_pending = await self.io.db_call('get_pending_jobs', fields)
+        db_by_id = await self.io.run(self._build_db_lookup_for_queue_items, running, queued_sorted, fields, name='db.lookup_queue_items')
+
+        # Provide sampler counts for running prompts so frontend can normalize socket progress;
+        # they were counted at enqueue, only prompts queued before that are walked here
         sampler_count_by_id: Dict[str, int] = {}
         try:
             for pid, prompt in running_prompts.items():
                 try:
-                    # Always fetch fresh workflow from DB for running jobs to avoid stale prompt data
-                    # This ensures we get the correct sampler count even if the workflow was modified
-                    prompt = running_prompts[pid]
-                    sampler_count_by_id[pid] = int(self._get_total_samplers(pid, prompt))
+                    stored = (db_by_id.get(pid) or {}).get('sampler_count')
+                    sampler_count_by_id[pid] = int(stored) if stored is not None else int(self._get_total_samplers(pid, prompt))
                 except Exception:
                     pass
         except Exception:
             pass
-
+        eta = await self._queue_eta(running, queued_sorted)
         return web.json_response({
             "paused": self.paused,
-            "db_pending": self.db.get_pending_jobs(),
+            "db_pending": db_pending,
             "queue_running": running,
             "queue_pending": queued_sorted,
             "running_progress": progress_map,
             "sampler_count_by_id": sampler_count_by_id,
             # Provide DB rows for ALL visible queue items (pending + running) so UI
             # can derive labels (including renamed names) even after status changes
-            "db_by_id": self._build_db_lookup_for_queue_items(running, queued_sorted),
+            "db_by_id": db_by_id,
+            "eta": eta,
+        })
+
+    async def _queue_eta(self, running: List[Tuple], queued: List[Tuple]) -> Optional[Dict[str, Any]]:
+        """Per-item and total duration estimates for running + queued items (one DB call)."""
+        items: List[Tuple[str, Any]] = []
+        for it in list(running or []) + list(queued or []):
+            try:
+                items.append((str(it[1]), it[2]))
+            except Exception:
+                pass
+        try:
+            return await self.io.db_call('get_queue_eta', items)
+        except Exception as e:
+            logging.debug(f"PersistentQueue: ETA lookup failed: {e}")
+            return None
+
+    async def _api_get_eta(self, request: web.Request) -> web.Response:
+        """Queue drain estimate without the rest of the queue payload."""
+        from server import PromptServer
+        running, queued = PromptServer.instance.prompt_queue.get_current_queue_volatile()
+        return web.json_response(await self._queue_eta(running, queued) or {"items": {}, "total_seconds": None})
+
+    def _feed_snapshot(self) -> Tuple[bool, Dict[str, Dict[str, Any]]]:
+        """Lightweight view of the queue for the change feed: no prompt or workflow bodies."""
+        from server import PromptServer
+        running, queued = PromptServer.instance.prompt_queue.get_current_queue_volatile()
+        entries: List[Tuple[Any, str, bool]] = []
+        for is_running, items in ((True, running or []), (False, queued or [])):
+            for it in items:
+                try:
+                    entries.append((it[0], str(it[1]), is_running))
+                except Exception:
+                    pass
+        pids = {pid for _, pid, _ in entries}
+        with self._display_names_lock:
+            missing = [pid for pid in pids if pid not in self._display_names]
+        names: Dict[str, Optional[str]] = {}
+        if missing:
+            try:
+                names = self.db.get_job_names(missing)
+            except Exception:
+                names = {}
+        snapshot: Dict[str, Dict[str, Any]] = {}
+        with self._display_names_lock:
+            for pid in missing:
+                # A rename recorded while the names were loading wins over the DB read
+                self._display_names.setdefault(pid, names.get(pid))
+            # Forget names of items that left the queue so the cache stays bounded
+            for pid in [p for p in self._display_names if p not in pids]:
+                self._display_names.pop(pid, None)
+            for number, pid, is_running in entries:
+                snapshot[pid] = {
+                    "prompt_id": pid,
+                    "number": number,
+                    "running": is_running,
+                    "name": self._display_names.get(pid),
+                }
+        return self.paused, snapshot
+
+    async def _api_get_changes(self, request: web.Request) -> web.Response:
+        """Long-poll the queue change feed.
+
+        Query: since=<revision> (omit for a full reset), timeout=<seconds, max 60, default 25>.
+        Returns as soon as the revision moves past `since`; idle clients get an empty delta at timeout.
+        """
+        q = request.rel_url.query
+        try:
+            since = int(q["since"]) if q.get("since") not in (None, "") else None
+        except Exception:
+            since = None
+        try:
+            timeout = min(60.0, max(0.0, float(q.get("timeout", "25"))))
+        except Exception:
+            timeout = 25.0
+        try:
+            return web.json_response(await self._feed.wait_for_change(since, timeout))
+        except Exception as e:
+            logging.debug(f"PersistentQueue change feed failed: {e}")
+            return web.json_response({"ok": False, "error": str(e)}, status=500)
+
+    async def _api_get_metrics(self, request: web.Request) -> web.Response:
+        """Per-call timings of the I/O pool and SQLite connection pool counters."""
+        return web.json_response({
+            "io": self.io.metrics(),
+            "db_pool": self.db.pool_stats(),
+            "workflow_storage": await self.io.db_call('get_storage_report'),
+            "preview_cache": self._previews.stats(),
+            "thumbnail_cache": self.thumbs.cache_stats(),
+            "retention": self._retention.stats(),
+            "queue_index": self._qindex.stats(),
+            "history_counts": self.db.counts.stats(),
+            "thumbnail_storage": await self.io.run(self.db.thumb_files.stats, name='thumbs.storage'),
+            "history_pipeline_pending": self._persistence.pending(),
         })
 
     async def _api_export_queue(self, request: web.Request) -> web.StreamResponse:
-        """Export the current queue (pending items) as ordered JSON.
+        """Stream an export of the pending queue and/or job history.
 
-        Format:
+        Query: scope=queue|history|all (default queue), format=json|ndjson (default json),
+        gzip=1 to compress, thumbs=1 to include history thumbnails (a tar archive of one JSON
+        file per record plus the images). Records are read from the database in batches and
+        written as they are encoded, so memory use does not grow with the export. The default
+        is the original document:
         {
           "version": 1,
           "exported_at": <iso string>,
@@ -355,66 +607,79 @@ class PersistentQueueManager:
           ]
         }
         """
+        q = request.rel_url.query
+        scope = (q.get("scope") or "queue").lower()
+        flag = lambda name: str(q.get(name, "0")).lower() in ("1", "true", "yes")
         try:
-            from server import PromptServer
-            import datetime
-            # Build ordered pending list by the actual execution order in in-memory queue
-            q = PromptServer.instance.prompt_queue
-            with q.mutex:
-                try:
-                    queued = list(q.queue)
-                except Exception:
-                    queued = []
-            # Sort by number to reflect real order (lowest number executes first)
-            try:
-                queued_sorted = sorted(queued, key=lambda it: (it[0], str(it[1])))
-            except Exception:
-                queued_sorted = queued
-
-            # Build DB lookup to pull stored workflow/priority/created_at
-            db_lookup = self._build_db_lookup_for_queue_items([], queued_sorted)
+            if scope not in ("queue", "history", "all"):
+                raise ValueError("scope must be one of queue, history, all")
+            encoder = ExportEncoder(q.get("format") or "json", gzip=flag("gzip"), thumbs=flag("thumbs"))
+        except ValueError as e:
+            return web.json_response({"ok": False, "error": str(e)}, status=400)
 
-            items = []
-            for it in queued_sorted:
-                try:
-                    pid = str(it[1])
-                    db_row = db_lookup.get(pid) or {}
-                    wf_text = db_row.get('workflow')
-                    try:
-                        workflow = json.loads(wf_text) if isinstance(wf_text, str) else (wf_text if wf_text is not None else None)
-                    except Exception:
-                        workflow = None
-                    items.append({
-                        "prompt_id": pid,
-                        "workflow": workflow,
-                        "priority": int(db_row.get('priority') or 0),
-                        "created_at": db_row.get('created_at'),
-                    })
-                except Exception:
-                    pass
+        import datetime
+        now = datetime.datetime.now()
+        pids: List[str] = []
+        if scope in ("queue", "all"):
+            try:
+                from server import PromptServer
+                pq = PromptServer.instance.prompt_queue
+                # Only (number, prompt_id) of the live heap is copied; rows are loaded per batch
+                with pq.mutex:
+                    order = [(it[0], str(it[1])) for it in pq.queue]
+                pids = [pid for _, pid in sorted(order)]
+            except Exception as e:
+                logging.warning(f"PersistentQueue export failed: {e}")
+                return web.json_response({"ok": False, "error": str(e)}, status=500)
 
-            payload = {
-                "version": 1,
-                "exported_at": datetime.datetime.now().isoformat(sep=' ', timespec='seconds'),
-                "items": items,
-            }
-
-            text = json.dumps(payload, ensure_ascii=False)
-            return web.Response(
-                text=text,
-                content_type='application/json',
-                headers={
-                    'Content-Disposition': 'attachment; filename="pqueue-export.json"'
-                }
-            )
+        stem = ("pqueue-export" if scope == "queue" else f"pqueue-{scope}-export") + now.strftime("-%Y%m%d-%H%M%S")
+        resp = web.StreamResponse(headers={
+            'Content-Type': encoder.content_type,
+            'Content-Disposition': f'attachment; filename="{encoder.filename(stem)}"',
+        })
+        await resp.prepare(request)
+        try:
+            await resp.write(encoder.begin({"exported_at": now.isoformat(sep=' ', timespec='seconds'), "scope": scope}))
+            if scope in ("queue", "all"):
+                await resp.write(encoder.open_section("items"))
+                for i in range(0, len(pids), _EXPORT_BATCH):
+                    batch = pids[i:i + _EXPORT_BATCH]
+                    rows = await self.io.db_call('get_jobs_by_ids', batch)
+                    chunk = await self.io.run(lambda batch=batch, rows=rows: b"".join(
+                        encoder.queue_item(pid, rows[pid].get('workflow'), rows[pid].get('priority'), rows[pid].get('created_at'))
+                        for pid in batch if pid in rows
+                    ), name='export.encode')
+                    if chunk:
+                        await resp.write(chunk)
+                await resp.write(encoder.close_section())
+            if scope in ("history", "all"):
+                await resp.write(encoder.open_section("history"))
+                after_id = 0
+                while True:
+                    rows = await self.io.db_call(
+                        'get_history_export_batch', after_id=after_id, limit=_EXPORT_BATCH, with_thumbs=encoder.format == "tar"
+                    )
+                    if not rows:
+                        break
+                    after_id = rows[-1]['id']
+                    chunk = await self.io.run(lambda rows=rows: b"".join(encoder.history_row(r) for r in rows), name='export.encode')
+                    if chunk:
+                        await resp.write(chunk)
+                await resp.write(encoder.close_section())
+            await resp.write(encoder.finish())
+            await resp.write_eof()
+        except (ConnectionResetError, asyncio.CancelledError):
+            logging.debug("PersistentQueue: export aborted by the client")
+            raise
         except Exception as e:
-            logging.warning(f"PersistentQueue export failed: {e}")
-            return web.json_response({"ok": False, "error": str(e)}, status=500)
+            # Headers are already sent; the truncated body is rejected by the importer
+            logging.warning(f"PersistentQueue export failed after {encoder.counts}: {e}")
+        return resp
 
-    def _build_db_lookup_for_queue_items(self, running: List[Tuple], queued: List[Tuple]) -> Dict[str, Dict[str, Any]]:
+    def _build_db_lookup_for_queue_items(self, running: List[Tuple], queued: List[Tuple], fields: Any = None) -> Dict[str, Dict[str, Any]]:
         """Return a mapping of prompt_id -> DB row for all running and queued items.
 
-        Includes at least the workflow text so the UI can derive renamed labels.
+        Full rows include the workflow text; summary rows carry display_name instead.
         """
         try:
             pids_set: Set[str] = set()
@@ -438,32 +703,9 @@ class PersistentQueueManager:
             if not pids:
                 return {}
             rows: Dict[str, Dict[str, Any]] = {}
-            # Prefer batched queries to avoid SQLite var limits; fall back to per-id on error
+            # Prefer one batched query (workflows hydrated from the blob store); fall back to per-id on error
             try:
-                with self.db._get_conn() as conn:
-                    batch_size = 500
-                    for i in range(0, len(pids), batch_size):
-                        batch = pids[i:i+batch_size]
-                        placeholders = ",".join(["?"] * len(batch))
-                        try:
-                            cur = conn.execute(f"SELECT * FROM queue_items WHERE prompt_id IN ({placeholders})", tuple(batch))
-                            for r in cur.fetchall():
-                                try:
-                                    d = dict(r)
-                                    pid = str(d.get('prompt_id')) if d.get('prompt_id') is not None else None
-                                    if pid:
-                                        rows[pid] = d
-                                except Exception:
-                                    pass
-                        except Exception:
-                            # Fallback to per-id lookup for this batch if SQL fails
-                            for pid in batch:
-                                try:
-                                    row = self.db.get_job(pid)
-                                    if row:
-                                        rows[pid] = row
-                                except Exception:
-                                    pass
+                rows.update(self.db.get_jobs_by_ids(pids, fields))
             except Exception:
                 # Fallback to per-id for all if connection or other errors
                 for pid in pids:
@@ -511,16 +753,18 @@ class PersistentQueueManager:
             max_duration = float(q.get("max_duration")) if q.get("max_duration") is not None else None
         except Exception:
             max_duration = None
+        # Infinite-scroll pages after the first can skip the total
+        include_total = str(q.get("include_total", "1")).lower() not in ("0", "false", "no")
+        # fields=summary leaves out workflow and outputs; cards fetch them from /history/{id} when opened
+        fields = q.get("fields") or None
 
         # If only limit is provided and no advanced params, keep legacy behavior
-        legacy_mode = (
-            (q.keys() <= {"limit"}) or
-            (set(q.keys()) == set() )
-        )
+        legacy_mode = set(q.keys()) <= {"limit", "fields"}
         if legacy_mode:
-            return web.json_response({"history": self.db.list_history(limit=limit)})
+            return web.json_response({"history": await self.io.db_call('list_history', limit=limit, fields=fields)})
 
-        result = self.db.list_history_paginated(
+        result = await self.io.db_call(
+            'list_history_paginated',
             limit=limit,
             sort_by=sort_by,
             sort_dir=sort_dir,
@@ -532,9 +776,35 @@ class PersistentQueueManager:
             until=until,
             min_duration=min_duration,
             max_duration=max_duration,
+            include_total=include_total,
+            fields=fields,
         )
         return web.json_response(result)
 
+    async def _api_get_history_item(self, request: web.Request) -> web.Response:
+        """One history row with its workflow and outputs, for detail views of summary lists."""
+        try:
+            history_id = int(request.match_info.get('history_id', '0'))
+            row = await self.io.db_call('get_history_item', history_id)
+            if not row:
+                return web.json_response({"ok": False, "error": "not found"}, status=404)
+            return web.json_response({"ok": True, "item": row})
+        except Exception as e:
+            logging.warning(f"PersistentQueue get history item failed: {e}")
+            return web.json_response({"ok": False, "error": str(e)}, status=500)
+
+    async def _api_get_job(self, request: web.Request) -> web.Response:
+        """One queue row with its workflow, fetched when a job is opened rather than on every poll."""
+        try:
+            prompt_id = request.match_info.get('prompt_id', '')
+            row = await self.io.db_call('get_job', prompt_id)
+            if not row:
+                return web.json_response({"ok": False, "error": "not found"}, status=404)
+            return web.json_response({"ok": True, "job": row})
+        except Exception as e:
+            logging.warning(f"PersistentQueue get job failed: {e}")
+            return web.json_response({"ok": False, "error": str(e)}, status=500)
+
     # _generate_thumbnails_from_outputs removed in favor of ThumbnailService
 
     async def _api_pause(self, request: web.Request) -> web.Response:
@@ -549,12 +819,38 @@ class PersistentQueueManager:
         try:
             body = await request.json()
             order: List[str] = body.get("order", [])
-            self._rebuild_queue_by_prompt_ids(order)
+            await self.io.run(self._rebuild_queue_by_prompt_ids, order, name='reorder')
             return web.json_response({"ok": True})
         except Exception as e:
             logging.warning(f"PersistentQueue reorder failed: {e}")
             return web.json_response({"ok": False, "error": str(e)}, status=400)
 
+    async def _api_move(self, request: web.Request) -> web.Response:
+        """Move one pending item between two others: {"prompt_id", "after", "before"}.
+
+        "after" is the item it should follow (null: move to the front), "before" the item it
+        should precede (null: move to the end). Only the moved item changes, in the heap and in
+        SQLite. Replies 409 when a neighbour is no longer queued or they are out of order, so
+        the client can refresh and retry.
+        """
+        try:
+            body = await request.json()
+            prompt_id = body.get("prompt_id")
+            after, before = body.get("after"), body.get("before")
+            if not prompt_id:
+                return web.json_response({"ok": False, "error": "prompt_id required"}, status=400)
+            if not after and not before:
+                return web.json_response({"ok": False, "error": "after or before required"}, status=400)
+            error = await self.io.run(
+                self._move_job, str(prompt_id), str(after) if after else None, str(before) if before else None, name='move_job',
+            )
+            if error:
+                return web.json_response({"ok": False, "error": error}, status=409)
+            return web.json_response({"ok": True})
+        except Exception as e:
+            logging.warning(f"PersistentQueue move failed: {e}")
+            return web.json_response({"ok": False, "error": str(e)}, status=400)
+
     async def _api_priority(self, request: web.Request) -> web.Response:
         try:
             body = await request.json()
@@ -562,161 +858,281 @@ class PersistentQueueManager:
             priority: int = int(body.get("priority"))
             if not prompt_id:
                 return web.json_response({"ok": False, "error": "prompt_id required"}, status=400)
-            self.db.update_job_priority(prompt_id, priority)
-            # Apply DB priority to in-memory queue
-            self._apply_priority_to_pending()
+            await self.io.run(self._set_job_priority, str(prompt_id), priority, name='set_job_priority')
             return web.json_response({"ok": True})
         except Exception as e:
             logging.warning(f"PersistentQueue set priority failed: {e}")
             return web.json_response({"ok": False, "error": str(e)}, status=400)
 
     async def _api_import_queue(self, request: web.Request) -> web.Response:
-        """Import a queue JSON file and append items after existing ones, preserving order.
-
-        Accepts either application/json body or multipart/form-data with a single file field named 'file'.
+        """Import a queue export and append its items after existing ones, preserving order.
+
+        Accepts either a raw body or multipart/form-data with a single file field named 'file', in any
+        layout the export endpoint writes (JSON, NDJSON or tar, optionally gzipped); history records are skipped.
+        The upload is parsed incrementally; items are de-duplicated, validated concurrently
+        (PQUEUE_IMPORT_CONCURRENCY, default 4), written in one transaction and appended to the
+        queue with a single heap rebuild. Pass ?import_id=<id> to follow progress via
+        GET /api/pqueue/import/progress?id=<id>.
         """
+        progress = ImportProgress(request.query.get('import_id') or None, request.content_length)
+        self._imports[progress.id] = progress
+        while len(self._imports) > 16:
+            self._imports.pop(next(iter(self._imports)))
         try:
-            # Parse JSON payload (supports both raw JSON and multipart file upload containing JSON)
-            data = None
-            ctype = (request.headers.get('Content-Type') or '').lower()
-            if 'application/json' in ctype:
-                try:
-                    data = await request.json()
-                except Exception:
-                    data = None
-            if data is None:
-                # Try multipart
-                reader = await request.multipart()
-                if reader is not None:
-                    async for part in reader:
-                        if part.name == 'file':
-                            try:
-                                raw = await part.read(decode=True)
-                            except Exception:
-                                raw = await part.read()
-                            try:
-                                text = raw.decode('utf-8', errors='replace') if isinstance(raw, (bytes, bytearray)) else str(raw)
-                                data = json.loads(text)
-                            except Exception:
-                                data = None
-                            break
-
-            if not isinstance(data, dict):
-                return web.json_response({"ok": False, "error": "Invalid JSON"}, status=400)
-            items = data.get('items')
-            if not isinstance(items, list):
-                return web.json_response({"ok": False, "error": "Missing items[]"}, status=400)
-
-            # Normalize imported items and enqueue after existing ones
             from server import PromptServer
             import execution
             q = PromptServer.instance.prompt_queue
-
-            # Snapshot current queue length and max number to compute appended numbers
             with q.mutex:
-                try:
-                    existing = list(q.queue)
-                except Exception:
-                    existing = []
-                try:
-                    max_num = max((it[0] for it in existing), default=0)
-                except Exception:
-                    max_num = 0
-
-            appended = []
-            server_instance = PromptServer.instance
-            for item in items:
-                try:
+                seen: Set[str] = {str(it[1]) for it in q.queue}
+
+            validator = BoundedValidator(execution.validate_prompt, self._validate_concurrency)
+            parser = ImportStreamDecoder()
+            # (prompt_id, workflow, priority, validation task) in file order
+            pending: List[Tuple[str, Any, int, "asyncio.Task"]] = []
+
+            async def _validate(pid: str, workflow: Any) -> Tuple[bool, Any, Any]:
+                result = await validator.validate(pid, executable_prompt(workflow))
+                progress.validated += 1
+                if not result[0]:
+                    progress.invalid += 1
+                return result
+
+            def _accept(items: List[Any]) -> None:
+                for item in items:
+                    progress.parsed += 1
+                    if not isinstance(item, dict):
+                        progress.skipped += 1
+                        continue
                     pid = str(item.get('prompt_id')) if item.get('prompt_id') is not None else None
                     workflow = item.get('workflow')
                     if not pid or workflow is None:
+                        progress.skipped += 1
                         continue
-                    # De-duplicate: skip if already present in in-memory queue
-                    present = False
-                    with q.mutex:
-                        try:
-                            present = any(str(it[1]) == pid for it in q.queue)
-                        except Exception:
-                            present = False
-                    if present:
+                    # De-duplicate against the live queue and earlier items of this file
+                    if pid in seen:
+                        progress.duplicates += 1
                         continue
+                    seen.add(pid)
+                    try:
+                        priority = int(item.get('priority') or 0)
+                    except Exception:
+                        priority = 0
+                    pending.append((pid, workflow, priority, asyncio.ensure_future(_validate(pid, workflow))))
 
-                    # Persist to DB (if not already)
+            try:
+                async for chunk in self._iter_import_upload(request):
+                    progress.received_bytes += len(chunk)
+                    _accept(parser.feed(chunk))
+                _accept(parser.close())
+                if not parser.saw_items:
+                    raise ValueError("Missing items[]")
+            except ValueError as e:
+                for *_, task in pending:
+                    task.cancel()
+                progress.finish(str(e))
+                return web.json_response({"ok": False, "error": str(e), "import_id": progress.id}, status=400)
+
+            progress.state = "validating"
+            results = await asyncio.gather(*(task for *_, task in pending))
+
+            # Persist everything in one transaction; invalid items are recorded as failed
+            progress.state = "saving"
+            rows = []
+            for (pid, workflow, priority, _), (valid, err, _) in zip(pending, results):
+                row = {'prompt_id': pid, 'workflow': workflow, 'priority': priority}
+                if not valid:
+                    row['status'] = 'failed'
+                    row['error'] = error_message(err)
+                rows.append(row)
+            try:
+                await self.io.db_call('add_jobs', rows)
+            except Exception as e:
+                logging.debug(f"PersistentQueue: import persist failed: {e}")
+
+            appended: List[str] = []
+            with q.mutex:
+                present = {str(it[1]) for it in q.queue}
+                try:
+                    max_num = max((it[0] for it in q.queue), default=0)
+                except Exception:
+                    max_num = 0
+                ranks: Dict[str, Any] = {}
+                for (pid, workflow, _, _), (valid, _, outputs_to_execute) in zip(pending, results):
+                    if not valid or pid in present:
+                        continue
+                    max_num += 1
+                    q.queue.append((max_num, pid, executable_prompt(workflow), {}, outputs_to_execute))
+                    appended.append(pid)
+                    ranks[pid] = max_num
+                if appended:
+                    # Later prompts are numbered after the imported ones
+                    q.server.number = max(q.server.number, int(max_num // 1) + 1)
+                    heapq.heapify(q.queue)
                     try:
-                        self.db.add_job(pid, workflow, priority=int(item.get('priority') or 0))
+                        q.server.queue_updated()
                     except Exception:
                         pass
-
-                    # Validate normalized prompt for execution
                     try:
-                        prompt = workflow
-                        if isinstance(prompt, dict):
-                            # Clean metadata fields that are not part of executable nodes
-                            prompt = dict(prompt)
-                            prompt.pop('name', None)
-                            if 'workflow' in prompt and isinstance(prompt['workflow'], dict):
-                                inner = dict(prompt['workflow'])
-                                inner.pop('name', None)
-                                prompt = inner
+                        q.not_empty.notify_all()
                     except Exception:
-                        prompt = workflow
-
-                    valid, err, outputs_to_execute, node_errors = await execution.validate_prompt(pid, prompt, None)
-                    if not valid:
-                        # Mark failed import for this id but continue others
-                        try:
-                            self.db.update_job_status(pid, 'failed', error=(err or {}).get('message') if isinstance(err, dict) else str(err))
-                        except Exception:
-                            pass
-                        continue
-
-                    # Assign increasing numbers after current max to append at end
-                    with q.mutex:
-                        number = max_num + 1
-                        max_num = number
-                        extra_data = {}
-                        q.queue.append((number, pid, prompt, extra_data, outputs_to_execute))
-                        heapq.heapify(q.queue)
-                        try:
-                            q.server.queue_updated()
-                        except Exception:
-                            pass
-                    appended.append(pid)
-                except Exception:
-                    continue
-
-            return web.json_response({"ok": True, "imported": appended, "count": len(appended)})
+                        pass
+            if ranks:
+                await self.io.run(self._save_ranks, ranks, name='import.ranks')
+            progress.imported = len(appended)
+            progress.finish()
+            return web.json_response({
+                "ok": True,
+                "imported": appended,
+                "count": len(appended),
+                "import_id": progress.id,
+                "duplicates": progress.duplicates,
+                "invalid": progress.invalid,
+            })
         except Exception as e:
+            progress.finish(str(e))
             logging.warning(f"PersistentQueue import failed: {e}")
             return web.json_response({"ok": False, "error": str(e)}, status=500)
+
+    async def _iter_import_upload(self, request: web.Request):
+        """Yield the raw bytes of an import upload (JSON body or the multipart 'file' field)."""
+        ctype = (request.headers.get('Content-Type') or '').lower()
+        if 'multipart/' in ctype:
+            reader = await request.multipart()
+            async for part in reader:
+                if part.name == 'file':
+                    while True:
+                        chunk = await part.read_chunk(1 << 16)
+                        if not chunk:
+                            break
+                        yield chunk
+                    return
+            return
+        async for chunk in request.content.iter_chunked(1 << 16):
+            yield chunk
+
+    async def _api_import_progress(self, request: web.Request) -> web.Response:
+        """Progress of one import (?id=...), or of all recent imports."""
+        import_id = request.query.get('id')
+        if import_id:
+            progress = self._imports.get(import_id)
+            if progress is None:
+                return web.json_response({"ok": False, "error": "unknown import id"}, status=404)
+            return web.json_response(progress.to_dict())
+        return web.json_response({"imports": [p.to_dict() for p in self._imports.values()]})
+
     async def _api_delete(self, request: web.Request) -> web.Response:
         try:
-            from server import PromptServer
             body = await request.json()
             prompt_ids: List[str] = body.get("prompt_ids", [])
-            q = PromptServer.instance.prompt_queue
-            for pid in prompt_ids:
-                self.db.remove_job(pid)
-                def match(item):
-                    return item[1] == pid
-                q.delete_queue_item(match)
+            await self.io.run(self._apply_batch, 'delete', prompt_ids, {}, name='batch.delete')
             return web.json_response({"ok": True})
         except Exception as e:
             logging.warning(f"PersistentQueue delete failed: {e}")
             return web.json_response({"ok": False, "error": str(e)}, status=400)
 
+    async def _api_batch(self, request: web.Request) -> web.Response:
+        """Apply one operation to many queue items: one DB transaction and one in-memory queue rebuild.
+
+        Body: { "op": "delete"|"skip"|"priority"|"rename", "prompt_ids": [...], "priority": int, "name": str }
+        or per-item values via "items": [{ "prompt_id": str, "priority": int } | { "prompt_id": str, "name": str }].
+        """
+        try:
+            body = await request.json()
+            op = str(body.get("op") or "").lower()
+            if op not in ("delete", "skip", "priority", "rename"):
+                return web.json_response({"ok": False, "error": "op must be one of delete, skip, priority, rename"}, status=400)
+            prompt_ids: List[str] = [str(pid) for pid in (body.get("prompt_ids") or []) if pid]
+            values: Dict[str, Any] = {}
+            if op in ("priority", "rename"):
+                key = "priority" if op == "priority" else "name"
+                if body.get(key) is not None:
+                    values.update({pid: body.get(key) for pid in prompt_ids})
+                for entry in body.get("items") or []:
+                    if isinstance(entry, dict) and entry.get("prompt_id") and entry.get(key) is not None:
+                        values[str(entry["prompt_id"])] = entry.get(key)
+                if op == "priority":
+                    values = {pid: int(v) for pid, v in values.items()}
+                if not values:
+                    return web.json_response({"ok": False, "error": f"{key} required"}, status=400)
+                prompt_ids = list(values.keys())
+            if op == "skip" and self.paused:
+                return web.json_response({"ok": False, "error": "Queue must be running to skip jobs"}, status=400)
+            affected = await self.io.run(self._apply_batch, op, prompt_ids, values, name=f'batch.{op}')
+            return web.json_response({"ok": True, "op": op, "affected": affected})
+        except Exception as e:
+            logging.warning(f"PersistentQueue batch operation failed: {e}")
+            return web.json_response({"ok": False, "error": str(e)}, status=400)
+
+    def _apply_batch(self, op: str, prompt_ids: List[str], values: Dict[str, Any]) -> List[str]:
+        """Run a batch operation on the I/O pool. Returns the prompt_ids actually affected."""
+        try:
+            return self._run_batch_op(op, prompt_ids, values)
+        finally:
+            # Removing or reordering items can unblock a paused run-selected worker
+            self._wake_workers()
+
+    def _run_batch_op(self, op: str, prompt_ids: List[str], values: Dict[str, Any]) -> List[str]:
+        ids = list(dict.fromkeys(str(pid) for pid in prompt_ids if pid))
+        if op == 'delete':
+            self.db.remove_jobs(ids)
+            self._remove_from_queue(set(ids))
+            return ids
+        if op == 'skip':
+            skipped = self._remove_from_queue(set(ids))
+            if skipped:
+                self.db.update_jobs_status(skipped, 'cancelled')
+            return skipped
+        if op == 'priority':
+            self.db.update_jobs_priority({pid: int(values[pid]) for pid in ids if pid in values})
+            self._apply_priority_to_pending()
+            return ids
+        if op == 'rename':
+            renamed = self.db.update_job_names({pid: str(values[pid]) for pid in ids if pid in values})
+            for pid in renamed:
+                self._set_display_name(pid, values[pid])
+                self._previews.forget_workflow(pid)
+            self._feed.mark_dirty()
+            return renamed
+        raise ValueError(f"unknown batch op: {op}")
+
+    def _set_display_name(self, prompt_id: str, name: Any) -> None:
+        with self._display_names_lock:
+            self._display_names[str(prompt_id)] = str(name).strip() or None
+
+    def _remove_from_queue(self, prompt_ids: Set[str]) -> List[str]:
+        """Drop the given prompt_ids from the in-memory queue with one filter and one heapify."""
+        from server import PromptServer
+        q = PromptServer.instance.prompt_queue
+        if not prompt_ids:
+            return []
+        with q.mutex:
+            kept: List[Tuple] = []
+            removed: List[str] = []
+            for item in q.queue:
+                if str(item[1]) in prompt_ids:
+                    removed.append(str(item[1]))
+                else:
+                    kept.append(item)
+            if removed:
+                q.queue = kept
+                heapq.heapify(q.queue)
+                q.server.queue_updated()
+        return removed
+
     async def _api_rename(self, request: web.Request) -> web.Response:
         try:
-            from server import PromptServer
             body = await request.json()
             prompt_id: str = body.get('prompt_id')
             new_name: str = body.get('name')
             if not prompt_id or new_name is None:
                 return web.json_response({"ok": False, "error": "prompt_id and name required"}, status=400)
             # Persist to DB
-            ok = self.db.update_job_name(prompt_id, str(new_name))
+            ok = await self.io.db_call('update_job_name', prompt_id, str(new_name))
             if not ok:
                 return web.json_response({"ok": False, "error": "job not found"}, status=404)
+            self._set_display_name(prompt_id, new_name)
+            self._previews.forget_workflow(prompt_id)
+            self._feed.mark_dirty()
             # Do NOT mutate in-memory prompt JSON in the queue. The UI derives names from DB.
             # We intentionally avoid adding non-node keys (e.g. name/workflow) to the prompt to prevent execution errors.
             return web.json_response({"ok": True})
@@ -761,7 +1177,7 @@ class PersistentQueueManager:
 
             # Load and validate any missing selected from DB (outside of queue lock)
             for prompt_id in missing_ids:
-                job = self.db.get_job(prompt_id)
+                job = await self.io.db_call('get_job', prompt_id)
                 if not job:
                     continue
                 try:
@@ -797,10 +1213,11 @@ class PersistentQueueManager:
                     selected_final = [current_by_id[pid] for pid in executed_ids if pid in current_by_id]
                     selected_final_sorted = sorted(selected_final, key=lambda it: it[0])
                     selected_ids_final = [str(it[1]) for it in selected_final_sorted]
-                self._rebuild_queue_by_prompt_ids(selected_ids_final)
+                await self.io.run(self._rebuild_queue_by_prompt_ids, selected_ids_final, name='run_selected')
             
             # Enable run-selected mode while keeping queue paused so only selected items run
             self._run_selected_remaining = set(map(str, executed_ids))
+            self._wake_workers()
             logging.info(f"PersistentQueue: Run-selected mode enabled for {len(executed_ids)} jobs; queue remains paused")
             
             return web.json_response({"ok": True, "executed": executed_ids})
@@ -811,24 +1228,13 @@ class PersistentQueueManager:
     async def _api_skip_selected(self, request: web.Request) -> web.Response:
         """Skip selected jobs (remove from queue)"""
         try:
-            from server import PromptServer
             body = await request.json()
             prompt_ids: List[str] = body.get('prompt_ids', [])
             
             if self.paused:
                 return web.json_response({"ok": False, "error": "Queue must be running to skip jobs"}, status=400)
             
-            q = PromptServer.instance.prompt_queue
-            skipped_ids = []
-            
-            for pid in prompt_ids:
-                try:
-                    q.delete(pid)
-                    self.db.update_job_status(pid, 'cancelled')
-                    skipped_ids.append(pid)
-                except Exception:
-                    pass
-                    
+            skipped_ids = await self.io.run(self._apply_batch, 'skip', prompt_ids, {}, name='batch.skip')
             return web.json_response({"ok": True, "skipped": skipped_ids})
         except Exception as e:
             logging.warning(f"PersistentQueue skip selected failed: {e}")
@@ -839,46 +1245,128 @@ class PersistentQueueManager:
 
         The selected_ids_in_order must be in desired execution order (first executes first).
         We assign them numbers lower than any existing number to ensure they run next,
-        while keeping all other items' numbers intact to preserve global order.
+        while keeping all other items' numbers intact to preserve global order. A few selected
+        items are moved in place through the queue index (O(k log n)); when most of the queue
+        is selected it is renumbered in one pass instead. The new numbers are saved as ranks.
         """
         from server import PromptServer
         q = PromptServer.instance.prompt_queue
+        ranks: Dict[str, Any] = {}
         with q.mutex:
             # Normalize to strings for safe comparisons
-            sel_ids = [str(pid) for pid in selected_ids_in_order]
-            pos_map: Dict[str, int] = {pid: idx for idx, pid in enumerate(sel_ids)}
-            selected_set = set(sel_ids)
-
-            # Find current minimum number so we can place selected before it
+            sel_ids = list(dict.fromkeys(str(pid) for pid in selected_ids_in_order))
+            # The heap root holds the smallest number; place the selection before it
+            min_num = q.queue[0][0] if q.queue else 0
+            new_num_start = min_num - len(sel_ids)
+            self._qindex.begin()
+            if len(sel_ids) * 8 <= len(q.queue):
+                for idx, pid in enumerate(sel_ids):
+                    if self._qindex.move(q.queue, pid, new_num_start + idx):
+                        ranks[pid] = new_num_start + idx
+                if not ranks:
+                    return
+            else:
+                # Most of the queue is renumbered: one pass and a heapify beat per-item sifts
+                pos_map: Dict[str, int] = {pid: idx for idx, pid in enumerate(sel_ids)}
+                new_items: List[Tuple] = []
+                for old in q.queue:
+                    idx = pos_map.get(str(old[1]))
+                    if idx is None:
+                        new_items.append(old)
+                    else:
+                        new_items.append((new_num_start + idx,) + tuple(old[1:]))
+                        ranks[str(old[1])] = new_num_start + idx
+                q.queue = new_items
+                heapq.heapify(q.queue)
+            q.server.queue_updated()
             try:
-                min_num = min((it[0] for it in q.queue), default=0)
+                # Nudge workers to pick up newly promoted items immediately
+                q.not_empty.notify_all()
             except Exception:
-                min_num = 0
-            new_num_start = min_num - len(sel_ids)
+                pass
+        self._wake_workers()
+        self._save_ranks(ranks)
 
-            new_items: List[Tuple] = []
-            for old in q.queue:
-                pid = str(old[1])
-                prompt = old[2]
-                # Clean rename metadata for all items to avoid accidental drift
-                if isinstance(prompt, dict) and ('workflow' in prompt or 'name' in prompt):
-                    prompt = {k: v for k, v in prompt.items() if k not in ['workflow', 'name']}
-                if pid in selected_set:
-                    idx = pos_map.get(pid, 0)
-                    new_num = new_num_start + idx
-                    new_items.append((new_num, old[1], prompt, old[3], old[4]))
-                else:
-                    # Keep existing number to preserve original order
-                    new_items.append((old[0], old[1], prompt, old[3], old[4]))
+    def _save_ranks(self, ranks: Dict[str, Any]) -> None:
+        try:
+            self.db.update_job_ranks(ranks)
+        except Exception as e:
+            logging.debug(f"PersistentQueue: saving queue ranks failed: {e}")
 
-            q.queue = new_items
-            heapq.heapify(q.queue)
+    def _move_job(self, prompt_id: str, after_id: Optional[str], before_id: Optional[str]) -> Optional[str]:
+        """Give one queued item a number between those of its new neighbours; returns an error or None.
+
+        Numbers are fractional rank keys: the item takes the midpoint of its neighbours'
+        numbers, is sifted into place through the queue index (O(log n)) and one row is
+        updated. Without "after" it goes in front of the heap root, without "before" it takes
+        the next number, like a newly queued prompt. Only when repeated halving has used up
+        the float precision between two neighbours is the queue renumbered with integers.
+        """
+        from server import PromptServer
+        server = PromptServer.instance
+        q = server.prompt_queue
+        with q.mutex:
+            index = self._qindex
+            index.begin()
+            if index.locate(q.queue, prompt_id) is None:
+                return "item is no longer queued"
+            lo = index.number(q.queue, after_id) if after_id else None
+            hi = index.number(q.queue, before_id) if before_id else None
+            if (after_id and lo is None) or (before_id and hi is None):
+                return "neighbour is no longer queued"
+            if prompt_id in (after_id, before_id):
+                return "item cannot be its own neighbour"
+            if lo is None:
+                number = _number_between(None, min(hi, q.queue[0][0]))
+            elif hi is None:
+                number = max(server.number, int(lo // 1) + 1)
+                server.number = number + 1
+            else:
+                if not lo < hi:
+                    return "neighbours are out of order"
+                number = _number_between(lo, hi)
+            if number is None:
+                ranks = self._renumber_queue(q, prompt_id, after_id)
+                if ranks is None:
+                    return "item is no longer queued"
+            else:
+                index.move(q.queue, prompt_id, number)
+                ranks = {prompt_id: number}
             q.server.queue_updated()
             try:
-                # Nudge workers to pick up newly promoted items immediately
                 q.not_empty.notify_all()
             except Exception:
                 pass
+        # A paused run-selected worker may now find a permitted item at the top
+        self._wake_workers()
+        self._save_ranks(ranks)
+        return None
+
+    def _renumber_queue(self, q: Any, prompt_id: str, after_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Respace the whole queue with consecutive integers, placing prompt_id right after after_id.
+
+        Called with q.mutex held, only when no number is left between two neighbours. A sorted
+        list is a valid heap, so no heapify is needed. Returns every item's new number, or None
+        (queue untouched) when either item is not queued.
+        """
+        from server import PromptServer
+        server = PromptServer.instance
+        items = sorted(q.queue)
+        moving = next((it for it in items if str(it[1]) == str(prompt_id)), None)
+        if moving is None:
+            return None
+        items.remove(moving)
+        at = 0
+        if after_id is not None:
+            at = next((i + 1 for i, it in enumerate(items) if str(it[1]) == str(after_id)), None)
+            if at is None:
+                return None
+        items.insert(at, moving)
+        start = int(items[0][0] // 1)
+        q.queue = [(start + i,) + tuple(it[1:]) for i, it in enumerate(items)]
+        server.number = max(server.number, start + len(items))
+        self._qindex.begin()
+        return {str(it[1]): it[0] for it in q.queue}
 
     def _is_prompt_allowed_while_paused(self, prompt_id: str) -> bool:
         try:
@@ -887,25 +1375,90 @@ class PersistentQueueManager:
             return False
 
     def _apply_priority_to_pending(self) -> None:
-        """Rebuild in-memory queue using DB priority DESC, then created_at ASC."""
+        """Renumber the whole in-memory queue by DB priority DESC, then created_at ASC."""
+        self._rebuild_queue_by_prompt_ids(self.db.get_pending_job_ids())
+
+    def _set_job_priority(self, prompt_id: str, priority: int) -> bool:
+        """Persist one job's priority and move only that item in the heap.
+
+        The item gets a number between those of its new neighbours in pending order (two
+        indexed DB lookups), then is sifted into place: O(log n). When the neighbours are out
+        of order, for example after a manual reorder, or fractional numbers between them have
+        run out, the whole queue is renumbered instead.
+        """
         from server import PromptServer
         q = PromptServer.instance.prompt_queue
-        pending = self.db.get_pending_jobs()
-        # order prompt_ids by priority desc, created_at asc
-        ordered_ids = [row["prompt_id"] for row in sorted(pending, key=lambda r: (-int(r.get("priority", 0)), r.get("created_at") or ""))]
-        self._rebuild_queue_by_prompt_ids(ordered_ids)
+        self.db.update_job_priority(prompt_id, priority)
+        before, after = self.db.get_priority_neighbors(prompt_id)
+        with q.mutex:
+            self._qindex.begin()
+            if self._qindex.locate(q.queue, prompt_id) is None:
+                return False
+            # Nearest neighbours that are actually queued (not running, skipped, ...)
+            lo = next((n for n in (self._qindex.number(q.queue, pid) for pid in before) if n is not None), None)
+            hi = next((n for n in (self._qindex.number(q.queue, pid) for pid in after) if n is not None), None)
+            number = _number_between(lo, hi)
+            if number is not None:
+                if lo is None and hi is None:
+                    return True
+                self._qindex.move(q.queue, prompt_id, number)
+                q.server.queue_updated()
+                q.not_empty.notify_all()
+        if number is not None:
+            self._wake_workers()
+            self._save_ranks({prompt_id: number})
+            return True
+        self._apply_priority_to_pending()
+        return True
 
     async def _api_get_history_thumb(self, request: web.Request) -> web.Response:
         try:
             history_id = int(request.match_info.get('history_id', '0'))
             idx = int(request.rel_url.query.get('idx', '0'))
-            row = self.db.get_history_thumbnail(history_id, idx)
+            row = await self.io.db_call('get_history_thumbnail', history_id, idx)
             if not row:
                 return web.Response(status=404)
-            return web.Response(body=row['data'], content_type=row.get('mime') or 'image/webp')
+            headers = {"ETag": row['etag'], "Cache-Control": THUMB_CACHE_CONTROL}
+            if row['etag'] in request.headers.get('If-None-Match', ''):
+                return web.Response(status=304, headers=headers)
+            mime = row.get('mime') or 'image/webp'
+            if row.get('path'):
+                # Streamed with sendfile; nothing is copied through the database or Python
+                headers["Content-Type"] = mime
+                return web.FileResponse(row['path'], headers=headers)
+            return web.Response(body=row['data'], content_type=mime, headers=headers)
         except Exception:
             return web.Response(status=500)
 
+    async def _api_get_history_thumbs(self, request: web.Request) -> web.Response:
+        """Thumbnails for many history rows in one response (?ids=1,2,3&idx=0, at most 200 ids).
+
+        The body is framed as described in ThumbnailFileStore.pack(); the client slices it into
+        object URLs instead of issuing one request per tile.
+        """
+        try:
+            ids: List[int] = []
+            for part in (request.rel_url.query.get('ids') or '').split(','):
+                part = part.strip()
+                if part.isdigit():
+                    ids.append(int(part))
+            ids = list(dict.fromkeys(ids))[:200]
+            idx = int(request.rel_url.query.get('idx', '0'))
+            if not ids:
+                return web.json_response({"error": "ids required"}, status=400)
+
+            def _load() -> Tuple[bytes, str]:
+                return self.db.thumb_files.pack(ids, self.db.get_history_thumbnails(ids, idx))
+
+            body, etag = await self.io.run(_load, name='thumbs.batch')
+            headers = {"ETag": etag, "Cache-Control": THUMB_CACHE_CONTROL}
+            if etag in request.headers.get('If-None-Match', ''):
+                return web.Response(status=304, headers=headers)
+            return web.Response(body=body, content_type='application/octet-stream', headers=headers)
+        except Exception as e:
+            logging.debug(f"PersistentQueue: batch thumbnails failed: {e}")
+            return web.Response(status=500)
+
     async def _api_preview_image(self, request: web.Request) -> web.Response:
         """Serve cached previews with embedded workflow metadata if available.
 
@@ -913,22 +1466,51 @@ class PersistentQueueManager:
         """
         try:
             params = self._parse_preview_params(request)
-            file = self._resolve_preview_filepath(params)
-            if file is None:
-                return web.Response(status=400)
-            if not os.path.isfile(file):
-                return web.Response(status=404)
-
-            cache_path = self._compute_preview_cache_path(file, params)
-            if cache_path and os.path.exists(cache_path):
-                return web.FileResponse(cache_path, headers={"Content-Disposition": f"filename=\"{params['filename']}\""})
-
-            # Render and cache
-            cache_path = self._render_and_cache_preview(file, params, cache_path)
-            return web.FileResponse(cache_path, headers={"Content-Disposition": f"filename=\"{params['filename']}\""})
+            status, path = await self.io.run(self._prepare_preview, params, name='preview.prepare')
+            if path is None:
+                return web.Response(status=status)
+            return web.FileResponse(path, headers={"Content-Disposition": f"filename=\"{params['filename']}\""})
         except Exception:
             return web.Response(status=500)
 
+    async def _api_preview_stats(self, request: web.Request) -> web.Response:
+        """Preview cache counters: hits, misses, evictions, size and budget."""
+        return web.json_response(self._previews.stats())
+
+    def _prepare_preview(self, params: Dict[str, Any]) -> Tuple[int, Optional[str]]:
+        """Blocking part of the preview request: resolve, look up metadata, render if not cached.
+
+        Returns (status, cache_path); cache_path is None on error.
+        """
+        file = self._resolve_preview_filepath(params)
+        if file is None:
+            return 400, None
+        try:
+            st = os.stat(file)
+        except OSError:
+            return 404, None
+        pid = params.get('pid')
+
+        # Fast path: known workflow hash for this pid, so no DB lookup and no hashing
+        known = self._previews.workflow_hash_for(pid)
+        if known is not None:
+            hit = self._previews.get(PreviewCache.make_key(file, st, params['image_format'], params['quality'], known))
+            if hit:
+                return 200, hit
+
+        params['workflow_json'] = self._lookup_workflow_json(pid) if pid else None
+        wf_hash = workflow_hash(params['workflow_json'])
+        if params['workflow_json'] is not None:
+            self._previews.remember_workflow(pid, wf_hash)
+        key = PreviewCache.make_key(file, st, params['image_format'], params['quality'], wf_hash)
+        if wf_hash != known:
+            hit = self._previews.get(key)
+            if hit:
+                return 200, hit
+
+        # Render and cache
+        return 200, self._previews.put(key, lambda out_path: self._render_preview(file, params, out_path))
+
     def _parse_preview_params(self, request: web.Request) -> Dict[str, Any]:
         preview_q = request.rel_url.query.get('preview', 'webp;50')
         preview_info = preview_q.split(';')
@@ -947,18 +1529,17 @@ class PersistentQueueManager:
             'pid': pid,
             'image_format': image_format,
             'quality': quality,
-            'workflow_json': self._lookup_workflow_json(pid) if pid else None,
+            # Filled in by _prepare_preview on the I/O pool
+            'workflow_json': None,
         }
 
     def _lookup_workflow_json(self, pid: Optional[str]) -> Optional[str]:
         if not pid:
             return None
         try:
-            with self.db._get_conn() as conn:
-                cur = conn.execute('SELECT workflow FROM job_history WHERE prompt_id = ? ORDER BY id DESC LIMIT 1', (pid,))
-                row = cur.fetchone()
-                if row and row['workflow']:
-                    return row['workflow']
+            wf = self.db.get_history_workflow(pid)
+            if wf:
+                return wf
         except Exception:
             pass
         job = self.db.get_job(pid)
@@ -980,17 +1561,7 @@ class PersistentQueueManager:
         filename = os.path.basename(params.get('filename') or '')
         return os.path.join(output_dir, filename)
 
-    def _compute_preview_cache_path(self, file: str, params: Dict[str, Any]) -> Optional[str]:
-        temp_dir = folder_paths.get_temp_directory()
-        cache_dir = os.path.join(temp_dir, 'preview_cache')
-        os.makedirs(cache_dir, exist_ok=True)
-        wf_hash = hashlib.sha256(((params.get('workflow_json') or '')).encode('utf-8')).hexdigest()[:16]
-        stat = os.stat(file)
-        cache_key = f"{os.path.abspath(file)}|{stat.st_mtime}|{stat.st_size}|{params['image_format']}|{params['quality']}|{wf_hash}"
-        cache_name = hashlib.sha256(cache_key.encode('utf-8')).hexdigest() + f'.{params["image_format"]}'
-        return os.path.join(cache_dir, cache_name)
-
-    def _render_and_cache_preview(self, file: str, params: Dict[str, Any], cache_path: Optional[str]) -> str:
+    def _render_preview(self, file: str, params: Dict[str, Any], out_path: str) -> None:
         with Image.open(file) as img:
             save_kwargs: Dict[str, Any] = {"format": params['image_format']}
             if params['image_format'] in ['webp', 'jpeg']:
@@ -1003,8 +1574,7 @@ class PersistentQueueManager:
             elif params['image_format'] == 'png':
                 self.thumbs.embed_png_metadata(img, save_kwargs, workflow_json)
 
-            img.save(cache_path, **save_kwargs)
-        return cache_path
+            img.save(out_path, **save_kwargs)
 
     def _count_samplers_from_prompt(self, prompt: Optional[Any]) -> int:
         """Heuristic: count nodes that look like samplers in a ComfyUI prompt JSON.
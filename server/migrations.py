@@ -0,0 +1,122 @@
+import time
+import logging
+import sqlite3
+import threading
+from typing import Optional, Any, Callable, Dict, List
+
+# progress(done, total) reported by a migration after each committed batch
+ProgressFn = Callable[[int, int], None]
+
+
+class Migration:
+    """One versioned data migration/backfill.
+
+    run(progress=...) works through the rows in small committed batches and must be safe to
+    re-run from the start: it is repeated after an interruption until it completes once, at
+    which point `version` is recorded in PRAGMA user_version and it never runs again.
+    """
+
+    def __init__(self, version: int, name: str, run: Callable[..., Any]):
+        self.version = int(version)
+        self.name = name
+        self.run = run
+
+
+class MigrationProgress:
+    """State of the background migration run, served by the migration progress endpoint."""
+
+    def __init__(self):
+        self.state = "idle"
+        self.version = 0
+        self.target = 0
+        self.current: Optional[str] = None
+        self.done = 0
+        self.total = 0
+        self.completed: List[Dict[str, Any]] = []
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        return {
+            "state": self.state,
+            "version": self.version,
+            "target_version": self.target,
+            "current": self.current,
+            "done": self.done,
+            "total": self.total,
+            "completed": list(self.completed),
+            "error": self.error,
+            "elapsed_seconds": round(end - self.started_at, 3) if self.started_at else 0.0,
+        }
+
+
+class MigrationRunner:
+    """Runs pending migrations in version order on one background thread.
+
+    The schema version is SQLite's PRAGMA user_version: migrations with a higher version run,
+    each to completion, and the version is bumped after each one. A failure stops the run
+    (later versions may depend on earlier ones); it is retried on the next start. Request
+    handlers never wait for any of this.
+    """
+
+    def __init__(self, get_conn: Callable[[], sqlite3.Connection], migrations: List[Migration]):
+        self._get_conn = get_conn
+        self.migrations = sorted(migrations, key=lambda m: m.version)
+        self.latest = self.migrations[-1].version if self.migrations else 0
+        self.progress = MigrationProgress()
+        self.progress.target = self.latest
+        self._thread: Optional[threading.Thread] = None
+        self._done = threading.Event()
+
+    def current_version(self) -> int:
+        with self._get_conn() as conn:
+            return int(conn.execute('PRAGMA user_version').fetchone()[0])
+
+    @staticmethod
+    def set_version(conn: sqlite3.Connection, version: int) -> None:
+        conn.execute(f'PRAGMA user_version = {int(version)}')
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self.run, name="pqueue-migrations", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def run(self) -> None:
+        p = self.progress
+        try:
+            p.version = self.current_version()
+            pending = [m for m in self.migrations if m.version > p.version]
+            if not pending:
+                p.state = "done"
+                return
+            p.state = "running"
+            p.started_at = time.time()
+            for m in pending:
+                p.current, p.done, p.total = m.name, 0, 0
+                started = time.time()
+
+                def _report(done: int, total: int) -> None:
+                    p.done, p.total = int(done), int(total)
+
+                m.run(progress=_report)
+                with self._get_conn() as conn:
+                    self.set_version(conn, m.version)
+                    conn.commit()
+                p.version = m.version
+                p.completed.append({"version": m.version, "name": m.name, "rows": p.done, "seconds": round(time.time() - started, 3)})
+                logging.debug(f"PersistentQueue: migration {m.version} ({m.name}) finished")
+            p.current = None
+            p.state = "done"
+        except Exception as e:
+            p.state = "failed"
+            p.error = f"{p.current}: {e}"
+            logging.warning(f"PersistentQueue: migration {p.current} failed; it will be retried on the next start: {e}")
+        finally:
+            p.finished_at = time.time()
+            self._done.set()
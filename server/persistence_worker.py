@@ -0,0 +1,98 @@
+import queue
+import threading
+import logging
+from typing import Optional, Any, Callable, Dict, List
+
+
+class HistoryPersistenceWorker:
+    """Background pool that turns journaled job completions into history rows and thumbnails.
+
+    The execution thread only journals the completion (see QueueDatabase.record_completion)
+    and submits a job here. Work is bounded: when the queue is full, submit() blocks briefly
+    and then runs the job inline, so a slow disk applies back-pressure instead of growing
+    memory without limit. shutdown() drains everything still queued before returning.
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        persist_fn: Callable[[Dict[str, Any]], None],
+        *,
+        workers: int = 2,
+        max_pending: int = 64,
+        submit_timeout: float = 2.0,
+    ):
+        self._persist_fn = persist_fn
+        self._workers = max(1, int(workers))
+        self._submit_timeout = float(submit_timeout)
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, int(max_pending)))
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._accepting = False
+
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            self._accepting = True
+            for i in range(self._workers):
+                t = threading.Thread(target=self._run, name=f"pqueue-history-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, job: Dict[str, Any]) -> None:
+        """Queue a job for background persistence; runs inline if the pipeline is saturated or stopped."""
+        if self._accepting:
+            try:
+                self._queue.put(job, timeout=self._submit_timeout)
+                return
+            except queue.Full:
+                logging.debug("PersistentQueue: history pipeline full; persisting inline")
+        self._process(job)
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def flush(self) -> None:
+        """Block until every submitted job has been processed."""
+        self._queue.join()
+
+    def shutdown(self, timeout: Optional[float] = 30.0) -> None:
+        """Stop accepting work, drain queued jobs and join the worker threads."""
+        with self._lock:
+            if not self._accepting:
+                return
+            self._accepting = False
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(self._STOP)
+        for t in threads:
+            t.join(timeout)
+        # Anything left (e.g. workers timed out) is persisted on the caller's thread
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                if job is not self._STOP:
+                    self._process(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                if job is self._STOP:
+                    return
+                self._process(job)
+            finally:
+                self._queue.task_done()
+
+    def _process(self, job: Dict[str, Any]) -> None:
+        try:
+            self._persist_fn(job)
+        except Exception as e:
+            logging.warning(f"PersistentQueue: background history persistence failed for {job.get('prompt_id')}: {e}")
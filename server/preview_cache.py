@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional, Any, Callable, Dict, Tuple
+
+# (source abspath, mtime_ns, size, format, quality, workflow hash)
+PreviewKey = Tuple[str, int, int, str, int, str]
+
+_INDEX_FILE = "index.json"
+# Persist the index at most this often while entries change; always on shutdown
+_SAVE_INTERVAL = 30.0
+# pid -> workflow hash memo entries kept
+_MEMO_LIMIT = 4096
+
+
+def workflow_hash(workflow_json: Optional[str]) -> str:
+    return hashlib.sha256((workflow_json or "").encode("utf-8")).hexdigest()[:16]
+
+
+_EMPTY_HASH = workflow_hash(None)
+
+
+class PreviewCache:
+    """Byte-bounded LRU cache of rendered previews (images re-encoded with embedded workflow).
+
+    Entries are files in `root`, indexed in memory by (source path, mtime, size, format,
+    quality, workflow hash) so a hit costs one stat of the source and no DB lookup or
+    hashing: the workflow hash of a prompt_id is memoized after its first render. The
+    index is saved to index.json so the cache is warm after a restart; files it does not
+    list are removed on load. Least recently used entries are deleted once the total size
+    exceeds `budget_bytes`.
+    """
+
+    def __init__(self, root: str, budget_bytes: int):
+        self.root = root
+        self.budget_bytes = max(0, int(budget_bytes))
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[PreviewKey, Tuple[str, int]]" = OrderedDict()
+        self._memo: "OrderedDict[str, str]" = OrderedDict()
+        self._bytes = 0
+        self._dirty = False
+        self._saved_at = 0.0
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "memo_hits": 0}
+        try:
+            os.makedirs(root, exist_ok=True)
+            self._load_index()
+        except Exception as e:
+            logging.debug(f"PersistentQueue: preview cache index not loaded: {e}")
+
+    @staticmethod
+    def make_key(file: str, st: os.stat_result, image_format: str, quality: int, wf_hash: str) -> PreviewKey:
+        return (os.path.abspath(file), int(st.st_mtime_ns), int(st.st_size), str(image_format), int(quality), wf_hash)
+
+    def workflow_hash_for(self, pid: Optional[str]) -> Optional[str]:
+        """Memoized workflow hash for a prompt_id; None when it has to be looked up."""
+        if not pid:
+            return _EMPTY_HASH
+        with self._lock:
+            h = self._memo.get(pid)
+            if h is not None:
+                self._memo.move_to_end(pid)
+                self._counters["memo_hits"] += 1
+            return h
+
+    def remember_workflow(self, pid: Optional[str], wf_hash: str) -> None:
+        if not pid:
+            return
+        with self._lock:
+            self._memo[pid] = wf_hash
+            self._memo.move_to_end(pid)
+            while len(self._memo) > _MEMO_LIMIT:
+                self._memo.popitem(last=False)
+
+    def forget_workflow(self, pid: Optional[str]) -> None:
+        """Drop the memo for a job whose workflow JSON changed (e.g. renamed)."""
+        with self._lock:
+            self._memo.pop(str(pid), None)
+
+    def get(self, key: PreviewKey) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                path = os.path.join(self.root, entry[0])
+                if os.path.isfile(path):
+                    self._entries.move_to_end(key)
+                    self._dirty = True
+                    self._counters["hits"] += 1
+                    return path
+                self._entries.pop(key, None)
+                self._bytes -= entry[1]
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, key: PreviewKey, render: Callable[[str], None]) -> str:
+        """Render into a temp file via render(path), add it under key and evict as needed."""
+        name = hashlib.sha256(json.dumps(list(key)).encode("utf-8")).hexdigest() + "." + key[3]
+        path = os.path.join(self.root, name)
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".tmp-", suffix="." + key[3])
+        os.close(fd)
+        try:
+            render(tmp)
+            os.replace(tmp, path)
+        except Exception:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        size = os.path.getsize(path)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (name, size)
+            self._bytes += size
+            self._evict_locked(keep=key)
+            self._dirty = True
+        self.save_index(force=False)
+        return path
+
+    def _evict_locked(self, keep: Optional[PreviewKey]) -> None:
+        while self._bytes > self.budget_bytes and self._entries:
+            key, (name, size) = next(iter(self._entries.items()))
+            if key == keep:
+                break
+            del self._entries[key]
+            self._bytes -= size
+            self._counters["evictions"] += 1
+            try:
+                os.unlink(os.path.join(self.root, name))
+            except OSError:
+                pass
+
+    def _load_index(self) -> None:
+        index_path = os.path.join(self.root, _INDEX_FILE)
+        listed = set()
+        if os.path.isfile(index_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                doc = json.load(f)
+            for key, name, size in doc.get("entries", []):
+                if os.path.isfile(os.path.join(self.root, name)):
+                    self._entries[tuple(key)] = (name, int(size))
+                    self._bytes += int(size)
+                    listed.add(name)
+        # Files written by a run that did not save its index cannot be looked up again
+        for name in os.listdir(self.root):
+            if name != _INDEX_FILE and name not in listed:
+                try:
+                    os.unlink(os.path.join(self.root, name))
+                except OSError:
+                    pass
+        self._evict_locked(keep=None)
+
+    def save_index(self, force: bool = True) -> None:
+        """Write index.json (LRU order) if entries changed; throttled unless force."""
+        with self._lock:
+            if not self._dirty or (not force and time.time() - self._saved_at < _SAVE_INTERVAL):
+                return
+            entries = [[list(k), name, size] for k, (name, size) in self._entries.items()]
+            self._dirty = False
+            self._saved_at = time.time()
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".tmp-", suffix=".json")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"version": 1, "entries": entries}, f)
+            os.replace(tmp, os.path.join(self.root, _INDEX_FILE))
+        except Exception as e:
+            logging.debug(f"PersistentQueue: saving preview cache index failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_rate": round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "budget_bytes": self.budget_bytes,
+                "memo_entries": len(self._memo),
+            }
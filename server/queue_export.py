@@ -0,0 +1,164 @@
+import json
+import time
+import zlib
+import tarfile
+from typing import Optional, Any, Dict, List
+
+FORMATS = ("json", "ndjson")
+# Tar member names used for records; the importer reads queue/ members back
+QUEUE_MEMBER_PREFIX = "queue/"
+HISTORY_MEMBER_PREFIX = "history/"
+THUMB_MEMBER_PREFIX = "thumbs/"
+MANIFEST_MEMBER = "manifest.json"
+
+_THUMB_EXTENSIONS = {"image/webp": ".webp", "image/png": ".png", "image/jpeg": ".jpg"}
+_TAR_BLOCK = 512
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def _with_raw_fields(record: Dict[str, Any], raw: Dict[str, Optional[str]]) -> str:
+    """Serialize record plus fields whose values are stored JSON text, spliced in without a decode/encode.
+
+    Text that could break the framing (not an object/array, or containing a newline) is
+    round-tripped through json instead; undecodable text becomes null.
+    """
+    parts = [_dumps(record)[:-1]]
+    sep = "," if record else ""
+    for key, text in raw.items():
+        value = "null"
+        if isinstance(text, str):
+            stripped = text.strip()
+            if stripped[:1] in ("{", "[") and stripped[-1:] in ("}", "]") and "\n" not in stripped:
+                value = stripped
+            else:
+                try:
+                    value = _dumps(json.loads(text))
+                except Exception:
+                    value = "null"
+        elif text is not None:
+            value = _dumps(text)
+        parts.append(sep + _dumps(key) + ":" + value)
+        sep = ","
+    return "".join(parts) + "}"
+
+
+class ExportEncoder:
+    """Encodes a queue/history export record by record, so it can be streamed in constant memory.
+
+    Formats:
+    - json: {"version": 1, "exported_at": ..., "items": [...], "history": [...]} written
+      incrementally; the "items" part is what older versions export and import.
+    - ndjson: one object per line, {"type": "header"|"item"|"history"|"end", ...}.
+    - tar (thumbs=True): manifest.json, then one JSON file per record under queue/ and
+      history/, and each history thumbnail under thumbs/<history id>-<idx>.<ext>.
+    Any of them can be gzip-compressed. Every method returns the bytes to send next.
+    """
+
+    def __init__(self, fmt: str = "json", *, gzip: bool = False, thumbs: bool = False):
+        fmt = (fmt or "json").lower()
+        if fmt not in FORMATS:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+        self.format = "tar" if thumbs else fmt
+        self.gzip = bool(gzip)
+        self._zip = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if self.gzip else None
+        self._first = True
+        self._mtime = int(time.time())
+        self.counts: Dict[str, int] = {"items": 0, "history": 0, "thumbs": 0}
+
+    @property
+    def content_type(self) -> str:
+        if self.gzip:
+            return "application/gzip"
+        return {"json": "application/json", "ndjson": "application/x-ndjson", "tar": "application/x-tar"}[self.format]
+
+    def filename(self, stem: str) -> str:
+        return f"{stem}.{self.format}" + (".gz" if self.gzip else "")
+
+    def _out(self, data: bytes) -> bytes:
+        return self._zip.compress(data) if self._zip is not None else data
+
+    def _member(self, name: str, data: bytes) -> bytes:
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = self._mtime
+        info.mode = 0o644
+        pad = (-len(data)) % _TAR_BLOCK
+        return info.tobuf(tarfile.USTAR_FORMAT, "utf-8", "surrogateescape") + data + b"\0" * pad
+
+    def begin(self, meta: Dict[str, Any]) -> bytes:
+        head = {"version": 1, **meta}
+        if self.format == "json":
+            return self._out(_dumps(head)[:-1].encode("utf-8"))
+        if self.format == "ndjson":
+            return self._out((_dumps({"type": "header", **head}) + "\n").encode("utf-8"))
+        return self._out(self._member(MANIFEST_MEMBER, _dumps(head).encode("utf-8")))
+
+    def open_section(self, name: str) -> bytes:
+        """Start the "items" (queue) or "history" records."""
+        self._first = True
+        if self.format == "json":
+            return self._out(f',"{name}":['.encode("utf-8"))
+        return b""
+
+    def close_section(self) -> bytes:
+        return self._out(b"]") if self.format == "json" else b""
+
+    def _record(self, kind: str, text: str) -> bytes:
+        if self.format == "json":
+            sep = "" if self._first else ","
+            self._first = False
+            return self._out((sep + text).encode("utf-8"))
+        # ndjson: the record type goes first on the line
+        return self._out(('{"type":"' + kind + '",' + text[1:] + "\n").encode("utf-8"))
+
+    def queue_item(self, prompt_id: str, workflow_text: Optional[str], priority: int, created_at: Any) -> bytes:
+        self.counts["items"] += 1
+        text = _with_raw_fields(
+            {"prompt_id": prompt_id, "priority": int(priority or 0), "created_at": created_at},
+            {"workflow": workflow_text},
+        )
+        if self.format == "tar":
+            return self._out(self._member(f"{QUEUE_MEMBER_PREFIX}{self.counts['items']:08d}.json", text.encode("utf-8")))
+        return self._record("item", text)
+
+    def history_row(self, row: Dict[str, Any]) -> bytes:
+        self.counts["history"] += 1
+        record = {k: row.get(k) for k in ("id", "prompt_id", "status", "created_at", "completed_at", "duration_seconds")}
+        out: List[bytes] = []
+        if self.format == "tar":
+            names = []
+            for thumb in row.get("thumbs") or []:
+                data = thumb.get("data")
+                if data is None and thumb.get("path"):
+                    try:
+                        with open(thumb["path"], "rb") as f:
+                            data = f.read()
+                    except OSError:
+                        data = None
+                if data is None:
+                    continue
+                name = f"{THUMB_MEMBER_PREFIX}{row.get('id')}-{thumb.get('idx', 0)}{_THUMB_EXTENSIONS.get(str(thumb.get('mime') or '').lower(), '.bin')}"
+                names.append(name)
+                out.append(self._member(name, data))
+                self.counts["thumbs"] += 1
+            record["thumbs"] = names
+        text = _with_raw_fields(record, {"workflow": row.get("workflow"), "outputs": row.get("outputs")})
+        if self.format == "tar":
+            out.insert(0, self._member(f"{HISTORY_MEMBER_PREFIX}{row.get('id')}.json", text.encode("utf-8")))
+            return self._out(b"".join(out))
+        return self._record("history", text)
+
+    def finish(self) -> bytes:
+        if self.format == "json":
+            tail = b"}"
+        elif self.format == "ndjson":
+            tail = (_dumps({"type": "end", **self.counts}) + "\n").encode("utf-8")
+        else:
+            tail = b"\0" * (_TAR_BLOCK * 2)
+        data = self._out(tail)
+        if self._zip is not None:
+            data += self._zip.flush()
+        return data
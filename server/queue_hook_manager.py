@@ -1,6 +1,8 @@
+import copy
 import time
 import heapq
 import logging
+import threading
 from typing import Optional, Any, Callable
 
 
@@ -8,16 +10,29 @@ class QueueHookManager:
     """Manages installation/uninstallation of queue hooks.
 
     Responsible for wrapping prompt queue methods to add persistence and pause behavior.
+    While paused, the worker blocks on a condition variable instead of polling. Queue
+    changes reported through server.queue_updated() wake it automatically; callers must
+    invoke wake() when pause state or the run-selected set changes, or after reordering
+    the heap in place.
     """
 
-    def __init__(self, *, is_paused_fn: Callable[[], bool], on_job_started: Callable[[str], None], on_task_done: Callable[[Any, Any, Any], None], should_run_when_paused: Optional[Callable[[str], bool]] = None):
+    # Returned by _get_and_mark_started when a popped item had to be put back
+    _RETRY = object()
+
+    def __init__(self, *, is_paused_fn: Callable[[], bool], on_job_started: Callable[[str], None], on_task_done: Callable[[Any, Any, Any], None], should_run_when_paused: Optional[Callable[[str], bool]] = None, on_queue_updated: Optional[Callable[[], None]] = None, materialize_item: Optional[Callable[[Any], Optional[Any]]] = None, after_get: Optional[Callable[[Any], None]] = None):
         self._original_queue_get = None
         self._original_task_done = None
+        self._patched_server = None
         self._installed = False
         self._is_paused = is_paused_fn
         self._on_job_started = on_job_started
         self._on_task_done = on_task_done
         self._should_run_when_paused = should_run_when_paused
+        self._on_queue_updated = on_queue_updated
+        # Lazy restore: turns a popped placeholder into a runnable item (None = drop it)
+        self._materialize_item = materialize_item
+        self._after_get = after_get
+        self._gate = threading.Condition()
 
     def install(self) -> None:
         """Install hooks into execution.PromptQueue if not already installed."""
@@ -29,100 +44,23 @@ class QueueHookManager:
             self._original_queue_get = execution.PromptQueue.get
 
             def get_wrapper(q_self, timeout=None):
-                # If paused, only allow items explicitly permitted by the manager (run-selected mode)
-                try:
-                    if self._is_paused():
-                        allowed = False
-                        if callable(self._should_run_when_paused):
-                            try:
-                                top = q_self.queue[0] if getattr(q_self, 'queue', None) else None
-                            except Exception:
-                                top = None
-                            if top is not None:
-                                try:
-                                    top_pid = str(top[1])
-                                    allowed = bool(self._should_run_when_paused(top_pid))
-                                except Exception:
-                                    allowed = False
-                        if not allowed:
-                            time.sleep(0.1)
-                            return None
-                except Exception:
-                    # If anything goes wrong during checks, be safe and respect pause
-                    if self._is_paused():
-                        time.sleep(0.1)
-                        return None
-
-                result = self._original_queue_get(q_self, timeout=timeout)
-                if result is not None:
+                deadline = None if timeout is None else time.monotonic() + timeout
+                while True:
+                    # If paused, block on the gate until resumed or the top item is permitted (run-selected mode)
+                    remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
                     try:
-                        item, _item_id = result
-                        prompt_id = item[1]
-                        # Helper: sanitize prompt by stripping non-node metadata keys
-                        def _sanitize_item(it):
-                            try:
-                                n, pid, prompt, extra, outs = it
-                                if isinstance(prompt, dict):
-                                    try:
-                                        prompt_clean = {k: v for k, v in prompt.items() if k not in ('workflow', 'name')}
-                                    except Exception:
-                                        prompt_clean = prompt
-                                    if prompt_clean is not prompt:
-                                        return (n, pid, prompt_clean, extra, outs)
-                            except Exception:
-                                pass
-                            return it
-                        # If paused, ensure the popped item is allowed; otherwise, reinsert and yield None
-                        if self._is_paused() and callable(self._should_run_when_paused):
-                            try:
-                                if not self._should_run_when_paused(str(prompt_id)):
-                                    # Undo the side effects of the pop from the original get():
-                                    # 1) Remove from currently_running
-                                    # 2) Reinsert the item into the heap queue
-                                    # 3) Notify the server that the queue/running set changed
-                                    try:
-                                        with q_self.mutex:
-                                            try:
-                                                q_self.currently_running.pop(_item_id, None)
-                                            except Exception:
-                                                pass
-                                            try:
-                                                safe_item = _sanitize_item(item)
-                                                q_self.queue.append(safe_item)
-                                                heapq.heapify(q_self.queue)
-                                            except Exception:
-                                                pass
-                                            try:
-                                                q_self.server.queue_updated()
-                                            except Exception:
-                                                pass
-                                    except Exception:
-                                        pass
-                                    time.sleep(0.05)
-                                    return None
-                            except Exception:
-                                time.sleep(0.05)
-                                return None
-                        # Sanitize both the running copy and the returned item to prevent crashes
-                        try:
-                            with q_self.mutex:
-                                if _item_id in q_self.currently_running:
-                                    try:
-                                        q_self.currently_running[_item_id] = _sanitize_item(q_self.currently_running[_item_id])
-                                    except Exception:
-                                        pass
-                        except Exception:
-                            pass
-                        # Replace the returned item with sanitized version
-                        try:
-                            item = _sanitize_item(item)
-                            result = (item, _item_id)
-                        except Exception:
-                            pass
-                        self._on_job_started(prompt_id)
-                    except Exception as e:
-                        logging.debug(f"QueueHookManager get_wrapper failed: {e}")
-                return result
+                        if not self._wait_until_runnable(q_self, remaining):
+                            return None
+                    except Exception:
+                        # If anything goes wrong during checks, be safe and respect pause
+                        if self._is_paused():
+                            with self._gate:
+                                self._gate.wait(0.1)
+                            return None
+                    remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                    result = self._get_and_mark_started(q_self, remaining)
+                    if result is not self._RETRY:
+                        return result
 
             execution.PromptQueue.get = get_wrapper
 
@@ -138,6 +76,28 @@ class QueueHookManager:
 
             execution.PromptQueue.task_done = task_done_wrapper
 
+        if self._patched_server is None:
+            # PromptQueue reports every put/get/task_done/delete through server.queue_updated();
+            # a new or removed item can change what is at the top, so re-check the pause gate
+            try:
+                from server import PromptServer
+                srv = PromptServer.instance
+                original_queue_updated = srv.queue_updated
+
+                def queue_updated_wrapper(*args, **kwargs):
+                    if callable(self._on_queue_updated):
+                        try:
+                            self._on_queue_updated()
+                        except Exception as e:
+                            logging.debug(f"QueueHookManager on_queue_updated failed: {e}")
+                    self.wake()
+                    return original_queue_updated(*args, **kwargs)
+
+                srv.queue_updated = queue_updated_wrapper
+                self._patched_server = srv
+            except Exception as e:
+                logging.debug(f"QueueHookManager queue_updated hook failed: {e}")
+
         self._installed = True
 
     def uninstall(self) -> None:
@@ -151,6 +111,135 @@ class QueueHookManager:
         if self._original_task_done is not None:
             execution.PromptQueue.task_done = self._original_task_done
             self._original_task_done = None
+        if self._patched_server is not None:
+            try:
+                # Drop the instance attribute so the class method is used again
+                del self._patched_server.queue_updated
+            except Exception:
+                pass
+            self._patched_server = None
         self._installed = False
 
-
+    def wake(self) -> None:
+        """Wake workers blocked on the pause gate so they re-check whether they may run."""
+        with self._gate:
+            self._gate.notify_all()
+
+    def _may_run(self, q_self) -> bool:
+        """True when not paused, or when the top queue item is permitted while paused."""
+        if not self._is_paused():
+            return True
+        if not callable(self._should_run_when_paused):
+            return False
+        try:
+            top = q_self.queue[0] if getattr(q_self, 'queue', None) else None
+        except Exception:
+            top = None
+        if top is None:
+            return False
+        try:
+            return bool(self._should_run_when_paused(str(top[1])))
+        except Exception:
+            return False
+
+    def _wait_until_runnable(self, q_self, timeout) -> bool:
+        """Block until the worker may take the next item. Returns False on timeout."""
+        if self._may_run(q_self):
+            return True
+        with self._gate:
+            return self._gate.wait_for(lambda: self._may_run(q_self), timeout=timeout)
+
+    @staticmethod
+    def _sanitize_item(it):
+        """Strip non-node metadata keys (workflow/name) from a queue item's prompt."""
+        try:
+            n, pid, prompt, extra, outs = it
+            if isinstance(prompt, dict):
+                try:
+                    prompt_clean = {k: v for k, v in prompt.items() if k not in ('workflow', 'name')}
+                except Exception:
+                    prompt_clean = prompt
+                if prompt_clean is not prompt:
+                    return (n, pid, prompt_clean, extra, outs)
+        except Exception:
+            pass
+        return it
+
+    def _get_and_mark_started(self, q_self, timeout):
+        """Pop via the original get(), re-check permission, sanitize and report the started job.
+
+        Returns the original get() result, or _RETRY if a disallowed item raced to the top
+        between the gate check and the pop and had to be reinserted.
+        """
+        result = self._original_queue_get(q_self, timeout=timeout)
+        if result is not None:
+            try:
+                item, _item_id = result
+                prompt_id = item[1]
+                # If paused, ensure the popped item is allowed; otherwise, reinsert and retry
+                if self._is_paused() and callable(self._should_run_when_paused):
+                    try:
+                        allowed = self._should_run_when_paused(str(prompt_id))
+                    except Exception:
+                        allowed = False
+                    if not allowed:
+                        # Undo the side effects of the pop from the original get():
+                        # 1) Remove from currently_running
+                        # 2) Reinsert the item into the heap queue
+                        # 3) Notify the server that the queue/running set changed
+                        try:
+                            with q_self.mutex:
+                                try:
+                                    q_self.currently_running.pop(_item_id, None)
+                                except Exception:
+                                    pass
+                                try:
+                                    heapq.heappush(q_self.queue, self._sanitize_item(item))
+                                except Exception:
+                                    pass
+                                try:
+                                    q_self.server.queue_updated()
+                                except Exception:
+                                    pass
+                        except Exception:
+                            pass
+                        return self._RETRY
+                # Lazily restored entries are loaded and validated only now that they are due
+                if callable(self._materialize_item):
+                    full = self._materialize_item(item)
+                    if full is None:
+                        with q_self.mutex:
+                            q_self.currently_running.pop(_item_id, None)
+                            q_self.server.queue_updated()
+                        return self._RETRY
+                    if full is not item:
+                        item = full
+                        with q_self.mutex:
+                            if _item_id in q_self.currently_running:
+                                q_self.currently_running[_item_id] = copy.deepcopy(full)
+                        result = (item, _item_id)
+                if callable(self._after_get):
+                    try:
+                        self._after_get(q_self)
+                    except Exception as e:
+                        logging.debug(f"QueueHookManager after_get failed: {e}")
+                # Sanitize both the running copy and the returned item to prevent crashes
+                try:
+                    with q_self.mutex:
+                        if _item_id in q_self.currently_running:
+                            try:
+                                q_self.currently_running[_item_id] = self._sanitize_item(q_self.currently_running[_item_id])
+                            except Exception:
+                                pass
+                except Exception:
+                    pass
+                # Replace the returned item with sanitized version
+                try:
+                    item = self._sanitize_item(item)
+                    result = (item, _item_id)
+                except Exception:
+                    pass
+                self._on_job_started(prompt_id)
+            except Exception as e:
+                logging.debug(f"QueueHookManager get_wrapper failed: {e}")
+        return result
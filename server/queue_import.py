@@ -0,0 +1,365 @@
+import re
+import json
+import time
+import uuid
+import zlib
+import codecs
+import tarfile
+import asyncio
+import logging
+from typing import Optional, Any, Awaitable, Callable, Dict, List, Tuple
+
+from .queue_export import MANIFEST_MEMBER, QUEUE_MEMBER_PREFIX
+
+_WS = re.compile(r"[ \t\n\r]*")
+# Drop consumed text from the parse buffer once this much has accumulated
+_COMPACT_AT = 1 << 16
+
+
+class ImportItemParser:
+    """Incremental parser for queue export documents: {"version": ..., "items": [ {...}, ... ]}.
+
+    Bytes are fed in arbitrary chunks and every complete element of the top-level "items"
+    array is returned as soon as it has arrived, so an upload is never held in memory as one
+    decoded document. Individual values are decoded by json's C raw_decode; an incomplete
+    value is retried only after the buffer has grown by as much as is already pending, which
+    keeps re-parsing linear in the input size.
+    """
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")("replace")
+        self._buf = ""
+        self._pos = 0
+        self._state = "start"
+        self._key: Optional[str] = None
+        self._keep = False
+        self._retry_at = 0
+        self.saw_items = False
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        self._buf += self._utf8.decode(chunk)
+        return self._drain(final=False)
+
+    def close(self) -> List[Any]:
+        """Flush the remaining input; raises ValueError when the document is incomplete."""
+        self._buf += self._utf8.decode(b"", final=True)
+        items = self._drain(final=True)
+        if self._state != "done":
+            raise ValueError("Invalid JSON")
+        return items
+
+    def _decode(self, final: bool) -> Tuple[bool, Any]:
+        if not final and len(self._buf) < self._retry_at:
+            return False, None
+        try:
+            value, end = self._decoder.raw_decode(self._buf, self._pos)
+        except json.JSONDecodeError:
+            if final:
+                raise ValueError("Invalid JSON")
+            self._retry_at = len(self._buf) + max(4096, len(self._buf) - self._pos)
+            return False, None
+        if end >= len(self._buf) and not final:
+            # A number at the end of the buffer may continue in the next chunk
+            self._retry_at = len(self._buf) + 1
+            return False, None
+        self._retry_at = 0
+        self._pos = end
+        return True, value
+
+    def _drain(self, final: bool) -> List[Any]:
+        out: List[Any] = []
+        while True:
+            self._pos = _WS.match(self._buf, self._pos).end()
+            if self._pos >= len(self._buf):
+                break
+            ch = self._buf[self._pos]
+            state = self._state
+            if state == "start":
+                if ch != "{":
+                    raise ValueError("Invalid JSON")
+                self._pos += 1
+                self._state = "key"
+            elif state == "key":
+                if ch == "}":
+                    self._pos += 1
+                    self._state = "done"
+                elif ch == ",":
+                    self._pos += 1
+                else:
+                    ok, key = self._decode(final)
+                    if not ok:
+                        break
+                    self._key = key if isinstance(key, str) else None
+                    self._state = "colon"
+            elif state == "colon":
+                if ch != ":":
+                    raise ValueError("Invalid JSON")
+                self._pos += 1
+                self._state = "value"
+            elif state == "value":
+                if ch == "[":
+                    # Arrays are walked element by element so a large "history" section is
+                    # dropped as it streams past; only "items" elements are returned
+                    self._pos += 1
+                    self._state = "items"
+                    self._keep = self._key == "items"
+                    self.saw_items = self.saw_items or self._keep
+                else:
+                    # Other top-level fields (version, exported_at, ...) are skipped
+                    ok, _ = self._decode(final)
+                    if not ok:
+                        break
+                    self._state = "key"
+            elif state == "items":
+                if ch == "]":
+                    self._pos += 1
+                    self._state = "key"
+                elif ch == ",":
+                    self._pos += 1
+                else:
+                    ok, value = self._decode(final)
+                    if not ok:
+                        break
+                    if self._keep:
+                        out.append(value)
+            else:
+                raise ValueError("Unexpected data after JSON document")
+            if self._pos >= _COMPACT_AT:
+                self._buf = self._buf[self._pos:]
+                self._retry_at = max(0, self._retry_at - self._pos)
+                self._pos = 0
+        return out
+
+
+class ImportStreamDecoder:
+    """Incremental decoder for every export layout; same feed()/close()/saw_items API as ImportItemParser.
+
+    The layout is sniffed from the first bytes: gzip (around any of the others), tar (queue
+    items are read from queue/*.json members, thumbnails are skipped without buffering),
+    NDJSON (first line is a {"type": "header"} record) or the JSON document. Only queue
+    items are returned; history records are archival and are not imported.
+    """
+
+    def __init__(self):
+        self._inflate = None
+        self._gzip_checked = False
+        self._pending = b""
+        self._mode: Optional[str] = None
+        self._json = ImportItemParser()
+        self._buf = b""
+        # tar: bytes left in the current member, its padding, and whether it is kept
+        self._member_left = 0
+        self._member_pad = 0
+        self._member_name: Optional[str] = None
+        self._member_data: List[bytes] = []
+        self._tar_done = False
+        self._saw_items = False
+
+    @property
+    def saw_items(self) -> bool:
+        return self._json.saw_items if self._mode == "json" else self._saw_items
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        return self._push(chunk, final=False)
+
+    def close(self) -> List[Any]:
+        """Flush the remaining input; raises ValueError when the upload is incomplete or invalid."""
+        items = self._push(b"", final=True)
+        if self._mode == "json":
+            items += self._json.close()
+        elif self._mode == "ndjson":
+            items += self._lines(final=True)
+        elif self._mode == "tar" and not self._tar_done and (self._member_left or self._buf):
+            raise ValueError("Truncated archive")
+        return items
+
+    def _push(self, chunk: bytes, final: bool) -> List[Any]:
+        if not self._gzip_checked:
+            self._pending += chunk
+            if len(self._pending) < 2 and not final:
+                return []
+            self._gzip_checked = True
+            chunk, self._pending = self._pending, b""
+            if chunk[:2] == b"\x1f\x8b":
+                self._inflate = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if self._inflate is not None:
+            try:
+                chunk = self._inflate.decompress(chunk) + (self._inflate.flush() if final else b"")
+            except zlib.error as e:
+                raise ValueError(f"Invalid gzip data: {e}")
+            if final and not self._inflate.eof:
+                raise ValueError("Truncated gzip data")
+        if self._mode is None:
+            self._pending += chunk
+            self._mode = self._sniff(self._pending, final)
+            if self._mode is None:
+                return []
+            chunk, self._pending = self._pending, b""
+        if self._mode == "json":
+            return self._json.feed(chunk)
+        self._buf += chunk
+        return self._lines(final=False) if self._mode == "ndjson" else self._tar_members()
+
+    @staticmethod
+    def _sniff(head: bytes, final: bool) -> Optional[str]:
+        if len(head) >= 262 and head[257:262] == b"ustar":
+            return "tar"
+        text = head.lstrip(b" \t\r\n\xef\xbb\xbf")
+        if text[:1] == b"{":
+            line, newline, _ = text.partition(b"\n")
+            if not newline and not final and len(head) < _COMPACT_AT:
+                return None
+            try:
+                first = json.loads(line.decode("utf-8"))
+            except Exception:
+                first = None
+            return "ndjson" if isinstance(first, dict) and first.get("type") == "header" else "json"
+        return "json" if final or len(head) >= 262 else None
+
+    def _lines(self, final: bool) -> List[Any]:
+        out: List[Any] = []
+        lines = self._buf.split(b"\n")
+        self._buf = b"" if final else lines.pop()
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line.decode("utf-8"))
+            except Exception:
+                raise ValueError("Invalid JSON line")
+            kind = record.pop("type", None) if isinstance(record, dict) else None
+            if kind == "header":
+                self._saw_items = True
+            elif kind == "item":
+                out.append(record)
+        return out
+
+    def _tar_members(self) -> List[Any]:
+        out: List[Any] = []
+        while not self._tar_done:
+            if self._member_left or self._member_pad:
+                take = min(len(self._buf), self._member_left)
+                if take and self._member_name is not None:
+                    self._member_data.append(self._buf[:take])
+                self._member_left -= take
+                skip = min(len(self._buf) - take, self._member_pad) if not self._member_left else 0
+                self._member_pad -= skip
+                self._buf = self._buf[take + skip:]
+                if self._member_left or self._member_pad:
+                    break
+                if self._member_name is not None:
+                    data = b"".join(self._member_data)
+                    self._member_data = []
+                    if self._member_name == MANIFEST_MEMBER:
+                        self._saw_items = True
+                    else:
+                        try:
+                            out.append(json.loads(data.decode("utf-8")))
+                        except Exception:
+                            raise ValueError(f"Invalid JSON in {self._member_name}")
+                    self._member_name = None
+                continue
+            if len(self._buf) < 512:
+                break
+            block, self._buf = self._buf[:512], self._buf[512:]
+            if block == b"\0" * 512:
+                self._tar_done = True
+                break
+            try:
+                info = tarfile.TarInfo.frombuf(block, "utf-8", "surrogateescape")
+            except tarfile.TarError as e:
+                raise ValueError(f"Invalid archive: {e}")
+            size = info.size if info.isreg() else 0
+            keep = info.isreg() and (
+                info.name == MANIFEST_MEMBER or (info.name.startswith(QUEUE_MEMBER_PREFIX) and info.name.endswith(".json"))
+            )
+            self._member_name = info.name if keep else None
+            self._member_left = size
+            self._member_pad = (-size) % 512
+            if keep and not size:
+                self._member_left = 0
+                self._member_pad = 0
+                if info.name == MANIFEST_MEMBER:
+                    self._saw_items = True
+                self._member_name = None
+        return out
+
+
+class ImportProgress:
+    """Counters for one running (or finished) import, served by the progress endpoint."""
+
+    def __init__(self, import_id: Optional[str] = None, total_bytes: Optional[int] = None):
+        self.id = import_id or uuid.uuid4().hex
+        self.state = "receiving"
+        self.total_bytes = total_bytes
+        self.received_bytes = 0
+        self.parsed = 0
+        self.duplicates = 0
+        self.skipped = 0
+        self.validated = 0
+        self.invalid = 0
+        self.imported = 0
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    def finish(self, error: Optional[str] = None) -> None:
+        self.state = "failed" if error else "done"
+        self.error = error
+        self.finished_at = time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        return {
+            "id": self.id,
+            "state": self.state,
+            "total_bytes": self.total_bytes,
+            "received_bytes": self.received_bytes,
+            "parsed": self.parsed,
+            "duplicates": self.duplicates,
+            "skipped": self.skipped,
+            "validated": self.validated,
+            "invalid": self.invalid,
+            "imported": self.imported,
+            "error": self.error,
+            "elapsed_seconds": round(end - self.started_at, 3),
+        }
+
+
+def executable_prompt(workflow: Any) -> Any:
+    """Strip rename metadata (name / workflow.name) so only executable nodes remain."""
+    try:
+        prompt = workflow
+        if isinstance(prompt, dict):
+            prompt = dict(prompt)
+            prompt.pop('name', None)
+            if 'workflow' in prompt and isinstance(prompt['workflow'], dict):
+                inner = dict(prompt['workflow'])
+                inner.pop('name', None)
+                prompt = inner
+        return prompt
+    except Exception:
+        return workflow
+
+
+def error_message(err: Any) -> str:
+    return (err or {}).get('message') if isinstance(err, dict) else str(err)
+
+
+class BoundedValidator:
+    """Runs validate_prompt for many prompts concurrently, at most `concurrency` at a time."""
+
+    def __init__(self, validate_fn: Callable[..., Awaitable[Any]], concurrency: int = 4):
+        self._validate_fn = validate_fn
+        self._sem = asyncio.Semaphore(max(1, int(concurrency)))
+
+    async def validate(self, prompt_id: str, prompt: Any) -> Tuple[bool, Any, Any]:
+        """Returns (valid, error, outputs_to_execute); exceptions count as invalid."""
+        async with self._sem:
+            try:
+                valid, err, outputs_to_execute, _node_errors = await self._validate_fn(prompt_id, prompt, None)
+                return bool(valid), err, outputs_to_execute
+            except Exception as e:
+                logging.debug(f"PersistentQueue: validating {prompt_id} raised: {e}")
+                return False, str(e), None
@@ -0,0 +1,88 @@
+from typing import Optional, Any, Dict, List
+
+
+class QueueIndex:
+    """prompt_id -> position index over PromptQueue.queue (a heapq list ordered by item number).
+
+    Lets one item's number change in O(log n): the item is located through the index, its
+    number replaced, and it is sifted up or down with every item it passes re-indexed.
+    ComfyUI's own put/get/delete modify the heap without telling us, so positions are
+    validated on use (heap[pos][1] == prompt_id) and a stale lookup re-indexes the heap with
+    one scan, at most once per operation (see begin()). Callers hold q.mutex throughout.
+    """
+
+    def __init__(self):
+        self._pos: Dict[str, int] = {}
+        self._synced = False
+        self._counters = {"moves": 0, "reindexes": 0}
+
+    def begin(self) -> None:
+        """Start an operation: the heap may have changed since the last one."""
+        self._synced = False
+
+    def _reindex(self, heap: List[Any]) -> None:
+        self._pos = {str(item[1]): i for i, item in enumerate(heap)}
+        self._synced = True
+        self._counters["reindexes"] += 1
+
+    def locate(self, heap: List[Any], prompt_id: str) -> Optional[int]:
+        pid = str(prompt_id)
+        i = self._pos.get(pid)
+        if i is not None and i < len(heap) and str(heap[i][1]) == pid:
+            return i
+        if self._synced:
+            return None
+        self._reindex(heap)
+        return self._pos.get(pid)
+
+    def number(self, heap: List[Any], prompt_id: str) -> Optional[Any]:
+        i = self.locate(heap, prompt_id)
+        return heap[i][0] if i is not None else None
+
+    def move(self, heap: List[Any], prompt_id: str, number: Any) -> bool:
+        """Give one queued item a new number and restore the heap invariant around it."""
+        i = self.locate(heap, prompt_id)
+        if i is None:
+            return False
+        old = heap[i]
+        heap[i] = (number,) + tuple(old[1:])
+        self._sift_up(heap, self._sift_down(heap, i))
+        self._counters["moves"] += 1
+        return True
+
+    def _place(self, heap: List[Any], i: int, item: Any) -> None:
+        heap[i] = item
+        self._pos[str(item[1])] = i
+
+    def _sift_down(self, heap: List[Any], i: int) -> int:
+        """Move heap[i] towards the root while it is smaller than its parent; returns its position."""
+        item = heap[i]
+        while i > 0:
+            parent = (i - 1) >> 1
+            if not item < heap[parent]:
+                break
+            self._place(heap, i, heap[parent])
+            i = parent
+        self._place(heap, i, item)
+        return i
+
+    def _sift_up(self, heap: List[Any], i: int) -> int:
+        """Move heap[i] towards the leaves while a child is smaller; returns its position."""
+        item = heap[i]
+        end = len(heap)
+        while True:
+            child = 2 * i + 1
+            if child >= end:
+                break
+            right = child + 1
+            if right < end and heap[right] < heap[child]:
+                child = right
+            if not heap[child] < item:
+                break
+            self._place(heap, i, heap[child])
+            i = child
+        self._place(heap, i, item)
+        return i
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._counters, "indexed": len(self._pos)}
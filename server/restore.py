@@ -0,0 +1,342 @@
+import json
+import time
+import heapq
+import asyncio
+import hashlib
+import logging
+import threading
+import concurrent.futures
+from typing import Optional, Any, Awaitable, Callable, Dict, List, Tuple
+
+from .queue_import import BoundedValidator, executable_prompt, error_message
+
+# extra_data key marking a queue entry whose prompt still lives only in SQLite
+LAZY_MARKER = "pqueue_lazy"
+_NOT_PENDING = "job is no longer pending"
+
+
+def restored_number(server_instance: Any, rank: Any) -> Tuple[Any, bool]:
+    """Queue number for a restored job and whether it was newly assigned.
+
+    A saved rank is reused as is (integral values as ints, like ComfyUI's own numbers) and
+    server.number is kept above it, so prompts queued later still go to the end. Jobs saved
+    before ranks existed take the next number; callers persist those.
+    """
+    if rank is not None:
+        try:
+            value = float(rank)
+            number = int(value) if value.is_integer() else value
+            if server_instance.number <= number:
+                server_instance.number = int(value // 1) + 1
+            return number, False
+        except (TypeError, ValueError, OverflowError):
+            pass
+    number = server_instance.number
+    server_instance.number += 1
+    return number, True
+
+
+class RestoreProgress:
+    """Counters for the startup restore, served by the restore progress endpoint."""
+
+    def __init__(self):
+        self.state = "idle"
+        self.total = 0
+        self.loaded = 0
+        self.validated = 0
+        self.cache_hits = 0
+        self.restored = 0
+        self.failed = 0
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        return {
+            "state": self.state,
+            "total": self.total,
+            "loaded": self.loaded,
+            "validated": self.validated,
+            "cache_hits": self.cache_hits,
+            "restored": self.restored,
+            "failed": self.failed,
+            "error": self.error,
+            "elapsed_seconds": round(end - self.started_at, 3) if self.started_at else 0.0,
+        }
+
+
+class PendingJobRestorer:
+    """Restores pending queue_items rows into the in-memory PromptQueue after a restart.
+
+    Rows are streamed from SQLite and decoded on the I/O pool in batches, validated on the
+    event loop with bounded concurrency (identical stored workflows are validated once), and
+    admitted to the heap under a single q.mutex acquisition with one queue_updated().
+    Failures are recorded in one transaction.
+    """
+
+    def __init__(
+        self,
+        db: Any,
+        io: Any,
+        validate_fn: Callable[..., Awaitable[Any]],
+        *,
+        concurrency: int = 4,
+        batch_size: int = 200,
+    ):
+        self.db = db
+        self.io = io
+        self.batch_size = max(1, int(batch_size))
+        self.progress = RestoreProgress()
+        self._validator = BoundedValidator(validate_fn, concurrency)
+        self._cache: Dict[str, "asyncio.Future[Tuple[bool, Any, Any]]"] = {}
+
+    def _produce(self, loop: asyncio.AbstractEventLoop, out: "asyncio.Queue[Optional[List[Tuple[Dict[str, Any], Any]]]]") -> None:
+        """I/O pool side: stream pending rows, decode prompts and hand batches to the loop."""
+        def _put(item: Any) -> None:
+            # Blocks this pool thread while the loop-side queue is full (back-pressure)
+            asyncio.run_coroutine_threadsafe(out.put(item), loop).result()
+
+        try:
+            for rows in self.db.iter_pending_jobs(self.batch_size):
+                batch: List[Tuple[Dict[str, Any], Any]] = []
+                for row in rows:
+                    try:
+                        wf = row.get('workflow')
+                        prompt = executable_prompt(json.loads(wf) if isinstance(wf, str) else wf)
+                    except Exception as e:
+                        prompt = e
+                    batch.append((row, prompt))
+                _put(batch)
+        finally:
+            _put(None)
+
+    async def _validate_cached(self, key: str, prompt_id: str, prompt: Any) -> Tuple[bool, Any, Any]:
+        fut = self._cache.get(key)
+        if fut is None:
+            fut = self._cache[key] = asyncio.ensure_future(self._validator.validate(prompt_id, prompt))
+        else:
+            self.progress.cache_hits += 1
+        valid, err, outputs_to_execute = await fut
+        self.progress.validated += 1
+        return valid, err, list(outputs_to_execute) if isinstance(outputs_to_execute, (list, set, tuple)) else outputs_to_execute
+
+    async def run(self, server_instance: Any, lazy: Optional["LazyPromptLoader"] = None) -> RestoreProgress:
+        """Restore all pending jobs; with a LazyPromptLoader only placeholders are admitted."""
+        progress = self.progress
+        progress.state = "loading"
+        progress.started_at = time.time()
+        q = server_instance.prompt_queue
+        if lazy is not None:
+            return await self._run_lazy(server_instance, lazy)
+        try:
+            progress.total = int(await self.io.db_call('count_pending_jobs'))
+            loop = asyncio.get_running_loop()
+            batches: "asyncio.Queue[Optional[List[Tuple[Dict[str, Any], Any]]]]" = asyncio.Queue(maxsize=4)
+            producer = asyncio.ensure_future(self.io.run(self._produce, loop, batches, name='restore.stream'))
+
+            failures: Dict[str, str] = {}
+            assigned: Dict[str, Any] = {}
+            entries: List[Tuple[Any, str, Any, "asyncio.Future[Tuple[bool, Any, Any]]"]] = []
+            while True:
+                batch = await batches.get()
+                if batch is None:
+                    break
+                for row, prompt in batch:
+                    progress.loaded += 1
+                    prompt_id = str(row['prompt_id'])
+                    if isinstance(prompt, Exception):
+                        failures[prompt_id] = str(prompt)
+                        continue
+                    # Saved ranks come first (in order), then unranked rows in priority/age order
+                    number, fresh = restored_number(server_instance, row.get('rank'))
+                    if fresh:
+                        assigned[prompt_id] = number
+                    key = row.get('workflow_hash') or hashlib.sha256(json.dumps(prompt, sort_keys=True).encode('utf-8')).hexdigest()
+                    entries.append((number, prompt_id, prompt, asyncio.ensure_future(self._validate_cached(key, prompt_id, prompt))))
+            await producer
+
+            progress.state = "validating"
+            results = await asyncio.gather(*(fut for *_, fut in entries))
+
+            restored: List[str] = []
+            with q.mutex:
+                present = {str(it[1]) for it in q.queue}
+                for (number, prompt_id, prompt, _), (valid, err, outputs_to_execute) in zip(entries, results):
+                    if not valid:
+                        failures[prompt_id] = error_message(err)
+                        continue
+                    if prompt_id in present:
+                        continue
+                    q.queue.append((number, prompt_id, prompt, {}, outputs_to_execute))
+                    restored.append(prompt_id)
+                if restored:
+                    heapq.heapify(q.queue)
+                    q.server.queue_updated()
+                    try:
+                        q.not_empty.notify_all()
+                    except Exception:
+                        pass
+            progress.restored = len(restored)
+            progress.failed = len(failures)
+            if assigned:
+                await self.io.db_call('update_job_ranks', assigned)
+
+            if failures:
+                progress.state = "saving"
+                await self.io.db_call('mark_jobs_failed', failures)
+                logging.warning(f"PersistentQueue: {len(failures)} jobs failed to restore: {list(failures.items())[:20]}")
+            if restored:
+                logging.info(f"PersistentQueue: Restored {len(restored)} jobs to queue ({progress.cache_hits} validations reused)")
+            if progress.loaded == 0:
+                logging.info("PersistentQueue: No pending jobs to restore on startup")
+            progress.state = "done"
+        except Exception as e:
+            progress.state = "failed"
+            progress.error = str(e)
+            logging.error(f"PersistentQueue: Restoring pending jobs failed: {e}")
+        finally:
+            progress.finished_at = time.time()
+            self._cache.clear()
+        return progress
+
+    async def _run_lazy(self, server_instance: Any, lazy: "LazyPromptLoader") -> RestoreProgress:
+        progress = self.progress
+        q = server_instance.prompt_queue
+        try:
+            # Only ids and ranks are read; workflows are neither decoded nor validated until a job is due
+            ranks: List[Tuple[str, Any]] = await self.io.db_call('get_pending_ranks')
+            progress.total = progress.loaded = len(ranks)
+            restored = 0
+            assigned: Dict[str, Any] = {}
+            with q.mutex:
+                present = {str(it[1]) for it in q.queue}
+                for pid, rank in ranks:
+                    if pid in present:
+                        continue
+                    number, fresh = restored_number(server_instance, rank)
+                    if fresh:
+                        assigned[pid] = number
+                    q.queue.append(lazy.placeholder(number, pid))
+                    restored += 1
+                if restored:
+                    heapq.heapify(q.queue)
+                    q.server.queue_updated()
+                    try:
+                        q.not_empty.notify_all()
+                    except Exception:
+                        pass
+            progress.restored = restored
+            if assigned:
+                await self.io.db_call('update_job_ranks', assigned)
+            if restored:
+                logging.info(f"PersistentQueue: Admitted {restored} pending jobs lazily; prompts load when they are about to run")
+                lazy.prefetch(q)
+            else:
+                logging.info("PersistentQueue: No pending jobs to restore on startup")
+            progress.state = "done"
+        except Exception as e:
+            progress.state = "failed"
+            progress.error = str(e)
+            logging.error(f"PersistentQueue: Restoring pending jobs failed: {e}")
+        finally:
+            progress.finished_at = time.time()
+        return progress
+
+
+class LazyPromptLoader:
+    """Loads and validates lazily restored queue entries just before they run.
+
+    Placeholders are ordinary queue tuples (number, prompt_id, {}, {LAZY_MARKER: True}, [])
+    so heap ordering, reordering and deletion work unchanged. The executor thread calls
+    materialize() right after popping one; the next `readahead` placeholders are loaded and
+    validated in the background so the handoff normally does not wait.
+    """
+
+    def __init__(
+        self,
+        db: Any,
+        io: Any,
+        loop: asyncio.AbstractEventLoop,
+        validate_fn: Callable[..., Awaitable[Any]],
+        *,
+        readahead: int = 2,
+        timeout: float = 120.0,
+    ):
+        self.db = db
+        self.io = io
+        self.loop = loop
+        self.readahead = max(0, int(readahead))
+        self.timeout = float(timeout)
+        self._validate_fn = validate_fn
+        self._lock = threading.Lock()
+        self._pending: Dict[str, "concurrent.futures.Future[Tuple[bool, Any, Any, Any]]"] = {}
+
+    @staticmethod
+    def placeholder(number: Any, prompt_id: str) -> Tuple:
+        return (number, prompt_id, {}, {LAZY_MARKER: True}, [])
+
+    @staticmethod
+    def is_placeholder(item: Any) -> bool:
+        try:
+            return isinstance(item[3], dict) and bool(item[3].get(LAZY_MARKER))
+        except Exception:
+            return False
+
+    async def _load(self, prompt_id: str) -> Tuple[bool, Any, Any, Any]:
+        """Returns (valid, error, prompt, outputs_to_execute)."""
+        job = await self.io.db_call('get_job', prompt_id)
+        if not job or job.get('status') != 'pending':
+            return False, _NOT_PENDING, None, None
+        wf = job.get('workflow')
+        prompt = executable_prompt(json.loads(wf) if isinstance(wf, str) else wf)
+        valid, err, outputs_to_execute, _node_errors = await self._validate_fn(prompt_id, prompt, None)
+        return bool(valid), err, prompt, outputs_to_execute
+
+    def _schedule(self, prompt_id: str) -> "concurrent.futures.Future[Tuple[bool, Any, Any, Any]]":
+        with self._lock:
+            fut = self._pending.get(prompt_id)
+            if fut is None:
+                fut = self._pending[prompt_id] = asyncio.run_coroutine_threadsafe(self._load(prompt_id), self.loop)
+            return fut
+
+    def prefetch(self, q: Any) -> None:
+        """Start loading the next `readahead` placeholders in the queue (any thread)."""
+        if self.readahead <= 0:
+            return
+        try:
+            with q.mutex:
+                # The k smallest heap entries always sit within the first 2**k - 1 slots
+                head = heapq.nsmallest(self.readahead, q.queue[: (1 << self.readahead) - 1])
+            for item in head:
+                if self.is_placeholder(item):
+                    self._schedule(str(item[1]))
+            keep = {str(item[1]) for item in head}
+            with self._lock:
+                # Forget finished read-ahead for entries that were deleted or moved back meanwhile
+                if len(self._pending) > 2 * self.readahead:
+                    for pid in [p for p, f in self._pending.items() if f.done() and p not in keep]:
+                        self._pending.pop(pid, None)
+        except Exception as e:
+            logging.debug(f"PersistentQueue: lazy read-ahead failed: {e}")
+
+    def materialize(self, item: Tuple) -> Optional[Tuple]:
+        """Executor thread: turn a popped placeholder into a full queue item, or None if it cannot run."""
+        prompt_id = str(item[1])
+        fut = self._schedule(prompt_id)
+        try:
+            valid, err, prompt, outputs_to_execute = fut.result(timeout=self.timeout)
+        except Exception as e:
+            valid, err, prompt, outputs_to_execute = False, str(e), None, None
+        finally:
+            with self._lock:
+                self._pending.pop(prompt_id, None)
+        if not valid:
+            logging.warning(f"PersistentQueue: Lazily restored job {prompt_id} cannot run: {error_message(err)}")
+            try:
+                if err != _NOT_PENDING:
+                    self.db.update_job_status(prompt_id, 'failed', error=error_message(err))
+            except Exception as e:
+                logging.debug(f"PersistentQueue: marking {prompt_id} failed: {e}")
+            return None
+        return (item[0], item[1], prompt, {}, outputs_to_execute)
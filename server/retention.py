@@ -0,0 +1,301 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Optional, Any, Callable, Dict, List
+
+# Thumbnail files younger than this are never treated as orphans (their row may not be committed yet)
+_ORPHAN_FILE_GRACE = 3600.0
+# Convert a database to auto_vacuum=INCREMENTAL with one VACUUM once this share of it is free
+_CONVERT_FREE_RATIO = 0.25
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return float(default)
+
+
+class RetentionPolicy:
+    """Limits applied to history and finished queue rows. 0 disables a limit.
+
+    max_age_days / failed_max_age_days: age limits for successful and for failed or
+    interrupted history rows (failed rows default to the same age). max_rows / max_bytes:
+    total history size; successful rows are pruned first so failed jobs are kept longer.
+    queue_max_age_days: finished queue_items rows whose history row has been written.
+    compact: allow one full VACUUM to convert a database created without incremental
+    auto-vacuum (exclusive lock for its duration, so off unless PQUEUE_RETENTION_COMPACT is set).
+    """
+
+    def __init__(
+        self,
+        *,
+        max_age_days: float = 0,
+        failed_max_age_days: Optional[float] = None,
+        max_rows: int = 0,
+        max_bytes: int = 0,
+        queue_max_age_days: float = 0,
+        interval_seconds: float = 3600,
+        batch_size: int = 200,
+        compact: bool = False,
+    ):
+        self.max_age_days = max(0.0, float(max_age_days))
+        self.failed_max_age_days = self.max_age_days if failed_max_age_days is None else max(0.0, float(failed_max_age_days))
+        self.max_rows = max(0, int(max_rows))
+        self.max_bytes = max(0, int(max_bytes))
+        self.queue_max_age_days = max(0.0, float(queue_max_age_days))
+        self.interval_seconds = max(60.0, float(interval_seconds))
+        self.batch_size = max(1, int(batch_size))
+        self.compact = bool(compact)
+
+    @classmethod
+    def from_env(cls) -> "RetentionPolicy":
+        failed = os.environ.get("PQUEUE_RETENTION_FAILED_DAYS")
+        return cls(
+            max_age_days=_env_float("PQUEUE_RETENTION_DAYS", 0),
+            failed_max_age_days=_env_float("PQUEUE_RETENTION_FAILED_DAYS", 0) if failed else None,
+            max_rows=int(_env_float("PQUEUE_RETENTION_MAX_ROWS", 0)),
+            max_bytes=int(_env_float("PQUEUE_RETENTION_MAX_MB", 0) * 1024 * 1024),
+            queue_max_age_days=_env_float("PQUEUE_RETENTION_QUEUE_DAYS", 0),
+            interval_seconds=_env_float("PQUEUE_RETENTION_INTERVAL", 3600),
+            compact=os.environ.get("PQUEUE_RETENTION_COMPACT", "").strip().lower() in ("1", "true", "yes", "on"),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "max_age_days": self.max_age_days,
+            "failed_max_age_days": self.failed_max_age_days,
+            "max_rows": self.max_rows,
+            "max_bytes": self.max_bytes,
+            "queue_max_age_days": self.queue_max_age_days,
+            "interval_seconds": self.interval_seconds,
+            "compact": self.compact,
+        }
+
+
+class RetentionEngine:
+    """Background pruning of job_history, finished queue_items and everything hanging off them.
+
+    Each pass deletes in batches of `batch_size` rows, one short transaction per batch with a
+    pause in between, so the write lock is never held for long. It then removes orphaned
+    thumbnail rows/files, search entries and workflow blobs, and, when it deleted anything,
+    returns freed pages to the OS with PRAGMA incremental_vacuum. Counters are cumulative;
+    see stats().
+    """
+
+    def __init__(self, db: Any, policy: Optional[RetentionPolicy] = None, *, pause: float = 0.05, vacuum_pages: int = 2000):
+        self.db = db
+        self.policy = policy or RetentionPolicy.from_env()
+        self._pause = float(pause)
+        self._vacuum_pages = int(vacuum_pages)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._run_lock = threading.Lock()
+        self._totals: Dict[str, int] = {
+            "passes": 0,
+            "history_rows": 0,
+            "queue_rows": 0,
+            "thumb_rows": 0,
+            "thumb_files": 0,
+            "search_rows": 0,
+            "workflow_blobs": 0,
+            "file_bytes_reclaimed": 0,
+            "db_bytes_reclaimed": 0,
+        }
+        self._last: Dict[str, Any] = {}
+
+    def start(self, initial_delay: float = 60.0) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, args=(initial_delay,), name="pqueue-retention", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _loop(self, initial_delay: float) -> None:
+        if self._stop.wait(max(0.0, initial_delay)):
+            return
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.policy.interval_seconds)
+
+    def _prune_batches(self, select: Callable[[int], List[int]], budget: Optional[Callable[[], int]] = None) -> Dict[str, int]:
+        """Delete history ids returned by select(batch) until it is empty (or budget() reaches 0)."""
+        done = {"history": 0, "thumbs": 0, "files": 0, "file_bytes": 0}
+        while not self._stop.is_set():
+            limit = self.policy.batch_size
+            if budget is not None:
+                limit = min(limit, budget())
+                if limit <= 0:
+                    break
+            ids = select(limit)
+            if not ids:
+                break
+            report = self.db.delete_history_rows(ids)
+            for k in done:
+                done[k] += int(report.get(k, 0))
+            if not report.get("history"):
+                break
+            time.sleep(self._pause)
+        return done
+
+    def _bytes_budget(self) -> Callable[[], int]:
+        """Budget for the byte limit: rows to delete next, estimated from the average row cost.
+
+        Stops as soon as a batch did not reduce usage, so space held by other tables can never
+        make it delete the whole history.
+        """
+        last: List[int] = []
+
+        def _budget() -> int:
+            if last:
+                # Deleted rows only show up as smaller usage once index segments merge and pages are freed
+                self.db.optimize_search_index()
+                self._reclaim_space()
+            usage = self.db.get_retention_usage()
+            excess = usage["total_bytes"] - self.policy.max_bytes
+            if excess <= 0 or usage["history_rows"] <= 0 or (last and usage["total_bytes"] >= last[-1]):
+                return 0
+            last.append(usage["total_bytes"])
+            per_row = max(1, usage["total_bytes"] // usage["history_rows"])
+            return max(1, min(self.policy.batch_size, excess // per_row))
+
+        return _budget
+
+    def run_once(self) -> Dict[str, Any]:
+        """Run one retention pass now; returns what it removed."""
+        with self._run_lock:
+            started = time.time()
+            policy = self.policy
+            result: Dict[str, Any] = {"history": 0, "thumbs": 0, "files": 0, "file_bytes": 0, "queue": 0,
+                                      "orphan_thumbs": 0, "orphan_search": 0, "orphan_blobs": 0, "orphan_files": 0,
+                                      "db_bytes": 0, "error": None}
+
+            def _add(report: Dict[str, int]) -> None:
+                for k in ("history", "thumbs", "files", "file_bytes"):
+                    result[k] += int(report.get(k, 0))
+
+            def _deleted() -> int:
+                return sum(result[k] for k in ("history", "queue", "thumbs", "orphan_thumbs", "orphan_search", "orphan_blobs"))
+
+            try:
+                before = self.db.get_retention_usage()
+                file_bytes = before["db_bytes"] + before["free_bytes"]
+                now = datetime.now()
+                if policy.max_age_days:
+                    cutoff = now - timedelta(days=policy.max_age_days)
+                    _add(self._prune_batches(lambda n: self.db.select_history_older_than(cutoff, failed=False, limit=n)))
+                if policy.failed_max_age_days:
+                    cutoff = now - timedelta(days=policy.failed_max_age_days)
+                    _add(self._prune_batches(lambda n: self.db.select_history_older_than(cutoff, failed=True, limit=n)))
+                if policy.max_rows:
+                    _add(self._prune_batches(
+                        self.db.select_oldest_history,
+                        budget=lambda: self.db.get_retention_usage()["history_rows"] - policy.max_rows,
+                    ))
+                if policy.queue_max_age_days:
+                    cutoff = now - timedelta(days=policy.queue_max_age_days)
+                    while not self._stop.is_set():
+                        n = self.db.prune_finished_queue_items(cutoff, policy.batch_size)
+                        result["queue"] += n
+                        if n < policy.batch_size:
+                            break
+                        time.sleep(self._pause)
+
+                while not self._stop.is_set():
+                    orphans = self.db.prune_orphans(policy.batch_size)
+                    result["orphan_thumbs"] += orphans["thumbs"]
+                    result["orphan_search"] += orphans["fts"]
+                    result["orphan_blobs"] += orphans["blobs"]
+                    if max(orphans.values()) < policy.batch_size:
+                        break
+                    time.sleep(self._pause)
+                self._prune_orphan_files(result)
+                if result["history"] or result["orphan_search"]:
+                    self.db.optimize_search_index()
+
+                # Byte budget last: orphan cleanup and vacuuming may already bring usage under it
+                if _deleted():
+                    self._reclaim_space()
+                if policy.max_bytes:
+                    deleted = _deleted()
+                    _add(self._prune_batches(self.db.select_oldest_history, budget=self._bytes_budget()))
+                    if _deleted() > deleted:
+                        self._reclaim_space()
+                after = self.db.get_retention_usage()
+                result["db_bytes"] = max(0, file_bytes - after["db_bytes"] - after["free_bytes"])
+            except Exception as e:
+                result["error"] = str(e)
+                logging.warning(f"PersistentQueue: retention pass failed: {e}")
+
+            result["elapsed_seconds"] = round(time.time() - started, 3)
+            result["finished_at"] = time.time()
+            self._record(result)
+            if result["history"] or result["queue"] or result["files"] or result["orphan_files"]:
+                logging.info(
+                    f"PersistentQueue: Retention removed {result['history']} history rows, {result['queue']} queue rows, "
+                    f"{result['files'] + result['orphan_files']} thumbnail files; reclaimed "
+                    f"{result['file_bytes'] + result['db_bytes']} bytes"
+                )
+            return result
+
+    def _prune_orphan_files(self, result: Dict[str, Any]) -> None:
+        cutoff = time.time() - _ORPHAN_FILE_GRACE
+        store = self.db.thumb_files
+        batch: Dict[str, int] = {}
+
+        def _flush() -> None:
+            for key in self.db.find_orphan_thumb_files(list(batch)):
+                if store.delete(key):
+                    result["orphan_files"] += 1
+                    result["file_bytes"] += batch[key]
+            batch.clear()
+
+        for key, mtime, size in store.iter_files():
+            if self._stop.is_set():
+                break
+            if mtime < cutoff:
+                batch[key] = size
+                if len(batch) >= 500:
+                    _flush()
+        if batch:
+            _flush()
+
+    def _reclaim_space(self) -> int:
+        usage = self.db.get_retention_usage()
+        if usage["free_bytes"] <= 0:
+            return 0
+        if usage["auto_vacuum"] != 2:
+            # Pre-existing file without incremental auto-vacuum: convert it once, only when opted in
+            total = usage["db_bytes"] + usage["free_bytes"]
+            if self.policy.compact and total and usage["free_bytes"] / total >= _CONVERT_FREE_RATIO:
+                logging.info("PersistentQueue: Compacting database once to enable incremental vacuum")
+                return self.db.vacuum()
+            return 0
+        reclaimed = 0
+        while not self._stop.is_set():
+            n = self.db.incremental_vacuum(self._vacuum_pages)
+            reclaimed += n
+            if n <= 0:
+                break
+            time.sleep(self._pause)
+        return reclaimed
+
+    def _record(self, result: Dict[str, Any]) -> None:
+        t = self._totals
+        t["passes"] += 1
+        t["history_rows"] += result["history"]
+        t["queue_rows"] += result["queue"]
+        t["thumb_rows"] += result["thumbs"] + result["orphan_thumbs"]
+        t["thumb_files"] += result["files"] + result["orphan_files"]
+        t["search_rows"] += result["orphan_search"]
+        t["workflow_blobs"] += result["orphan_blobs"]
+        t["file_bytes_reclaimed"] += result["file_bytes"]
+        t["db_bytes_reclaimed"] += result["db_bytes"]
+        self._last = result
+
+    def stats(self) -> Dict[str, Any]:
+        return {"policy": self.policy.to_dict(), "totals": dict(self._totals), "last_pass": dict(self._last)}
@@ -1,6 +1,9 @@
-from typing import Any
+from typing import Any, TYPE_CHECKING
 from aiohttp import web
 
+if TYPE_CHECKING:
+    from .manager import PersistentQueueManager
+
 
 class RoutesHelper:
     """Registers HTTP routes for the persistent queue API."""
@@ -11,16 +14,28 @@ class RoutesHelper:
     def register(self, manager: "PersistentQueueManager") -> None:
         routes = [
             web.get('/api/pqueue', manager._api_get_pqueue),
+            web.get('/api/pqueue/changes', manager._api_get_changes),
+            web.get('/api/pqueue/metrics', manager._api_get_metrics),
+            web.get('/api/pqueue/eta', manager._api_get_eta),
             web.get('/api/pqueue/export', manager._api_export_queue),
             web.post('/api/pqueue/import', manager._api_import_queue),
+            web.get('/api/pqueue/import/progress', manager._api_import_progress),
+            web.get('/api/pqueue/restore/progress', manager._api_restore_progress),
+            web.get('/api/pqueue/migrations/progress', manager._api_migration_progress),
+            web.get('/api/pqueue/job/{prompt_id}', manager._api_get_job),
             web.get('/api/pqueue/history', manager._api_get_history),
+            web.get('/api/pqueue/history/{history_id:\\d+}', manager._api_get_history_item),
             web.get('/api/pqueue/history/thumb/{history_id:\\d+}', manager._api_get_history_thumb),
+            web.get('/api/pqueue/history/thumbs', manager._api_get_history_thumbs),
             web.get('/api/pqueue/preview', manager._api_preview_image),
+            web.get('/api/pqueue/preview/stats', manager._api_preview_stats),
             web.post('/api/pqueue/pause', manager._api_pause),
             web.post('/api/pqueue/resume', manager._api_resume),
             web.post('/api/pqueue/reorder', manager._api_reorder),
+            web.post('/api/pqueue/move', manager._api_move),
             web.patch('/api/pqueue/priority', manager._api_priority),
             web.post('/api/pqueue/delete', manager._api_delete),
+            web.post('/api/pqueue/batch', manager._api_batch),
             web.patch('/api/pqueue/rename', manager._api_rename),
             web.post('/api/pqueue/run-selected', manager._api_run_selected),
             web.post('/api/pqueue/skip-selected', manager._api_skip_selected),
@@ -0,0 +1,150 @@
+import os
+import re
+import json
+import struct
+import hashlib
+import logging
+import tempfile
+from typing import Optional, Any, Dict, Iterator, List, Tuple
+
+# Browsers may keep a thumbnail forever: a key names exactly one byte sequence
+CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+_EXTENSIONS = {"image/webp": ".webp", "image/png": ".png", "image/jpeg": ".jpg"}
+_KEY = re.compile(r"^[0-9a-f]{64}\.(webp|png|jpg|bin)$")
+
+
+class ThumbnailFileStore:
+    """Content-addressed directory for history thumbnail images.
+
+    Thumbnails live next to the database instead of inside it, one file per distinct image at
+    <root>/<first two hex digits>/<sha256>.<ext>; history_thumbs rows reference them by that
+    key (blob_key). Files are written once via rename and never modified, so they can be served
+    with sendfile and cached by browsers under a strong ETag derived from the key.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    @staticmethod
+    def key_for(data: bytes, mime: Optional[str]) -> str:
+        return hashlib.sha256(data).hexdigest() + _EXTENSIONS.get(str(mime or "").lower(), ".bin")
+
+    @staticmethod
+    def etag(key: str) -> str:
+        return '"' + key.split(".", 1)[0] + '"'
+
+    def path(self, key: Optional[str]) -> Optional[str]:
+        """Absolute file path for a key, or None for malformed keys."""
+        if not key or not _KEY.match(key):
+            return None
+        return os.path.join(self.root, key[:2], key)
+
+    def put(self, data: bytes, mime: Optional[str]) -> str:
+        """Write data unless an identical file already exists; returns its key."""
+        key = self.key_for(data, mime)
+        path = self.path(key)
+        if os.path.isfile(path):
+            return key
+        folder = os.path.dirname(path)
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=folder, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except Exception:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        return key
+
+    def read(self, key: Optional[str]) -> Optional[bytes]:
+        path = self.path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def delete(self, key: Optional[str]) -> bool:
+        """Remove a file; callers check that no row references the key any more."""
+        path = self.path(key)
+        if path is None:
+            return False
+        try:
+            os.unlink(path)
+            return True
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            logging.debug(f"PersistentQueue: removing thumbnail {key} failed: {e}")
+            return False
+
+    def pack(self, ids: List[int], thumbs: Dict[int, Dict[str, Any]]) -> Tuple[bytes, str]:
+        """Frame many thumbnails into one body for the batch endpoint; returns (body, etag).
+
+        Layout: 4-byte big-endian header length, a JSON header
+        {"items": [{"id", "offset", "length", "mime"}], "missing": [ids]}, then the images
+        back to back; offsets are relative to the end of the header.
+        """
+        items: List[Dict[str, Any]] = []
+        missing: List[int] = []
+        chunks: List[bytes] = []
+        tags: List[str] = []
+        offset = 0
+        for hid in ids:
+            t = thumbs.get(hid)
+            data = None
+            if t is not None:
+                data = t.get("data")
+                if data is None and t.get("path"):
+                    try:
+                        with open(t["path"], "rb") as f:
+                            data = f.read()
+                    except OSError:
+                        data = None
+            if data is None:
+                missing.append(hid)
+                continue
+            items.append({"id": hid, "offset": offset, "length": len(data), "mime": t.get("mime") or "image/webp"})
+            chunks.append(data)
+            tags.append(f"{hid}:{t.get('etag')}")
+            offset += len(data)
+        header = json.dumps({"items": items, "missing": missing}, separators=(",", ":")).encode("utf-8")
+        etag = '"' + hashlib.sha256("|".join(tags).encode("utf-8")).hexdigest() + '"'
+        return b"".join([struct.pack(">I", len(header)), header, *chunks]), etag
+
+    def iter_files(self) -> Iterator[Tuple[str, float, int]]:
+        """Yield (key, mtime, size) for every stored file."""
+        try:
+            for folder, _dirs, names in os.walk(self.root):
+                for name in names:
+                    if _KEY.match(name):
+                        try:
+                            st = os.stat(os.path.join(folder, name))
+                        except OSError:
+                            continue
+                        yield name, st.st_mtime, st.st_size
+        except Exception as e:
+            logging.debug(f"PersistentQueue: listing thumbnail files failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        files = 0
+        size = 0
+        try:
+            for folder, _dirs, names in os.walk(self.root):
+                for name in names:
+                    if _KEY.match(name):
+                        files += 1
+                        try:
+                            size += os.path.getsize(os.path.join(folder, name))
+                        except OSError:
+                            pass
+        except Exception:
+            pass
+        return {"root": self.root, "files": files, "bytes": size}
@@ -1,6 +1,11 @@
 import os
 import json
-from typing import Optional, Any, Dict, List
+import zlib
+import struct
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Any, Dict, List, Tuple
 
 from PIL import Image
 from PIL.PngImagePlugin import PngInfo
@@ -9,6 +14,45 @@ from io import BytesIO
 
 import folder_paths
 
+# Modes Image.reduce()/resize() handle directly; others (palette, 16-bit, ...) are converted first
+_REDUCIBLE_MODES = ("RGB", "RGBA", "RGBX", "L", "LA")
+# Decode/box-reduce down to at least this multiple of the target before the final LANCZOS pass
+_REDUCING_GAP = 2.0
+# Encoded thumbnails (without metadata) kept per source file
+_ENCODED_CACHE_LIMIT = 256
+
+
+def _png_chunk(ctype: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + ctype + data + struct.pack(">I", zlib.crc32(ctype + data) & 0xFFFFFFFF)
+
+
+def png_with_text(png: bytes, key: str, text: str) -> bytes:
+    """Insert a text chunk after IHDR, as PngInfo.add_text would (tEXt if Latin-1, else iTXt)."""
+    if png[:8] != b"\x89PNG\r\n\x1a\n" or png[12:16] != b"IHDR":
+        raise ValueError("not a PNG")
+    try:
+        chunk = _png_chunk(b"tEXt", key.encode("latin-1") + b"\0" + text.encode("latin-1"))
+    except UnicodeError:
+        chunk = _png_chunk(b"iTXt", key.encode("latin-1") + b"\0\0\0\0\0" + text.encode("utf-8"))
+    ihdr_end = 8 + 8 + 13 + 4
+    return png[:ihdr_end] + chunk + png[ihdr_end:]
+
+
+def webp_with_exif(webp: bytes, exif: bytes, size: Tuple[int, int]) -> bytes:
+    """Attach an EXIF chunk to an encoded WebP, converting it to the extended (VP8X) layout."""
+    if webp[:4] != b"RIFF" or webp[8:12] != b"WEBP":
+        raise ValueError("not a WebP")
+    if exif.startswith(b"Exif\x00\x00"):
+        exif = exif[6:]
+    body = webp[12:]
+    if body[:4] == b"VP8X":
+        body = body[:8] + bytes([body[8] | 0x08]) + body[9:]
+    else:
+        w, h = size
+        body = b"VP8X" + struct.pack("<I", 10) + bytes([0x08, 0, 0, 0]) + (w - 1).to_bytes(3, "little") + (h - 1).to_bytes(3, "little") + body
+    body += b"EXIF" + struct.pack("<I", len(exif)) + exif + (b"\0" if len(exif) % 2 else b"")
+    return b"RIFF" + struct.pack("<I", 4 + len(body)) + b"WEBP" + body
+
 
 class ThumbnailService:
     """Generates small, web-friendly thumbnails from ComfyUI output descriptors.
@@ -16,95 +60,147 @@ class ThumbnailService:
     Single responsibility: image IO and thumbnail encoding.
     """
 
-    def __init__(self, max_size: int = 128, quality: int = 60):
+    def __init__(self, max_size: int = 128, quality: int = 60, workers: Optional[int] = None):
         self.max_size = max_size
         self.quality = quality
+        # Images of one job are encoded in parallel when PQUEUE_THUMB_WORKERS > 1 (PIL releases the GIL)
+        if workers is None:
+            try:
+                workers = int(os.environ.get("PQUEUE_THUMB_WORKERS", "1"))
+            except ValueError:
+                workers = 1
+        self.workers = max(1, int(workers))
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        # Encode work reused across jobs; only the embedded workflow differs per job
+        self._cache_lock = threading.Lock()
+        self._placeholders: Dict[str, Tuple[bytes, int, int]] = {}
+        self._encoded: "OrderedDict[Tuple, Tuple[bytes, int, int]]" = OrderedDict()
+        self._counters = {"placeholder_hits": 0, "encode_hits": 0, "encode_misses": 0}
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pqueue-thumb")
+            return self._pool
 
     def generate_thumbnails_from_outputs(self, outputs: Optional[dict], *, workflow_json: Optional[str] = None, extras: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         if not outputs:
             return []
-        images: List[Dict[str, Any]] = self._extract_image_descriptors(outputs)
-        thumbs: List[Dict[str, Any]] = []
-        for idx, desc in enumerate(images[:4]):
-            thumb = self._encode_single_thumbnail(desc, idx, workflow_json=workflow_json, extras=extras)
-            if thumb is not None:
-                thumbs.append(thumb)
-        return thumbs
+        images: List[Dict[str, Any]] = self._extract_image_descriptors(outputs)[:4]
+        if self.workers > 1 and len(images) > 1:
+            futures = [
+                self._executor().submit(self._encode_single_thumbnail, desc, idx, workflow_json=workflow_json, extras=extras)
+                for idx, desc in enumerate(images)
+            ]
+            results = [f.result() for f in futures]
+        else:
+            results = [self._encode_single_thumbnail(desc, idx, workflow_json=workflow_json, extras=extras) for idx, desc in enumerate(images)]
+        return [t for t in results if t is not None]
+
+    def _load_reduced(self, img: Image.Image) -> Image.Image:
+        """Return img scaled to fit max_size, decoding as little of it as possible.
+
+        JPEGs are decoded at a reduced DCT scale (Image.draft); other formats are box-reduced
+        by an integer factor in C before the final LANCZOS pass, both via Image.thumbnail's
+        reducing_gap. Only the small result is converted to RGB.
+        """
+        if img.mode not in _REDUCIBLE_MODES:
+            img = img.convert('RGBA' if 'A' in img.mode or 'transparency' in img.info else 'RGB')
+        if hasattr(Image, 'Resampling'):
+            resampling = Image.Resampling.LANCZOS
+        else:
+            resampling = Image.LANCZOS
+        img.thumbnail((self.max_size, self.max_size), resampling, reducing_gap=_REDUCING_GAP)
+        return img.convert('RGB') if img.mode != 'RGB' else img
 
     def generate_placeholder_thumbnail(self, status: str, *, workflow_json: Optional[str] = None) -> Optional[Dict[str, Any]]:
-        """Create a placeholder WEBP thumbnail for failed/interrupted jobs.
+        """Create a placeholder PNG thumbnail for failed/interrupted jobs.
 
-        The placeholder encodes the workflow in EXIF so it can be restored via drag-and-drop.
+        The placeholder carries the workflow in a 'prompt' text chunk so it can be restored via
+        drag-and-drop. The image is rendered and encoded once per variant; per job only the
+        text chunk is spliced in.
         """
         try:
-            size = int(self.max_size)
-            # Locate provided placeholder asset
-            placeholder_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'web', 'img', 'failed.png'))
-            use_draw_fallback = True
-            if os.path.isfile(placeholder_path):
-                try:
-                    with Image.open(placeholder_path) as base_img:
-                        # Resize to fit within max size, maintain aspect ratio
-                        w, h = base_img.size
-                        scale = min(size / max(1, w), size / max(1, h), 1.0)
-                        new_size = (max(1, int(w * scale)), max(1, int(h * scale)))
-                        if hasattr(Image, 'Resampling'):
-                            resampling = Image.Resampling.LANCZOS
-                        else:
-                            resampling = Image.LANCZOS
-                        img = base_img.convert('RGB').resize(new_size, resampling)
-                        use_draw_fallback = False
-                except Exception:
-                    use_draw_fallback = True
-
-            if use_draw_fallback:
-                # Minimal drawn fallback if asset missing/unreadable
-                bg = (28, 29, 32)
-                color = (239, 68, 68) if (status or '').lower() == 'failed' else (234, 179, 8)
-                text = '×' if (status or '').lower() == 'failed' else '!'
-                img = Image.new('RGB', (size, size), bg)
-                draw = ImageDraw.Draw(img)
-                margin = 12
-                rect = (margin, margin, size - margin, size - margin)
-                try:
-                    draw.rounded_rectangle(rect, radius=10, fill=color)
-                except Exception:
-                    draw.rectangle(rect, fill=color)
-                try:
-                    font = ImageFont.load_default()
-                except Exception:
-                    font = None
-                if font is not None:
-                    try:
-                        bbox = draw.textbbox((0, 0), text, font=font)
-                        tw = bbox[2] - bbox[0]
-                        th = bbox[3] - bbox[1]
-                    except Exception:
-                        tw, th = draw.textlength(text, font=font), 10
-                    tx = (size - tw) // 2
-                    ty = (size - th) // 2
-                    draw.text((tx, ty), text, font=font, fill=(255, 255, 255))
-
-            buf = BytesIO()
-            try:
-                pnginfo = PngInfo()
-                if workflow_json:
-                    pnginfo.add_text('prompt', workflow_json)
+            variant = 'failed' if (status or '').lower() == 'failed' else 'other'
+            with self._cache_lock:
+                cached = self._placeholders.get(variant)
+                if cached is not None:
+                    self._counters['placeholder_hits'] += 1
+            if cached is None:
+                img = self._render_placeholder(status)
+                buf = BytesIO()
                 # Save lossless PNG to preserve colors and avoid artifacts
-                img.save(buf, format='PNG', pnginfo=pnginfo, compress_level=4)
-            except Exception:
                 img.save(buf, format='PNG', compress_level=4)
-            data = buf.getvalue()
+                cached = (buf.getvalue(), img.size[0], img.size[1])
+                with self._cache_lock:
+                    self._placeholders[variant] = cached
+            data, width, height = cached
+            if workflow_json:
+                try:
+                    data = png_with_text(data, 'prompt', workflow_json)
+                except Exception:
+                    pass
             return {
                 'idx': 0,
                 'mime': 'image/png',
-                'width': img.size[0],
-                'height': img.size[1],
+                'width': width,
+                'height': height,
                 'data': data,
             }
         except Exception:
             return None
 
+    def _render_placeholder(self, status: str) -> Image.Image:
+        size = int(self.max_size)
+        # Locate provided placeholder asset
+        placeholder_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'web', 'img', 'failed.png'))
+        use_draw_fallback = True
+        if os.path.isfile(placeholder_path):
+            try:
+                with Image.open(placeholder_path) as base_img:
+                    # Resize to fit within max size, maintain aspect ratio
+                    w, h = base_img.size
+                    scale = min(size / max(1, w), size / max(1, h), 1.0)
+                    new_size = (max(1, int(w * scale)), max(1, int(h * scale)))
+                    if hasattr(Image, 'Resampling'):
+                        resampling = Image.Resampling.LANCZOS
+                    else:
+                        resampling = Image.LANCZOS
+                    img = base_img.convert('RGB').resize(new_size, resampling)
+                    use_draw_fallback = False
+            except Exception:
+                use_draw_fallback = True
+
+        if use_draw_fallback:
+            # Minimal drawn fallback if asset missing/unreadable
+            bg = (28, 29, 32)
+            color = (239, 68, 68) if (status or '').lower() == 'failed' else (234, 179, 8)
+            text = '×' if (status or '').lower() == 'failed' else '!'
+            img = Image.new('RGB', (size, size), bg)
+            draw = ImageDraw.Draw(img)
+            margin = 12
+            rect = (margin, margin, size - margin, size - margin)
+            try:
+                draw.rounded_rectangle(rect, radius=10, fill=color)
+            except Exception:
+                draw.rectangle(rect, fill=color)
+            try:
+                font = ImageFont.load_default()
+            except Exception:
+                font = None
+            if font is not None:
+                try:
+                    bbox = draw.textbbox((0, 0), text, font=font)
+                    tw = bbox[2] - bbox[0]
+                    th = bbox[3] - bbox[1]
+                except Exception:
+                    tw, th = draw.textlength(text, font=font), 10
+                tx = (size - tw) // 2
+                ty = (size - th) // 2
+                draw.text((tx, ty), text, font=font, fill=(255, 255, 255))
+        return img
+
     def _extract_image_descriptors(self, outputs: dict) -> List[Dict[str, Any]]:
         images: List[Dict[str, Any]] = []
         try:
@@ -142,45 +238,65 @@ class ThumbnailService:
             return None
 
         try:
-            with Image.open(file_path) as img:
-                # Resize preserving aspect ratio to fit within max_size
-                w, h = img.size
-                scale = min(self.max_size / max(1, w), self.max_size / max(1, h), 1.0)
-                new_size = (max(1, int(w * scale)), max(1, int(h * scale)))
-                if hasattr(Image, 'Resampling'):
-                    resampling = Image.Resampling.LANCZOS
-                else:
-                    resampling = Image.LANCZOS
-                thumb_img = img.convert('RGB').resize(new_size, resampling)
-                buf = BytesIO()
-                # Embed workflow metadata into WEBP EXIF so drag-and-drop works
+            encoded = self._encoded_thumbnail(file_path)
+            if encoded is None:
+                return None
+            data, width, height = encoded
+            # Embed workflow metadata into WEBP EXIF so drag-and-drop works
+            exif = Image.Exif()
+            if workflow_json:
+                # Comfy expects 'prompt:<json>' in 0x0110 for WEBP
+                exif[0x0110] = "prompt:{}".format(workflow_json)
+            if extras:
+                tag = 0x010F
+                for k, v in extras.items():
+                    try:
+                        exif[tag] = f"{k}:{json.dumps(v)}"
+                    except Exception:
+                        pass
+                    tag -= 1
+            if len(exif):
                 try:
-                    exif = thumb_img.getexif()
-                    if workflow_json:
-                        # Comfy expects 'prompt:<json>' in 0x0110 for WEBP
-                        exif[0x0110] = "prompt:{}".format(workflow_json)
-                    if extras:
-                        tag = 0x010F
-                        for k, v in extras.items():
-                            try:
-                                exif[tag] = f"{k}:{json.dumps(v)}"
-                            except Exception:
-                                pass
-                            tag -= 1
-                    thumb_img.save(buf, format='WEBP', quality=self.quality, exif=exif)
+                    data = webp_with_exif(data, exif.tobytes(), (width, height))
                 except Exception:
-                    thumb_img.save(buf, format='WEBP', quality=self.quality)
-                data = buf.getvalue()
-                return {
-                    'idx': idx,
-                    'mime': 'image/webp',
-                    'width': new_size[0],
-                    'height': new_size[1],
-                    'data': data,
-                }
+                    pass
+            return {
+                'idx': idx,
+                'mime': 'image/webp',
+                'width': width,
+                'height': height,
+                'data': data,
+            }
         except Exception:
             return None
 
+    def _encoded_thumbnail(self, file_path: str) -> Optional[Tuple[bytes, int, int]]:
+        """WEBP thumbnail of a source file without metadata, memoized by (path, mtime, size)."""
+        st = os.stat(file_path)
+        key = (os.path.abspath(file_path), st.st_mtime_ns, st.st_size, self.max_size, self.quality)
+        with self._cache_lock:
+            cached = self._encoded.get(key)
+            if cached is not None:
+                self._encoded.move_to_end(key)
+                self._counters['encode_hits'] += 1
+                return cached
+            self._counters['encode_misses'] += 1
+        with Image.open(file_path) as img:
+            # Resize preserving aspect ratio to fit within max_size
+            thumb_img = self._load_reduced(img)
+            buf = BytesIO()
+            thumb_img.save(buf, format='WEBP', quality=self.quality)
+            encoded = (buf.getvalue(), thumb_img.size[0], thumb_img.size[1])
+        with self._cache_lock:
+            self._encoded[key] = encoded
+            while len(self._encoded) > _ENCODED_CACHE_LIMIT:
+                self._encoded.popitem(last=False)
+        return encoded
+
+    def cache_stats(self) -> Dict[str, Any]:
+        with self._cache_lock:
+            return {**self._counters, "encoded_entries": len(self._encoded), "placeholder_variants": len(self._placeholders)}
+
     def embed_webp_metadata(self, img: Image.Image, save_kwargs: Dict[str, Any], workflow_json: Optional[str]) -> None:
         try:
             exif = img.getexif()
@@ -0,0 +1,129 @@
+import os
+import zlib
+import hashlib
+import sqlite3
+from typing import Optional, Any, Dict, Iterable, List, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Blobs smaller than this are stored raw; compression overhead is not worth it
+_MIN_COMPRESS_BYTES = 256
+
+
+class WorkflowBlobStore:
+    """Content-addressed storage for workflow JSON shared by queue_items and job_history.
+
+    Rows reference a blob by the SHA-256 of its JSON text (workflow_hash) instead of
+    storing the text inline, so re-queued or re-run graphs are stored once. Blobs are
+    compressed with zlib by default, or zstd when the optional `zstandard` package is
+    installed and PQUEUE_WORKFLOW_CODEC=zstd; PQUEUE_WORKFLOW_CODEC=raw disables compression.
+    """
+
+    TABLE = "workflow_blobs"
+
+    def __init__(self, codec: Optional[str] = None):
+        codec = (codec or os.environ.get("PQUEUE_WORKFLOW_CODEC") or "zlib").lower()
+        if codec == "zstd" and zstandard is None:
+            codec = "zlib"
+        if codec not in ("raw", "zlib", "zstd"):
+            codec = "zlib"
+        self.codec = codec
+
+    def ensure_schema(self, conn: sqlite3.Connection) -> None:
+        conn.execute(
+            f'''
+            CREATE TABLE IF NOT EXISTS {self.TABLE} (
+                hash TEXT PRIMARY KEY,
+                codec TEXT NOT NULL DEFAULT 'raw',
+                size INTEGER,
+                data BLOB NOT NULL
+            )
+            '''
+        )
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _encode(self, raw: bytes) -> Tuple[str, bytes]:
+        if len(raw) < _MIN_COMPRESS_BYTES or self.codec == "raw":
+            return "raw", raw
+        if self.codec == "zstd":
+            return "zstd", zstandard.ZstdCompressor(level=6).compress(raw)
+        return "zlib", zlib.compress(raw, 6)
+
+    @staticmethod
+    def decode(codec: Optional[str], data: Any) -> Optional[str]:
+        if data is None:
+            return None
+        raw = bytes(data)
+        if codec == "zlib":
+            raw = zlib.decompress(raw)
+        elif codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError("workflow blob is zstd-compressed but zstandard is not installed")
+            raw = zstandard.ZstdDecompressor().decompress(raw)
+        return raw.decode("utf-8")
+
+    def put(self, conn: sqlite3.Connection, text: Optional[str]) -> Optional[str]:
+        """Store text if not already present; returns its hash (None for None).
+
+        Always a write, even when the blob exists: it opens the caller's write transaction,
+        so a concurrent release() or orphan prune cannot delete the blob before the row
+        referencing it is committed.
+        """
+        if text is None:
+            return None
+        h = self.hash_text(text)
+        raw = text.encode("utf-8")
+        codec, data = self._encode(raw)
+        conn.execute(
+            f"INSERT OR IGNORE INTO {self.TABLE} (hash, codec, size, data) VALUES (?, ?, ?, ?)",
+            (h, codec, len(raw), sqlite3.Binary(data)),
+        )
+        return h
+
+    def get_many(self, conn: sqlite3.Connection, hashes: Iterable[str]) -> Dict[str, str]:
+        """Return hash -> decoded JSON text for the given hashes."""
+        uniq = [h for h in set(hashes) if h]
+        out: Dict[str, str] = {}
+        for i in range(0, len(uniq), 500):
+            batch = uniq[i:i + 500]
+            placeholders = ",".join(["?"] * len(batch))
+            cur = conn.execute(f"SELECT hash, codec, data FROM {self.TABLE} WHERE hash IN ({placeholders})", tuple(batch))
+            for row in cur.fetchall():
+                out[row["hash"]] = self.decode(row["codec"], row["data"])
+        return out
+
+    def hydrate(self, conn: sqlite3.Connection, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Fill row['workflow'] from the blob store for rows that only carry a workflow_hash."""
+        need = [r.get("workflow_hash") for r in rows if r.get("workflow") is None and r.get("workflow_hash")]
+        if need:
+            texts = self.get_many(conn, need)
+            for r in rows:
+                if r.get("workflow") is None and r.get("workflow_hash"):
+                    r["workflow"] = texts.get(r["workflow_hash"])
+        return rows
+
+    def release(self, conn: sqlite3.Connection, h: Optional[str]) -> None:
+        """Delete a blob once neither queue_items nor job_history references it."""
+        if not h:
+            return
+        conn.execute(
+            f'''
+            DELETE FROM {self.TABLE} WHERE hash = ?
+              AND NOT EXISTS (SELECT 1 FROM queue_items WHERE workflow_hash = ?)
+              AND NOT EXISTS (SELECT 1 FROM job_history WHERE workflow_hash = ?)
+            ''',
+            (h, h, h),
+        )
+
+    def sql_decode(self, codec: Optional[str], data: Any) -> Optional[str]:
+        """SQLite user function body (pq_workflow_text) used by the LIKE search fallback."""
+        try:
+            return self.decode(codec, data)
+        except Exception:
+            return None
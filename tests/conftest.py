@@ -0,0 +1,123 @@
+"""Stand-ins for the ComfyUI modules the extension imports, so its server package runs outside ComfyUI.
+
+``execution.PromptQueue`` follows ComfyUI's implementation (a heapq list guarded by one mutex,
+with every change reported through ``server.queue_updated()``); ``server.PromptServer`` and
+``folder_paths`` provide only what the extension touches. The extension's ``server`` package is
+loaded as ``pqueue_server`` because ComfyUI's own ``server`` module owns that name.
+"""
+import copy
+import heapq
+import importlib
+import importlib.util
+import os
+import sys
+import tempfile
+import threading
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_DATA_DIR = tempfile.mkdtemp(prefix="pqueue-tests-")
+
+
+class PromptQueue:
+    def __init__(self, server):
+        self.server = server
+        self.mutex = threading.RLock()
+        self.not_empty = threading.Condition(self.mutex)
+        self.task_counter = 0
+        self.queue = []
+        self.currently_running = {}
+        self.history = {}
+        self.flags = {}
+
+    def put(self, item):
+        with self.mutex:
+            heapq.heappush(self.queue, item)
+            self.server.queue_updated()
+            self.not_empty.notify()
+
+    def get(self, timeout=None):
+        with self.not_empty:
+            while len(self.queue) == 0:
+                self.not_empty.wait(timeout=timeout)
+                if timeout is not None and len(self.queue) == 0:
+                    return None
+            item = heapq.heappop(self.queue)
+            i = self.task_counter
+            self.currently_running[i] = copy.deepcopy(item)
+            self.task_counter += 1
+            self.server.queue_updated()
+            return (item, i)
+
+    def task_done(self, item_id, history_result, status):
+        with self.mutex:
+            self.currently_running.pop(item_id)
+            self.server.queue_updated()
+
+    def delete_queue_item(self, function):
+        with self.mutex:
+            for x in range(len(self.queue)):
+                if function(self.queue[x]):
+                    if len(self.queue) == 1:
+                        self.wipe_queue()
+                    else:
+                        self.queue.pop(x)
+                        heapq.heapify(self.queue)
+                    self.server.queue_updated()
+                    return True
+        return False
+
+    def wipe_queue(self):
+        with self.mutex:
+            self.queue = []
+            self.server.queue_updated()
+
+
+class PromptServer:
+    instance = None
+
+    def __init__(self):
+        PromptServer.instance = self
+        self.number = 0
+        self.queue_updates = 0
+        self.prompt_queue = PromptQueue(self)
+
+    def queue_updated(self):
+        self.queue_updates += 1
+
+
+def _module(name, **attrs):
+    mod = types.ModuleType(name)
+    mod.__dict__.update(attrs)
+    return mod
+
+
+sys.modules.setdefault("execution", _module("execution", PromptQueue=PromptQueue, validate_prompt=None))
+sys.modules["server"] = _module("server", PromptServer=PromptServer)
+sys.modules.setdefault("folder_paths", _module(
+    "folder_paths",
+    get_user_directory=lambda: os.path.join(_DATA_DIR, "user"),
+    get_temp_directory=lambda: os.path.join(_DATA_DIR, "temp"),
+    get_directory_by_type=lambda kind: os.path.join(_DATA_DIR, kind),
+))
+
+
+def load_extension_module(name):
+    """Import server/<name>.py of the extension as pqueue_server.<name>."""
+    if "pqueue_server" not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            "pqueue_server", os.path.join(ROOT, "server", "__init__.py"),
+            submodule_search_locations=[os.path.join(ROOT, "server")])
+        package = importlib.util.module_from_spec(spec)
+        sys.modules["pqueue_server"] = package
+        spec.loader.exec_module(package)
+    return importlib.import_module(f"pqueue_server.{name}")
+
+
+@pytest.fixture
+def prompt_server():
+    """A fresh PromptServer.instance with an empty PromptQueue."""
+    yield PromptServer()
+    PromptServer.instance = None
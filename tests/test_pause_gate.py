@@ -0,0 +1,109 @@
+"""Pause gate of QueueHookManager: wake-up latency and idle CPU of a paused worker."""
+import threading
+import time
+
+import pytest
+
+from conftest import load_extension_module
+
+# A woken worker must be running again well within this; a missed wake waits out the get() timeout
+WAKE_LATENCY = 0.25
+GET_TIMEOUT = 5.0
+
+
+def _item(number, prompt_id):
+    return (number, prompt_id, {"1": {"class_type": "KSampler", "inputs": {}}}, {}, [])
+
+
+class Harness:
+    def __init__(self, prompt_server, on_queue_updated=None):
+        self.paused = False
+        self.allowed = set()
+        self.started = []
+        self.queue = prompt_server.prompt_queue
+        QueueHookManager = load_extension_module("queue_hook_manager").QueueHookManager
+        self.hooks = QueueHookManager(
+            is_paused_fn=lambda: self.paused,
+            on_job_started=self.started.append,
+            on_task_done=lambda args: None,
+            should_run_when_paused=lambda prompt_id: prompt_id in self.allowed,
+            on_queue_updated=on_queue_updated,
+        )
+        self.hooks.install()
+
+    def worker(self, timeout=GET_TIMEOUT):
+        """Call get() on a thread the way ComfyUI's prompt worker does; returns a result holder."""
+        box = {}
+
+        def run():
+            cpu = time.thread_time()
+            box["result"] = self.queue.get(timeout=timeout)
+            box["returned_at"] = time.monotonic()
+            box["cpu"] = time.thread_time() - cpu
+
+        box["thread"] = threading.Thread(target=run, daemon=True)
+        box["thread"].start()
+        # Let it reach the gate
+        time.sleep(0.1)
+        assert box["thread"].is_alive()
+        return box
+
+    def join(self, box):
+        box["thread"].join(GET_TIMEOUT + 1)
+        assert not box["thread"].is_alive()
+        return box
+
+
+@pytest.fixture(params=[None, lambda: None], ids=["no-callback", "callback"])
+def harness(request, prompt_server):
+    h = Harness(prompt_server, on_queue_updated=request.param)
+    yield h
+    h.hooks.uninstall()
+
+
+def test_resume_wakes_paused_worker(harness):
+    harness.paused = True
+    harness.queue.put(_item(1, "a"))
+    box = harness.worker()
+    harness.paused = False
+    woken = time.monotonic()
+    harness.hooks.wake()
+    harness.join(box)
+    assert box["result"][0][1] == "a"
+    assert box["returned_at"] - woken < WAKE_LATENCY
+
+
+def test_put_of_permitted_item_wakes_paused_worker(harness):
+    harness.paused = True
+    harness.allowed = {"b"}
+    box = harness.worker()
+    put_at = time.monotonic()
+    harness.queue.put(_item(1, "b"))
+    harness.join(box)
+    assert box["result"][0][1] == "b"
+    assert box["returned_at"] - put_at < WAKE_LATENCY
+    assert harness.started == ["b"]
+
+
+def test_delete_of_blocking_top_item_wakes_paused_worker(harness):
+    harness.paused = True
+    harness.allowed = {"b"}
+    harness.queue.put(_item(1, "a"))
+    harness.queue.put(_item(2, "b"))
+    box = harness.worker()
+    deleted_at = time.monotonic()
+    assert harness.queue.delete_queue_item(lambda it: it[1] == "a")
+    harness.join(box)
+    assert box["result"][0][1] == "b"
+    assert box["returned_at"] - deleted_at < WAKE_LATENCY
+
+
+def test_paused_worker_idles_without_cpu_and_times_out(harness):
+    harness.paused = True
+    harness.queue.put(_item(1, "a"))
+    box = harness.worker(timeout=1.0)
+    harness.join(box)
+    assert box["result"] is None
+    # Blocked on the condition variable, not polling
+    assert box["cpu"] < 0.05
+    assert [it[1] for it in harness.queue.queue] == ["a"]
@@ -0,0 +1,147 @@
+"""Single-item queue moves: fractional numbers, the position index and the integer renumber fallback."""
+import heapq
+import random
+import statistics
+import time
+import types
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("PIL")
+
+from conftest import load_extension_module
+
+manager_module = load_extension_module("manager")
+_number_between = manager_module._number_between
+
+
+class RankRecorder:
+    def __init__(self):
+        self.ranks = {}
+
+    def update_job_ranks(self, ranks):
+        self.ranks.update(ranks)
+
+
+@pytest.fixture
+def manager(prompt_server):
+    m = manager_module.PersistentQueueManager.__new__(manager_module.PersistentQueueManager)
+    m.db = RankRecorder()
+    m._hooks = None
+    m._feed = types.SimpleNamespace(mark_dirty=lambda: None)
+    m._qindex = load_extension_module("queue_index").QueueIndex()
+    return m
+
+
+def _fill(prompt_server, count):
+    ids = [f"p{i}" for i in range(count)]
+    for i, pid in enumerate(ids):
+        prompt_server.prompt_queue.put((i, pid, {}, {}, []))
+    prompt_server.number = count
+    return ids
+
+
+def _order(queue):
+    return [str(it[1]) for it in sorted(queue)]
+
+
+def _assert_heap(queue):
+    for i in range(1, len(queue)):
+        assert queue[(i - 1) // 2] <= queue[i]
+
+
+def test_number_between():
+    assert _number_between(None, None) == 0
+    assert _number_between(None, 5) == 4
+    assert _number_between(5, None) == 6
+    assert _number_between(1, 9) == 5
+    assert _number_between(1, 2) == 1.5
+    assert _number_between(2, 2) is None
+    assert _number_between(3, 2) is None
+    assert _number_between(1.0, 1.0 + 2 ** -52) is None
+    lo, hi = 0, 1
+    for _ in range(1000):
+        mid = _number_between(lo, hi)
+        if mid is None:
+            break
+        assert lo < mid < hi
+        lo = mid
+    else:
+        pytest.fail("float precision between neighbours was never exhausted")
+
+
+def test_random_moves_keep_order_and_persist_ranks(manager, prompt_server):
+    rng = random.Random(20240523)
+    q = prompt_server.prompt_queue
+    expected = _fill(prompt_server, 500)
+    timings = []
+    for step in range(10000):
+        pid = rng.choice(expected)
+        rest = [p for p in expected if p != pid]
+        at = rng.randrange(len(rest) + 1)
+        after_id = rest[at - 1] if at > 0 else None
+        before_id = rest[at] if at < len(rest) else None
+        started = time.perf_counter()
+        assert manager._move_job(pid, after_id, before_id) is None
+        timings.append(time.perf_counter() - started)
+        expected = rest[:at] + [pid] + rest[at:]
+        if step % 500 == 0:
+            _assert_heap(q.queue)
+            assert _order(q.queue) == expected
+    _assert_heap(q.queue)
+    assert _order(q.queue) == expected
+    numbers = [it[0] for it in q.queue]
+    assert len(set(numbers)) == len(numbers)
+    # What was persisted restores the same order
+    assert set(manager.db.ranks) <= set(expected)
+    assert all(manager.db.ranks[str(it[1])] == it[0] for it in q.queue if str(it[1]) in manager.db.ranks)
+    # O(log n) moves: far below a full sort of the queue per move
+    assert statistics.median(timings) < 0.002
+
+
+def test_exhausted_gap_renumbers_whole_queue(manager, prompt_server):
+    q = prompt_server.prompt_queue
+    ids = _fill(prompt_server, 50)
+    renumber = manager._renumber_queue
+    calls = []
+    manager._renumber_queue = lambda *args: calls.append(args) or renumber(*args)
+    # Keep inserting right after p1 until no float is left between it and its successor
+    for i in range(200):
+        pid = ids[-1 - (i % 10)]
+        assert manager._move_job(pid, "p1", _order(q.queue)[2]) is None
+        assert _order(q.queue)[2] == pid
+        if calls:
+            break
+    assert len(calls) == 1 and i > 40
+    numbers = [it[0] for it in sorted(q.queue)]
+    assert numbers == list(range(numbers[0], numbers[0] + len(numbers)))
+    assert prompt_server.number >= numbers[-1] + 1
+    _assert_heap(q.queue)
+    assert manager.db.ranks == {str(it[1]): it[0] for it in q.queue}
+
+
+def test_move_errors_leave_queue_untouched(manager, prompt_server):
+    q = prompt_server.prompt_queue
+    _fill(prompt_server, 5)
+    snapshot = sorted(q.queue)
+    assert manager._move_job("missing", "p1", "p2") == "item is no longer queued"
+    assert manager._move_job("p3", "missing", None) == "neighbour is no longer queued"
+    assert manager._move_job("p3", "p3", "p4") == "item cannot be its own neighbour"
+    assert manager._move_job("p3", "p2", "p1") == "neighbours are out of order"
+    with q.mutex:
+        assert manager._renumber_queue(q, "missing", "p1") is None
+        assert manager._renumber_queue(q, "p3", "missing") is None
+    assert sorted(q.queue) == snapshot
+    assert manager.db.ranks == {}
+
+
+def test_move_to_front_and_back(manager, prompt_server):
+    q = prompt_server.prompt_queue
+    _fill(prompt_server, 5)
+    assert manager._move_job("p3", None, "p0") is None
+    assert _order(q.queue) == ["p3", "p0", "p1", "p2", "p4"]
+    assert manager._move_job("p0", "p4", None) is None
+    assert _order(q.queue) == ["p3", "p1", "p2", "p4", "p0"]
+    # The back takes the next number, like a newly queued prompt
+    assert heapq.nlargest(1, q.queue)[0][0] == prompt_server.number - 1
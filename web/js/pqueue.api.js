@@ -4,16 +4,50 @@
     const PQ = window.PQueue = window.PQueue || {};
 
     const API = {
-        getQueue: () => fetch("/api/pqueue").then((r) => r.json()),
-        getHistory: (limit = 50) => fetch(`/api/pqueue/history?limit=${limit}`).then((r) => r.json()),
+        // Summary rows only; a job's workflow is fetched with getJob when it is opened
+        getQueue: () => fetch("/api/pqueue?fields=summary").then((r) => r.json()),
+        getJob: (prompt_id) =>
+            fetch(`/api/pqueue/job/${encodeURIComponent(prompt_id)}`).then((r) => r.json()),
+        // Long-poll the revisioned change feed; resolves when the queue changes or after `timeout` seconds
+        getQueueChanges: (since, timeout = 25, signal) => {
+            const url = new URL("/api/pqueue/changes", window.location.origin);
+            if (since !== undefined && since !== null) url.searchParams.set("since", String(since));
+            url.searchParams.set("timeout", String(timeout));
+            return fetch(url.href, { signal }).then((r) => r.json());
+        },
+        getHistory: (limit = 50) => fetch(`/api/pqueue/history?limit=${limit}&fields=summary`).then((r) => r.json()),
+        // History lists carry no workflow/outputs unless params.fields asks for them; see getHistoryItem
         getHistoryPaginated: (params = {}) => {
             const url = new URL("/api/pqueue/history", window.location.origin);
-            Object.entries(params).forEach(([k, v]) => {
+            Object.entries({ fields: "summary", ...params }).forEach(([k, v]) => {
                 if (v === undefined || v === null || v === "") return;
                 url.searchParams.set(k, String(v));
             });
             return fetch(url.href).then((r) => r.json());
         },
+        getHistoryItem: (id) => fetch(`/api/pqueue/history/${encodeURIComponent(id)}`).then((r) => r.json()),
+        // Thumbnails of many history rows in one request; resolves to Map(id -> Blob)
+        getHistoryThumbs: (ids, idx = 0) => {
+            const url = new URL("/api/pqueue/history/thumbs", window.location.origin);
+            url.searchParams.set("ids", ids.join(","));
+            if (idx) url.searchParams.set("idx", String(idx));
+            return fetch(url.href)
+                .then((r) => {
+                    if (!r.ok) throw new Error(`HTTP ${r.status}`);
+                    return r.arrayBuffer();
+                })
+                .then((buf) => {
+                    // 4-byte header length, JSON header with offsets, then the images back to back
+                    const headerLen = new DataView(buf).getUint32(0, false);
+                    const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buf, 4, headerLen)));
+                    const base = 4 + headerLen;
+                    const out = new Map();
+                    (header.items || []).forEach((it) => {
+                        out.set(Number(it.id), new Blob([new Uint8Array(buf, base + it.offset, it.length)], { type: it.mime }));
+                    });
+                    return out;
+                });
+        },
         pause: () => fetch("/api/pqueue/pause", { method: "POST" }),
         resume: () => fetch("/api/pqueue/resume", { method: "POST" }),
         reorder: (order) =>
@@ -22,22 +56,39 @@
                 headers: { "Content-Type": "application/json" },
                 body: JSON.stringify({ order }),
             }),
-        exportQueue: () =>
-            fetch("/api/pqueue/export", { method: "GET" }).then((r) => r.json()),
-        importQueue: (fileOrJson) => {
+        // Move one item between two neighbours (null after: to the front, null before: to the end)
+        move: (prompt_id, after, before) =>
+            fetch("/api/pqueue/move", {
+                method: "POST",
+                headers: { "Content-Type": "application/json" },
+                body: JSON.stringify({ prompt_id, after: after || null, before: before || null }),
+            }).then((r) => r.json()),
+        // Exports stream straight to a download; params: scope, format, gzip, thumbs
+        exportUrl: (params = {}) => {
+            const url = new URL("/api/pqueue/export", window.location.origin);
+            Object.entries(params).forEach(([k, v]) => {
+                if (v === undefined || v === null || v === "") return;
+                url.searchParams.set(k, String(v));
+            });
+            return url.href;
+        },
+        importQueue: (fileOrJson, importId) => {
+            const url = importId ? `/api/pqueue/import?import_id=${encodeURIComponent(importId)}` : "/api/pqueue/import";
             try {
                 if (fileOrJson instanceof File || fileOrJson instanceof Blob) {
                     const form = new FormData();
                     form.append("file", fileOrJson, fileOrJson.name || "queue.json");
-                    return fetch("/api/pqueue/import", { method: "POST", body: form }).then((r) => r.json());
+                    return fetch(url, { method: "POST", body: form }).then((r) => r.json());
                 }
             } catch (err) { /* fall through to JSON */ }
-            return fetch("/api/pqueue/import", {
+            return fetch(url, {
                 method: "POST",
                 headers: { "Content-Type": "application/json" },
                 body: JSON.stringify(fileOrJson),
             }).then((r) => r.json());
         },
+        getImportProgress: (importId) =>
+            fetch(`/api/pqueue/import/progress?id=${encodeURIComponent(importId)}`).then((r) => r.json()),
         setPriority: (prompt_id, priority) =>
             fetch("/api/pqueue/priority", {
                 method: "PATCH",
@@ -50,6 +101,13 @@
                 headers: { "Content-Type": "application/json" },
                 body: JSON.stringify({ prompt_ids }),
             }),
+        // One request for many items: op is "delete", "skip", "priority" or "rename"
+        batch: (op, payload = {}) =>
+            fetch("/api/pqueue/batch", {
+                method: "POST",
+                headers: { "Content-Type": "application/json" },
+                body: JSON.stringify({ op, ...payload }),
+            }).then((r) => r.json()),
         rename: (prompt_id, name) =>
             fetch("/api/pqueue/rename", {
                 method: "PATCH",
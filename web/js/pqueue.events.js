@@ -55,12 +55,9 @@
         async exportQueueToFile() {
             refreshRefs();
             try {
-                const data = await API.exportQueue();
-                const text = JSON.stringify(data, null, 2);
-                const blob = new Blob([text], { type: "application/json" });
-                const url = URL.createObjectURL(blob);
+                // The browser downloads the streamed response itself; nothing is buffered here
                 const a = document.createElement('a');
-                a.href = url;
+                a.href = API.exportUrl();
                 const dt = new Date();
                 const pad = (n) => String(n).padStart(2, '0');
                 const fname = `pqueue-${dt.getFullYear()}${pad(dt.getMonth()+1)}${pad(dt.getDate())}-${pad(dt.getHours())}${pad(dt.getMinutes())}${pad(dt.getSeconds())}.json`;
@@ -68,7 +65,6 @@
                 document.body.appendChild(a);
                 a.click();
                 a.remove();
-                URL.revokeObjectURL(url);
                 setStatusMessage("Queue exported");
             } catch (err) {
                 console.error("pqueue: export failed", err);
@@ -84,7 +80,7 @@
                 if (!input) {
                     input = document.createElement('input');
                     input.type = 'file';
-                    input.accept = 'application/json,.json';
+                    input.accept = 'application/json,.json,.ndjson,.tar,.gz';
                     input.id = 'pqueue-import-input';
                     input.style.display = 'none';
                     document.body.appendChild(input);
@@ -101,7 +97,23 @@
                 const input = ev.currentTarget || ev.target;
                 const file = input?.files?.[0];
                 if (!file) return;
-                const result = await API.importQueue(file);
+                const importId = `imp-${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 8)}`;
+                // Large imports take a while; show server-side progress until the upload request returns
+                const progressTimer = window.setInterval(async () => {
+                    try {
+                        const p = await API.getImportProgress(importId);
+                        if (p && p.state && p.state !== "done" && p.state !== "failed") {
+                            setStatusMessage(`Importing… ${Number(p.parsed) || 0} read, ${Number(p.validated) || 0} validated`, 0);
+                        }
+                    } catch (err) { /* progress is best-effort */ }
+                }, 750);
+                let result;
+                try {
+                    result = await API.importQueue(file, importId);
+                } finally {
+                    window.clearInterval(progressTimer);
+                }
+                if (result && result.ok === false) throw new Error(result.error || "Import failed");
                 const cnt = Number(result?.count || (Array.isArray(result?.imported) ? result.imported.length : 0));
                 setStatusMessage(`Imported ${cnt} item${cnt === 1 ? '' : 's'}`);
                 await refresh({ force: true });
@@ -110,6 +122,7 @@
                 UI.updateSelectionUI();
             } catch (err) {
                 console.error("pqueue: import failed", err);
+                setStatusMessage(null);
                 state.error = err?.message || "Failed to import queue";
                 UI.updateToolbarStatus();
             }
@@ -301,11 +314,20 @@
             const before = event.clientY - rect.top < rect.height / 2;
             target.classList.remove("pqueue-row--before", "pqueue-row--after");
             table.insertBefore(dragRow, before ? target : target.nextSibling);
-            const order = Array.from(table.querySelectorAll(".pqueue-row[data-id]"))
-                .filter((row) => row.style.display !== "none")
-                .map((row) => row.dataset.id);
+            // Only the dragged item and its new visible neighbours are sent
+            const rows = Array.from(table.querySelectorAll(".pqueue-row[data-id]"))
+                .filter((row) => row.style.display !== "none");
+            const at = rows.indexOf(dragRow);
+            const after = at > 0 ? rows[at - 1].dataset.id : null;
+            const beforeId = at >= 0 && at < rows.length - 1 ? rows[at + 1].dataset.id : null;
             try {
-                await API.reorder(order);
+                const result = await API.move(dragRow.dataset.id, after, beforeId);
+                if (result && result.ok === false) {
+                    // The queue changed underneath us; show the current order
+                    setStatusMessage(result.error || "Queue changed, please try again");
+                    await refresh({ force: true });
+                    return;
+                }
                 setStatusMessage("Queue reordered");
                 await refresh({ skipIfBusy: true });
             } catch (err) {
@@ -360,9 +382,11 @@
                 } else {
                     table.appendChild(rowEl);
                 }
-                // Build new order based on current DOM row order
-                const ids = Array.from(table.querySelectorAll('.pqueue-row[data-id]')).map((r) => r.dataset.id);
-                await API.reorder(ids);
+                // Front: nothing before it; end: nothing after it
+                const ids = Array.from(table.querySelectorAll('.pqueue-row[data-id]')).map((r) => r.dataset.id).filter((rid) => rid !== String(id));
+                if (!ids.length) return;
+                const result = where === 'top' ? await API.move(id, null, ids[0]) : await API.move(id, ids[ids.length - 1], null);
+                if (result && result.ok === false) throw new Error(result.error || 'Failed to move prompt');
                 setStatusMessage(where === 'top' ? 'Moved to top' : 'Moved to bottom');
                 await refresh({ force: true });
             } catch (err) {
@@ -383,6 +407,8 @@
                 const params = { ...paging.params };
                 if (paging.nextCursor?.id != null) params.cursor_id = paging.nextCursor.id;
                 if (paging.nextCursor?.value != null) params.cursor_value = paging.nextCursor.value;
+                // The first page already brought the total; later pages skip counting
+                if (state.historyTotal != null) params.include_total = 0;
 
                 const result = await API.getHistoryPaginated(params);
                 const list = Array.isArray(result?.history) ? result.history : [];
@@ -762,9 +788,23 @@
             }
         },
 
-        viewWorkflow(id) {
+        async viewWorkflow(id) {
             refreshRefs();
-            const info = lookupWorkflow(id);
+            let info = lookupWorkflow(id);
+            if (!info) {
+                // List rows are summaries; the stored workflow is fetched only when it is opened
+                try {
+                    const res = await API.getJob(id);
+                    if (res?.job?.workflow) info = { workflow: res.job.workflow, source: "Persistence" };
+                    if (!info) {
+                        const row = state.history.find((r) => String(r.prompt_id) === String(id));
+                        if (row) {
+                            await UI.loadHistoryDetail(row);
+                            if (row.workflow) info = { workflow: row.workflow, source: "History" };
+                        }
+                    }
+                } catch (err) { /* fall through */ }
+            }
             if (!info) {
                 setStatusMessage("Workflow not available", 3000);
                 return;
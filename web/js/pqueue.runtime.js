@@ -6,9 +6,10 @@
     const UI = window.PQueue?.UI || window.UI;
     const API = window.PQueue?.API || window.API;
 
+    // Resolves to false when skipped (render lock or a refresh already in flight), true once it ran
     window.refresh = async function refresh({ skipIfBusy, force } = {}) {
-        if (!force && Date.now() < (state.renderLockUntil || 0)) return;
-        if (state.isRefreshing && skipIfBusy) return;
+        if (!force && Date.now() < (state.renderLockUntil || 0)) return false;
+        if (state.isRefreshing && skipIfBusy) return false;
         state.isRefreshing = true;
         UI.updateToolbarStatus();
         try {
@@ -39,6 +40,8 @@
             const prevSamplerCounts = state.samplerCountById || {};
             // Always update sampler counts from server to ensure we have fresh data
             state.samplerCountById = queue.sampler_count_by_id || {};
+            // Server-side per-item estimates from duration statistics (null on older servers)
+            state.eta = (queue && queue.eta && typeof queue.eta === "object") ? queue.eta : null;
             
             // Reset progress state if sampler count changed for any running job
             try {
@@ -132,6 +135,7 @@
             UI.updateToolbarStatus();
             try { if (typeof UI.updateToolbarSummary === 'function') UI.updateToolbarSummary(); } catch (err) { /* noop */ }
         }
+        return true;
     };
 
     window.deriveMetrics = function deriveMetrics() {
@@ -167,7 +171,8 @@
             if (["success", "completed", "done", "failed", "error", "failure", "cancelled", "canceled", "interrupted"].includes(status)) total += 1;
             if (Number.isFinite(duration) && duration > 0) durations.push(duration);
 
-            const wf = row.workflow;
+            // Summary rows are keyed by structural fingerprint; full rows by workflow text
+            const wf = row.fingerprint || row.workflow;
             if (!wf) return;
             let key = "";
             if (typeof wf === "string") key = wf;
@@ -187,6 +192,7 @@
         metrics.successRate = total ? success / total : null;
         metrics.failureCount = failure;
         metrics.avgDuration = durations.length ? durations.reduce((acc, v) => acc + v, 0) / durations.length : null;
+        if (state.eta && Number(state.eta.global_median) > 0) metrics.avgDuration = Number(state.eta.global_median);
         state.metrics = metrics;
 
         const averages = new Map();
@@ -199,9 +205,14 @@
 
         try {
             const fallback = metrics.avgDuration || 0;
+            const etaItems = state.eta?.items || null;
             const getEstimateForItem = (item) => {
                 if (!Array.isArray(item)) return 0;
                 const pid = String(item[1] ?? "");
+                const serverEstimate = Number(etaItems?.[pid]?.seconds);
+                if (Number.isFinite(serverEstimate) && serverEstimate > 0) return serverEstimate;
+                const fp = state.dbIndex.get(pid)?.fingerprint;
+                if (fp && averages.has(fp)) return averages.get(fp);
                 let key = state.workflowCache.get(pid);
                 if (!key) {
                     const wf = item[2];
@@ -572,6 +583,8 @@
             api.addEventListener("execution_success", onLifecycle);
             api.addEventListener("execution_error", onLifecycle);
             api.addEventListener("execution_interrupted", onLifecycle);
+            // History rows are written in the background after a job finishes
+            api.addEventListener("pqueue_history", onLifecycle);
 
             stopPolling();
             return true;
@@ -587,6 +600,10 @@
                 clearInterval(window.PQueue.vars.pollIntervalId);
                 window.PQueue.vars.pollIntervalId = null;
             }
+            if (window.PQueue?.vars?.feedAbort) {
+                window.PQueue.vars.feedAbort.abort();
+                window.PQueue.vars.feedAbort = null;
+            }
             if (window.PQueue?.vars?.focusListener) {
                 window.removeEventListener("focus", window.PQueue.vars.focusListener);
                 window.PQueue.vars.focusListener = null;
@@ -594,11 +611,39 @@
         } catch (err) { /* ignore */ }
     }
 
+    // Long-poll the server's change feed and only refresh when the queue revision moves,
+    // so an idle panel transfers nothing beyond the empty long-poll responses.
+    async function watchQueueChanges(controller) {
+        let since = null;
+        while (!controller.signal.aborted) {
+            try {
+                const feed = await API.getQueueChanges(since, 25, controller.signal);
+                const revision = Number(feed?.revision);
+                if (!Number.isFinite(revision)) throw new Error("invalid change feed response");
+                if (since !== null && revision !== since && !(await refresh({ skipIfBusy: true }))) {
+                    // The refresh in flight may have read the queue before this change: keep the
+                    // old revision so the next long-poll returns at once, and retry shortly
+                    await new Promise((resolve) => window.setTimeout(resolve, 250));
+                    continue;
+                }
+                since = revision;
+            } catch (err) {
+                if (controller.signal.aborted) return;
+                // Server without the feed or transient failure: back off like the old 3 s poll
+                await new Promise((resolve) => window.setTimeout(resolve, 3000));
+                since = null;
+                await refresh({ skipIfBusy: true });
+            }
+        }
+    }
+
     function startPolling() {
         stopPolling();
         window.PQueue.vars.focusListener = () => refresh({ skipIfBusy: true });
         window.addEventListener("focus", window.PQueue.vars.focusListener);
-        window.PQueue.vars.pollIntervalId = window.setInterval(() => refresh({ skipIfBusy: true }), 3000);
+        const controller = new AbortController();
+        window.PQueue.vars.feedAbort = controller;
+        watchQueueChanges(controller);
     }
 
     window.initializePQueue = function initialize() {
@@ -12,6 +12,7 @@
         running_progress: {},
         workflowCache: new Map(),
         durationByWorkflow: new Map(),
+        eta: null,
         dbIndex: new Map(),
         workflowNameCache: new Map(),
         selectedPending: new Set(),
@@ -61,6 +62,7 @@
     PQ.state = state;
     PQ.vars = {
         pollIntervalId: null,
+        feedAbort: null,
         focusListener: null,
         dragRow: null,
         dropHover: null,
@@ -257,6 +257,10 @@
     };
 
     UI.estimateDuration = function estimateDuration(promptId, workflow) {
+        const serverEstimate = Number(state.eta?.items?.[promptId]?.seconds);
+        if (Number.isFinite(serverEstimate) && serverEstimate > 0) return serverEstimate;
+        const fp = state.dbIndex?.get(promptId)?.fingerprint;
+        if (fp && state.durationByWorkflow.has(fp)) return state.durationByWorkflow.get(fp);
         let key = state.workflowCache.get(promptId);
         if (!key && workflow !== undefined) {
             try {
@@ -352,7 +356,11 @@
                 const name = prompt?.workflow?.name || prompt?.workflow?.title || prompt?.name;
                 if (typeof name === "string" && name.trim()) return name.trim();
             }
-            if (dbRow?.workflow) {
+            // Name extracted at enqueue; the workflow is only parsed for rows not yet backfilled
+            if (dbRow && dbRow.node_count != null) {
+                const name = dbRow.display_name;
+                if (typeof name === "string" && name.trim()) return name.trim();
+            } else if (dbRow?.workflow) {
                 try {
                     const parsed = JSON.parse(dbRow.workflow);
                     const name = parsed?.workflow?.name || parsed?.workflow?.title || parsed?.name;
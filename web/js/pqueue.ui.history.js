@@ -5,6 +5,9 @@
     const UI = (window.PQueue && window.PQueue.UI) || (window.PQueue = (window.PQueue || {}), window.PQueue.UI = {}, window.PQueue.UI);
     const Format = (window.PQueue && window.PQueue.Format) || window.Format;
     const Events = (window.PQueue && window.PQueue.Events) || window.Events;
+    const API = (window.PQueue && window.PQueue.API) || window.API;
+    // Object URLs kept for history thumbnails already fetched; oldest are revoked past this
+    const THUMB_URL_LIMIT = 2000;
 
     UI.historySentinel = function historySentinel() {
         const wrap = UI.el("div", { class: "pqueue-history-sentinel" });
@@ -57,15 +60,15 @@
 
         if (row.id) {
             const galleryImages = UI.extractImages(row);
-            const url = new URL(`/api/pqueue/history/thumb/${row.id}`, window.location.origin);
-            url.searchParams.set("_", String(Date.now()));
             const wrap = UI.el("div", { class: "pqueue-thumb-wrap" });
-            const img = UI.el("img", { class: "pqueue-thumb", src: url.href, title: `history-${row.id}`, loading: "lazy", decoding: "async", fetchpriority: "low" });
+            const img = UI.el("img", { class: "pqueue-thumb", title: `history-${row.id}`, decoding: "async", fetchpriority: "low" });
             attachFallback(wrap, img, galleryImages);
+            UI.requestHistoryThumb(Number(row.id), img);
             wrap.appendChild(img);
             const count = UI.countImages(row);
             if (count > 1) wrap.appendChild(UI.el("div", { class: "pqueue-thumb-badge", text: `${count}` }));
             if (galleryImages.length) wrap.onclick = () => UI.openGallery(galleryImages, 0, row.prompt_id);
+            else if (count) wrap.onclick = () => UI.openHistoryGallery(row);
             container.appendChild(wrap);
         }
 
@@ -88,6 +91,59 @@
         return container;
     };
 
+    UI.historyThumbUrl = function historyThumbUrl(id) {
+        return new URL(`/api/pqueue/history/thumb/${id}`, window.location.origin).href;
+    };
+
+    // Tiles created in the same tick share one batched request instead of one request each
+    UI.requestHistoryThumb = function requestHistoryThumb(id, img) {
+        if (!state.thumbUrls) state.thumbUrls = new Map();
+        const cached = state.thumbUrls.get(id);
+        if (cached) {
+            img.src = cached;
+            return;
+        }
+        if (!state.thumbBatch) state.thumbBatch = new Map();
+        if (!state.thumbBatch.has(id)) state.thumbBatch.set(id, []);
+        state.thumbBatch.get(id).push(img);
+        if (!state.thumbBatchTimer) state.thumbBatchTimer = setTimeout(UI.flushHistoryThumbs, 0);
+    };
+
+    UI.flushHistoryThumbs = function flushHistoryThumbs() {
+        const pending = state.thumbBatch;
+        state.thumbBatch = null;
+        state.thumbBatchTimer = null;
+        if (!pending || !pending.size) return;
+        // Anything the batch cannot deliver falls back to the per-tile URL (and its error placeholder)
+        const assign = (id, url) => (pending.get(id) || []).forEach((img) => { img.src = url || UI.historyThumbUrl(id); });
+        const ids = Array.from(pending.keys());
+        for (let i = 0; i < ids.length; i += 200) {
+            const chunk = ids.slice(i, i + 200);
+            if (!API || typeof API.getHistoryThumbs !== "function") {
+                chunk.forEach((id) => assign(id, null));
+                continue;
+            }
+            API.getHistoryThumbs(chunk)
+                .then((blobs) => {
+                    chunk.forEach((id) => {
+                        const blob = blobs.get(id);
+                        let url = null;
+                        if (blob) {
+                            url = URL.createObjectURL(blob);
+                            state.thumbUrls.set(id, url);
+                        }
+                        assign(id, url);
+                    });
+                    while (state.thumbUrls.size > THUMB_URL_LIMIT) {
+                        const [oldId, oldUrl] = state.thumbUrls.entries().next().value;
+                        state.thumbUrls.delete(oldId);
+                        try { URL.revokeObjectURL(oldUrl); } catch (err) { /* noop */ }
+                    }
+                })
+                .catch(() => chunk.forEach((id) => assign(id, null)));
+        }
+    };
+
     UI.thumbPlaceholder = function thumbPlaceholder(row) {
         const status = String(row?.status ?? "").toLowerCase();
         if (["interrupted", "cancelled", "canceled", "stopped"].includes(status)) {
@@ -135,8 +191,30 @@
         }
     };
 
+    // Summary rows (fields=summary) carry no outputs; they are loaded when the gallery is opened
+    UI.loadHistoryDetail = async function loadHistoryDetail(row) {
+        if (!row || row.outputs !== undefined || row.id == null) return row;
+        const res = await API.getHistoryItem(row.id);
+        if (res?.item) {
+            row.outputs = res.item.outputs;
+            row.workflow = res.item.workflow;
+        }
+        return row;
+    };
+
+    UI.openHistoryGallery = async function openHistoryGallery(row) {
+        try {
+            await UI.loadHistoryDetail(row);
+            const images = UI.extractImages(row);
+            if (images.length) UI.openGallery(images, 0, row.prompt_id);
+        } catch (err) {
+            console.error("pqueue: loading history item failed", err);
+        }
+    };
+
     UI.countImages = function countImages(row) {
         try {
+            if (row && row.outputs === undefined && row.image_count != null) return Number(row.image_count) || 0;
             return UI.extractImages(row).length;
         } catch (err) {
             return 0;
@@ -145,6 +223,7 @@
 
     UI.historyPrimaryFilename = function historyPrimaryFilename(row) {
         try {
+            if (row.outputs === undefined && row.primary_image) return String(row.primary_image);
             const images = UI.extractImages(row);
             if (images.length && images[0]?.filename) {
                 return images[0].filename;
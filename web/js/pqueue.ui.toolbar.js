@@ -105,7 +105,7 @@
 						m.estimatedPendingDuration ? `~${Format.duration(m.estimatedPendingDuration)} pending` : null,
 					].filter(Boolean).join(" • ") || (m.queueCount ? `${m.queueCount} pending item${m.queueCount === 1 ? "" : "s"}` : "No pending items"),
 					variant: "neutral",
-					tooltip: "Sum of per-workflow averages for running (remaining) and pending items. Per-workflow averages are computed from recent history; if unavailable, falls back to global average duration.",
+					tooltip: "Sum of per-workflow median durations for running (remaining) and pending items. Workflows with the same node graph share statistics, regardless of seeds or prompt text; unseen workflows fall back to the overall median.",
 				}),
 			];
 			return UI.el("div", { class: "pqueue-metrics" }, tiles);